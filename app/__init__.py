@@ -8,18 +8,37 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    from .services.replica_leitura import configurar_engines, replica_leitura
+    configurar_engines(app)
     db.init_app(app)
+    replica_leitura.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
 
+    from .services.auditoria import auditoria
+    auditoria.init_app(app)
+    from .services.documentos_pdf import renderizador_pdf
+    renderizador_pdf.init_app(app)
+    from .services.metricas_sql import metricas_sql
+    metricas_sql.init_app(app)
+    from .services.gateways import gateways
+    gateways.init_app(app)
+    from .services.versao_painel import versoes_painel
+    versoes_painel.init_app(app)
+    from .services import cache_templates
+    cache_templates.init_app(app)
+
     login_manager.login_view = 'auth.login'
+    from .auth.principal import init_principal_cache, carregar_principal
+    init_principal_cache(app)
     @login_manager.user_loader
     def load_user(user_id):
-        from .models import Usuario
         prefeitura_id = session.get('prefeitura_id')
         if not prefeitura_id:
             return None
-        return Usuario.query.filter_by(id=user_id, prefeitura_id=prefeitura_id).first()
+        # Vem de um cache por processo com TTL curto (PRINCIPAL_CACHE_TTL_SEGUNDOS),
+        # o que evita uma consulta ao banco em cada requisição autenticada.
+        return carregar_principal(user_id, prefeitura_id)
 
     # --- REGISTRO DO NOVO BLUEPRINT ---
     from .auth import bp as auth_bp
@@ -32,8 +51,31 @@ def create_app(config_class=Config):
     app.register_blueprint(paciente_portal_bp, url_prefix='/portal')
     # --- FIM DO REGISTRO ---
 
-    from .commands import seed_db_command
+    # Registra o listener que mantém a consolidação diária de LogUso.
+    from .services import uso_diario  # noqa: F401
+    # Registra o listener que mantém o texto de busca da biblioteca.
+    from .services import busca_biblioteca  # noqa: F401
+    # Registra o listener que mantém as estatísticas de tempo de atendimento das filas.
+    from .services import tempo_espera  # noqa: F401
+
+    from .commands import (
+        seed_db_command, recalcular_uso_diario_command, processar_outbox_command, reindexar_biblioteca_command,
+        purgar_magic_links_command, seed_scale_command, explicar_consultas_command, manter_auditoria_command,
+        restaurar_auditoria_command, verificar_replica_command, recalcular_tempos_espera_command,
+        precompilar_templates_command
+    )
     app.cli.add_command(seed_db_command)
+    app.cli.add_command(recalcular_uso_diario_command)
+    app.cli.add_command(processar_outbox_command)
+    app.cli.add_command(reindexar_biblioteca_command)
+    app.cli.add_command(purgar_magic_links_command)
+    app.cli.add_command(seed_scale_command)
+    app.cli.add_command(explicar_consultas_command)
+    app.cli.add_command(manter_auditoria_command)
+    app.cli.add_command(restaurar_auditoria_command)
+    app.cli.add_command(verificar_replica_command)
+    app.cli.add_command(recalcular_tempos_espera_command)
+    app.cli.add_command(precompilar_templates_command)
 
     @app.route('/')
     def index():
@@ -0,0 +1,59 @@
+# Arquivo: app/auth/principal.py
+
+from flask_login import UserMixin
+
+from app.cache import CacheTTL
+
+# O TTL é ajustado em init_principal_cache() conforme a configuração.
+_cache_principais = CacheTTL(ttl_segundos=30)
+
+
+class UsuarioAutenticado(UserMixin):
+    """
+    Dados do usuário logado necessários em toda requisição (identidade,
+    prefeitura, papel e status). É o objeto exposto como current_user, em vez
+    do modelo Usuario, para que possa ser guardado em cache entre requisições
+    sem ficar preso a uma sessão do banco. Não deve ser alterado.
+    """
+    def __init__(self, usuario):
+        self.id = usuario.id
+        self.prefeitura_id = usuario.prefeitura_id
+        self.role = usuario.role
+        self.nome_completo = usuario.nome_completo
+        self.email = usuario.email
+        self._is_active = bool(usuario.is_active)
+
+    @property
+    def is_active(self):
+        return self._is_active
+
+    def get_id(self):
+        return str(self.id)
+
+    def __repr__(self):
+        return f'<UsuarioAutenticado {self.email}>'
+
+
+def init_principal_cache(app):
+    _cache_principais.ttl_segundos = app.config.get('PRINCIPAL_CACHE_TTL_SEGUNDOS', 30)
+
+
+def carregar_principal(usuario_id, prefeitura_id):
+    """
+    Retorna o UsuarioAutenticado do cache ou do banco, ou None se o usuário não
+    existir na prefeitura ou estiver desativado.
+    """
+    from app.models import Usuario
+    chave = (prefeitura_id, int(usuario_id))
+    principal = _cache_principais.get(chave)
+    if principal is None:
+        usuario = Usuario.query.filter_by(id=usuario_id, prefeitura_id=prefeitura_id).first()
+        if usuario is None:
+            return None
+        principal = _cache_principais.set(chave, UsuarioAutenticado(usuario))
+    return principal if principal.is_active else None
+
+
+def invalidar_principal(usuario):
+    """ Deve ser chamada sempre que nome, e-mail, papel ou status do usuário mudar. """
+    _cache_principais.invalidar((usuario.prefeitura_id, usuario.id))
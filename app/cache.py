@@ -0,0 +1,51 @@
+# Arquivo: app/cache.py
+
+import threading
+import time
+
+
+class CacheTTL:
+    """
+    Cache simples em memória, por processo, com expiração por item.
+
+    Usado para dados lidos em quase toda requisição e que mudam raramente
+    (configurações compiladas por prefeitura, principal do usuário logado...).
+    Quem altera o dado de origem deve chamar invalidar(); o TTL limita por
+    quanto tempo os outros workers, que não recebem a invalidação, podem
+    servir um valor antigo.
+    """
+    def __init__(self, ttl_segundos):
+        self.ttl_segundos = ttl_segundos
+        self._itens = {}
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if time.monotonic() >= expira_em:
+                del self._itens[chave]
+                return None
+            return valor
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl_segundos)
+        return valor
+
+    def get_or_set(self, chave, fabrica):
+        """ Retorna o valor em cache ou calcula com fabrica() e guarda. """
+        valor = self.get(chave)
+        if valor is None:
+            valor = self.set(chave, fabrica())
+        return valor
+
+    def invalidar(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
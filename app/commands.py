@@ -4,7 +4,22 @@ import click
 from flask.cli import with_appcontext
 from .extensions import db
 from .models import Prefeitura, Usuario, Paciente, Configuracao, MensagemChatbot
+from .services import fila_atendimento
+from .services.busca_biblioteca import reindexar
+from .services.dados_sinteticos import gerar_prefeituras
+from .services.fluxo_chatbot import FLUXO_PADRAO, MENSAGENS_PADRAO
+from .services.magic_links import purgar_links
+from .services import particoes_auditoria
+from .services.replica_leitura import replica_leitura, somente_leitura
+from .services.plano_consultas import CONSULTAS_MONITORADAS, diagnosticar, parametros_de_amostra
+from .services.outbox import DespachanteOutbox
+from .services.uso_diario import recalcular_uso_diario
+from .services import tempo_espera
+from .services import cache_templates
+from flask import current_app
+import datetime
 import json
+import time
 
 @click.command(name="seed-db")
 @with_appcontext
@@ -37,6 +52,8 @@ def seed_db_command():
             cpf='11122233344', cns='980016293300003', telefone_whatsapp='+5511999998888'
         )
         db.session.add(paciente_teste)
+        db.session.flush()
+        fila_atendimento.enfileirar(paciente_teste, 'ACOLHIMENTO_ENF')
         print("Paciente de teste 'Maria da Silva' criado com sucesso.")
         
     # --- CORREÇÃO E ATUALIZAÇÃO DO FLUXO DO CHATBOT ---
@@ -46,48 +63,18 @@ def seed_db_command():
     Configuracao.query.filter_by(chave='CHATBOT_FLOW_JSON', prefeitura_id=prefeitura_padrao.id).delete()
     print("Configurações antigas do chatbot removidas.")
 
-    # 2. Define a nova estrutura padrão em JSON
-    fluxo_padrao_dict = {
-        "start_node": "boas_vindas",
-        "nodes": {
-            "boas_vindas": {
-                "message_key": "msg_bem_vindo_geral", "type": "static", "next_node": "menu_principal"
-            },
-            "menu_principal": {
-                "message_key": "msg_menu_principal", "type": "options",
-                "options": [
-                    {"label": "Falar com Enfermagem", "next_node": "fila_acolhimento"},
-                    {"label": "Falar com Médico", "next_node": "fila_medico"}
-                ]
-            },
-            "fila_acolhimento": {
-                "message_key": "msg_fila_acolhimento", "type": "action",
-                "action": "JOIN_QUEUE", "queue": "ACOLHIMENTO_ENF"
-            },
-            "fila_medico": {
-                "message_key": "msg_fila_medico", "type": "action",
-                "action": "JOIN_QUEUE", "queue": "CONSULTA_MEDICA"
-            }
-        }
-    }
-    
+    # 2. Grava a estrutura padrão em JSON
     nova_config = Configuracao(
         prefeitura_id=prefeitura_padrao.id,
         chave='CHATBOT_FLOW_JSON',
-        valor=json.dumps(fluxo_padrao_dict, indent=4),
+        valor=json.dumps(FLUXO_PADRAO, indent=4),
         descricao='Definição do fluxo do chatbot em formato JSON.'
     )
     db.session.add(nova_config)
     print("Nova definição de fluxo padrão do chatbot (JSON) criada.")
 
     # 3. Cria as mensagens padrão se não existirem
-    mensagens_padrao = {
-        "msg_bem_vindo_geral": "Olá! Bem-vindo(a) ao nosso serviço de saúde digital.",
-        "msg_menu_principal": "Como podemos ajudar hoje?",
-        "msg_fila_acolhimento": "Ok, você está na fila para falar com a enfermagem. Aguarde um momento.",
-        "msg_fila_medico": "Certo, você está na fila para falar com um médico. Aguarde um momento."
-    }
-    for chave, texto in mensagens_padrao.items():
+    for chave, texto in MENSAGENS_PADRAO.items():
         if not MensagemChatbot.query.filter_by(chave=chave, prefeitura_id=prefeitura_padrao.id).first():
             msg = MensagemChatbot(prefeitura_id=prefeitura_padrao.id, chave=chave, texto=texto, descricao=f"Mensagem para o nó {chave}")
             db.session.add(msg)
@@ -95,4 +82,174 @@ def seed_db_command():
     # --- FIM DA CORREÇÃO ---
 
     db.session.commit()
-    print("Banco de dados populado e corrigido com sucesso.")
\ No newline at end of file
+    print("Banco de dados populado e corrigido com sucesso.")
+
+@click.command(name="recalcular-uso-diario")
+@click.option('--desde', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help="Primeiro dia a recalcular (AAAA-MM-DD). Padrão: ontem.")
+@click.option('--ate', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help="Último dia a recalcular (AAAA-MM-DD). Padrão: hoje.")
+@click.option('--prefeitura-id', type=int, default=None, help="Limita o recálculo a uma prefeitura.")
+@with_appcontext
+def recalcular_uso_diario_command(desde, ate, prefeitura_id):
+    """Recalcula a consolidação diária (LogUsoDiario) a partir de LogUso. Pode ser reexecutado."""
+    hoje = datetime.date.today()
+    desde = desde.date() if desde else hoje - datetime.timedelta(days=1)
+    ate = ate.date() if ate else hoje
+    linhas = recalcular_uso_diario(desde, ate, prefeitura_id)
+    print(f"Consolidação de {desde} a {ate} recalculada: {linhas} linhas gravadas.")
+
+
+@click.command(name="processar-outbox")
+@click.option('--intervalo', type=float, default=2.0, help="Segundos de espera quando não há mensagens prontas.")
+@click.option('--uma-vez', is_flag=True, help="Processa apenas um lote e termina.")
+@with_appcontext
+def processar_outbox_command(intervalo, uma_vez):
+    """Envia as mensagens pendentes da outbox (worker de mensageria)."""
+    despachante = DespachanteOutbox(current_app.config)
+    try:
+        while True:
+            enviadas, falhas = despachante.processar_lote()
+            if enviadas or falhas:
+                print(f"Lote processado: {enviadas} enviadas, {falhas} falhas.")
+            if uma_vez:
+                break
+            if not (enviadas or falhas):
+                time.sleep(intervalo)
+    finally:
+        despachante.encerrar()
+
+
+@click.command(name="reindexar-biblioteca")
+@click.option('--prefeitura-id', type=int, default=None, help="Limita a reindexação a uma prefeitura.")
+@with_appcontext
+def reindexar_biblioteca_command(prefeitura_id):
+    """Recalcula o índice de busca textual da Biblioteca de Cuidados Rápidos."""
+    total = reindexar(prefeitura_id)
+    print(f"{total} conteúdos da biblioteca reindexados.")
+
+
+@click.command(name="purgar-magic-links")
+@with_appcontext
+def purgar_magic_links_command():
+    """Apaga os links mágicos vencidos. Agendar periodicamente (ex: a cada hora)."""
+    total = purgar_links()
+    print(f"{total} links mágicos vencidos apagados.")
+
+
+@click.command(name="seed-scale")
+@click.option('--prefeituras', type=int, default=1, help="Número de prefeituras sintéticas.")
+@click.option('--escala', type=float, default=1.0, help="Volume por prefeitura (1 = 2 mil pacientes, ~5 mil consultas em 6 meses).")
+@click.option('--meses', type=int, default=6, help="Meses de histórico de atendimentos.")
+@click.option('--semente', type=int, default=0, help="Semente do gerador; a mesma semente gera os mesmos dados.")
+@click.option('--prefixo', default='escala', help="Prefixo dos subdomínios (<prefixo>-001, ...).")
+@click.option('--senha', default='1234', help="Senha de todos os usuários gerados.")
+@with_appcontext
+def seed_scale_command(prefeituras, escala, meses, semente, prefixo, senha):
+    """Gera prefeituras com dados sintéticos em volume, para testes de carga. Usar um banco dedicado."""
+    inicio = time.perf_counter()
+    geradas = gerar_prefeituras(prefeituras, escala=escala, meses=meses, semente=semente, prefixo=prefixo, senha=senha)
+    for subdominio, totais in geradas:
+        print(f"{subdominio}: " + ', '.join(f"{total} {tabela}" for tabela, total in totais.items()))
+    linhas = sum(sum(totais.values()) for _, totais in geradas)
+    print(f"{len(geradas)} prefeituras geradas ({linhas} linhas) em {time.perf_counter() - inicio:.1f}s.")
+
+
+@click.command(name="explicar-consultas")
+@click.option('--prefeitura-id', type=int, default=None, help="Prefeitura usada nos parâmetros. Padrão: a com mais consultas.")
+@click.option('--consulta', 'nomes', multiple=True, type=click.Choice(sorted(CONSULTAS_MONITORADAS)), help="Limita a análise (pode repetir).")
+@click.option('--analyze', is_flag=True, help="Usa EXPLAIN ANALYZE (PostgreSQL): executa as consultas e mede as linhas reais.")
+@click.option('--planos', is_flag=True, help="Mostra o plano completo de cada consulta.")
+@click.option('--estrito', is_flag=True, help="Termina com código 1 se houver alertas (para uso em CI).")
+@with_appcontext
+def explicar_consultas_command(prefeitura_id, nomes, analyze, planos, estrito):
+    """Roda EXPLAIN nas consultas mais usadas e aponta leituras sequenciais e índices ruins."""
+    parametros = parametros_de_amostra(prefeitura_id)
+    if parametros is None:
+        raise click.ClickException("Nenhuma consulta cadastrada; popule a base antes (ex: flask seed-scale).")
+    print(f"Parâmetros: prefeitura {parametros.prefeitura_id}, profissional {parametros.profissional_id}, paciente {parametros.paciente_id}.")
+    diagnosticos = diagnosticar(parametros, nomes=set(nomes), analyze=analyze)
+    for diagnostico in diagnosticos:
+        situacao = 'ALERTA' if diagnostico.alertas else 'OK'
+        print(f"[{situacao:6}] {diagnostico.nome}: {', '.join(diagnostico.indices) or 'nenhum índice'}")
+        for alerta in diagnostico.alertas:
+            print(f"         - {alerta}")
+        if planos:
+            print('\n'.join(f"           {linha}" for linha in diagnostico.plano.splitlines()))
+    com_alerta = sum(1 for diagnostico in diagnosticos if diagnostico.alertas)
+    print(f"{len(diagnosticos)} consultas analisadas, {com_alerta} com alertas.")
+    if estrito and com_alerta:
+        raise SystemExit(1)
+
+
+@click.command(name="manter-auditoria")
+@click.option('--sem-criar', is_flag=True, help="Não cria as partições dos próximos meses.")
+@click.option('--sem-arquivar', is_flag=True, help="Não arquiva as partições antigas.")
+@click.option('--sem-expurgar', is_flag=True, help="Não apaga os arquivos com retenção vencida.")
+@with_appcontext
+def manter_auditoria_command(sem_criar, sem_arquivar, sem_expurgar):
+    """Cria as partições futuras dos logs de auditoria, arquiva as antigas e aplica a retenção. Agendar mensalmente."""
+    if not particoes_auditoria.suportado():
+        print("Particionamento dos logs de auditoria disponível apenas no PostgreSQL; nada a fazer.")
+        return
+    if not sem_criar:
+        criadas = particoes_auditoria.criar_particoes()
+        print(f"{len(criadas)} partições criadas" + (f": {', '.join(criadas)}." if criadas else "."))
+    if not sem_arquivar:
+        for tabela, mes in particoes_auditoria.particoes_para_arquivar():
+            linhas = particoes_auditoria.arquivar_particao(tabela, mes)
+            print(f"{particoes_auditoria.nome_particao(tabela, mes)}: {linhas} linhas arquivadas.")
+    if not sem_expurgar:
+        expurgados = particoes_auditoria.aplicar_retencao()
+        for tabela, mes, prefeitura_id, linhas in expurgados:
+            print(f"{tabela} {mes:%Y-%m}, prefeitura {prefeitura_id}: {linhas} linhas expurgadas.")
+        print(f"{len(expurgados)} arquivos expurgados.")
+
+
+@click.command(name="restaurar-auditoria")
+@click.option('--tabela', required=True, type=click.Choice(particoes_auditoria.TABELAS))
+@click.option('--mes', required=True, type=click.DateTime(formats=['%Y-%m']), help="Mês arquivado (AAAA-MM).")
+@with_appcontext
+def restaurar_auditoria_command(tabela, mes):
+    """Anexa de volta um mês arquivado dos logs de auditoria. O próximo manter-auditoria o arquiva de novo."""
+    if not particoes_auditoria.suportado():
+        raise click.ClickException("Disponível apenas no PostgreSQL.")
+    try:
+        linhas = particoes_auditoria.restaurar_particao(tabela, mes.date())
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"{particoes_auditoria.nome_particao(tabela, mes.date())}: {linhas} linhas restauradas.")
+
+
+@click.command(name="verificar-replica")
+@with_appcontext
+def verificar_replica_command():
+    """Mostra o atraso da réplica de leitura e para qual banco as leituras somente leitura estão indo."""
+    if not replica_leitura.configurada:
+        print("DATABASE_REPLICA_URL não definida: todas as leituras vão para o primário.")
+        return
+    atraso = replica_leitura.atraso()
+    print(f"Atraso da réplica: {atraso:.2f}s (máximo {replica_leitura.atraso_maximo:.2f}s).")
+    with somente_leitura():
+        url = db.session.get_bind(clause=db.select(db.literal(1))).url
+    print(f"Leituras marcadas como somente leitura usam {url.render_as_string(hide_password=True)}.")
+
+
+@click.command(name="recalcular-tempos-espera")
+@click.option('--dias', type=int, default=30, help="Dias de atendimentos encerrados considerados.")
+@click.option('--prefeitura-id', type=int, default=None, help="Limita o recálculo a uma prefeitura.")
+@with_appcontext
+def recalcular_tempos_espera_command(dias, prefeitura_id):
+    """Reconstrói as estatísticas de tempo de atendimento das filas a partir das consultas encerradas."""
+    total = tempo_espera.recalcular(prefeitura_id, dias=dias)
+    print(f"Estatísticas recalculadas a partir de {total} atendimentos.")
+
+
+@click.command(name="precompilar-templates")
+@with_appcontext
+def precompilar_templates_command():
+    """Compila todos os templates para o cache de bytecode (rodar no deploy, antes de subir os workers)."""
+    compilados, erros = cache_templates.precompilar(current_app)
+    for nome, erro in erros:
+        print(f"ERRO em {nome}: {erro}")
+    print(f"{compilados} templates compilados em {current_app.jinja_env.bytecode_cache.directory}.")
+    if erros:
+        raise click.ClickException(f"{len(erros)} templates com erro.")
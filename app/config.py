@@ -12,6 +12,87 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Pool de conexões de cada engine, por processo (aplicado em app/services/replica_leitura.py;
+    # ignorado no SQLite). Dimensionar pool_size + max_overflow vezes o número de workers
+    # abaixo do max_connections do PostgreSQL.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT_SEGUNDOS = int(os.environ.get('DB_POOL_TIMEOUT_SEGUNDOS', 10))
+    DB_POOL_RECYCLE_SEGUNDOS = int(os.environ.get('DB_POOL_RECYCLE_SEGUNDOS', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_CONNECT_TIMEOUT_SEGUNDOS = int(os.environ.get('DB_CONNECT_TIMEOUT_SEGUNDOS', 5))
+
+    # Réplica de leitura para relatórios e painéis (app/services/replica_leitura.py)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    REPLICA_LAG_MAXIMO_SEGUNDOS = float(os.environ.get('REPLICA_LAG_MAXIMO_SEGUNDOS', 5))
+    REPLICA_VERIFICACAO_SEGUNDOS = 2
+
+    # Tempo máximo que um usuário desativado/alterado pode continuar sendo
+    # servido a partir do cache de sessão em outros workers.
+    PRINCIPAL_CACHE_TTL_SEGUNDOS = int(os.environ.get('PRINCIPAL_CACHE_TTL_SEGUNDOS', 30))
+
+    # Validade dos links mágicos do Portal do Paciente (app/services/magic_links.py)
+    MAGIC_LINK_VALIDADE_MINUTOS = int(os.environ.get('MAGIC_LINK_VALIDADE_MINUTOS', 15))
+
+    # Versão do painel por prefeitura, compartilhada entre os workers (app/services/versao_painel.py).
+    # Sem REDIS_URL a versão fica em memória em cada processo.
+    REDIS_URL = os.environ.get('REDIS_URL')
+    PAINEL_POLLING_SEGUNDOS = int(os.environ.get('PAINEL_POLLING_SEGUNDOS', 10))
+
+    # Templates (app/services/cache_templates.py): diretório do bytecode compilado, compartilhado
+    # pelos workers (padrão: instance/jinja_bytecode), e TTL dos fragmentos {% cache %}.
+    TEMPLATES_BYTECODE_DIRETORIO = os.environ.get('TEMPLATES_BYTECODE_DIRETORIO')
+    FRAGMENTOS_TTL_SEGUNDOS = int(os.environ.get('FRAGMENTOS_TTL_SEGUNDOS', 300))
+
     # Configurações para o Celery
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
-    CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')
\ No newline at end of file
+    CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')
+
+    # Escrita em segundo plano dos logs de auditoria (app/services/auditoria.py)
+    AUDITORIA_ASSINCRONA = os.environ.get('AUDITORIA_ASSINCRONA', 'true').lower() == 'true'
+    AUDITORIA_INTERVALO_SEGUNDOS = float(os.environ.get('AUDITORIA_INTERVALO_SEGUNDOS', 2))
+    AUDITORIA_TAMANHO_LOTE = int(os.environ.get('AUDITORIA_TAMANHO_LOTE', 500))
+    AUDITORIA_LIMITE_BUFFER = int(os.environ.get('AUDITORIA_LIMITE_BUFFER', 50000))
+
+    # Partições mensais, arquivamento e retenção dos logs de auditoria (app/services/particoes_auditoria.py)
+    AUDITORIA_MESES_ONLINE = int(os.environ.get('AUDITORIA_MESES_ONLINE', 12))
+    AUDITORIA_PARTICOES_A_FRENTE = int(os.environ.get('AUDITORIA_PARTICOES_A_FRENTE', 3))
+    AUDITORIA_ARQUIVO_DIRETORIO = os.environ.get('AUDITORIA_ARQUIVO_DIRETORIO')  # padrão: <instance>/arquivo_auditoria
+    AUDITORIA_RETENCAO_MESES = int(os.environ.get('AUDITORIA_RETENCAO_MESES', 60))  # por prefeitura em Configuracao; nunca abaixo do mínimo legal
+
+    # Outbox de mensagens (app/services/outbox.py)
+    OUTBOX_PROVEDOR_PADRAO = os.environ.get('OUTBOX_PROVEDOR_PADRAO', 'whatsapp')
+    OUTBOX_TAMANHO_LOTE = int(os.environ.get('OUTBOX_TAMANHO_LOTE', 50))
+    OUTBOX_MAX_TENTATIVAS = int(os.environ.get('OUTBOX_MAX_TENTATIVAS', 8))
+    OUTBOX_BACKOFF_BASE_SEGUNDOS = 5
+    OUTBOX_BACKOFF_MAX_SEGUNDOS = 3600
+    OUTBOX_RESERVA_SEGUNDOS = 120
+    OUTBOX_CONCORRENCIA = {'whatsapp': 4, 'fake': 4}
+
+    # Provedores externos (app/services/gateways.py). Sem a URL, o gateway roda em modo de exemplo.
+    GATEWAY_VIDEO_URL = os.environ.get('GATEWAY_VIDEO_URL')
+    GATEWAY_VIDEO_TOKEN = os.environ.get('GATEWAY_VIDEO_TOKEN')
+    GATEWAY_WHATSAPP_URL = os.environ.get('GATEWAY_WHATSAPP_URL')
+    GATEWAY_WHATSAPP_TOKEN = os.environ.get('GATEWAY_WHATSAPP_TOKEN')
+    GATEWAY_ASSINATURA_URL = os.environ.get('GATEWAY_ASSINATURA_URL')
+    GATEWAY_ASSINATURA_TOKEN = os.environ.get('GATEWAY_ASSINATURA_TOKEN')
+    GATEWAY_TIMEOUT_SEGUNDOS = float(os.environ.get('GATEWAY_TIMEOUT_SEGUNDOS', 5))
+    # Conexões (e chamadas simultâneas) por provedor em cada processo.
+    GATEWAY_CONEXOES = {'video': 10, 'whatsapp': 8, 'assinatura': 4}
+    GATEWAY_ESPERA_CONEXAO_SEGUNDOS = 1.0
+    GATEWAY_FALHAS_PARA_ABRIR = 5
+    GATEWAY_CIRCUITO_ABERTO_SEGUNDOS = 30
+
+    # Geração dos PDFs dos documentos (app/services/documentos_pdf.py)
+    PDF_RENDERIZACAO_ASSINCRONA = os.environ.get('PDF_RENDERIZACAO_ASSINCRONA', 'true').lower() == 'true'
+    PDF_WORKERS = int(os.environ.get('PDF_WORKERS', 2))
+    PDF_DIRETORIO = os.environ.get('PDF_DIRETORIO')  # padrão: <instance>/documentos
+
+    # Métricas de SQL por requisição e endpoint /metrics (app/services/metricas_sql.py)
+    METRICAS_HABILITADAS = os.environ.get('METRICAS_HABILITADAS', 'true').lower() == 'true'
+    # /metrics e /metrics/sql-lentas só respondem com "Authorization: Bearer <METRICAS_TOKEN>"
+    # (o mesmo token no scrape do Prometheus); sem token definido, os dois ficam fechados (404).
+    METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+    METRICAS_LIMITE_N_MAIS_1 = int(os.environ.get('METRICAS_LIMITE_N_MAIS_1', 5))
+    METRICAS_TOTAL_SQL_LENTAS = 5
+    METRICAS_CABECALHO_SQL = os.environ.get('METRICAS_CABECALHO_SQL', 'false').lower() == 'true'  # sempre ativo em debug
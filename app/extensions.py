@@ -3,8 +3,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from .services.replica_leitura import SessaoRoteada
 
 # Apenas declaramos os objetos aqui. A inicialização será feita na fábrica.
-db = SQLAlchemy()
+# A sessão envia para a réplica as leituras marcadas como somente leitura.
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 migrate = Migrate()
 login_manager = LoginManager()
\ No newline at end of file
@@ -1,21 +1,34 @@
 # Arquivo: app/gestor/routes.py
 
 from . import bp
-from flask import render_template, redirect, url_for, flash, request, current_app
+from flask import render_template, redirect, url_for, flash, request, current_app, Response, stream_with_context, abort, jsonify, send_file
 from flask_login import login_required, current_user
 from app.models import (
     Usuario, Paciente, Consulta, Documento, Configuracao, 
-    Tarefa, MensagemChatbot, BibliotecaConteudo, LogUso, LogAcessoPaciente,
+    Tarefa, MensagemChatbot, BibliotecaConteudo, LogUsoDiario,
     SolicitacaoCorrecao
 )
 from app.extensions import db
+from app.auth.principal import invalidar_principal
 from app.decorators import admin_required
-from app.services.video_gateway import VideoGateway
+from app.services.gateways import gateways, ErroGateway
+from app.services import agenda, fila_atendimento, busca_biblioteca, tempo_espera
+from app.services.fluxo_chatbot import compilar_fluxo, publicar_fluxo, FluxoInvalido
+from app.services.auditoria import auditoria
+from app.services.cache_templates import invalidar_fragmentos
+from app.services.documentos_pdf import renderizador_pdf, invalidar_layouts
+from app.services.horario_funcionamento import HorarioFuncionamento, invalidar_horario
+from app.services.importacao_pacientes import importar_pacientes_csv
+from app.services.particoes_auditoria import CHAVE_RETENCAO, validar_retencao
+from app.services.replica_leitura import somente_leitura
+from app.services.versao_painel import versoes_painel
 from app.utils import is_servico_aberto
 
 import datetime
 import uuid 
-from sqlalchemy import func
+from sqlalchemy import func, select, or_, and_, extract
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import joinedload
 import csv
 import io
 import json
@@ -29,49 +42,131 @@ def dashboard():
     if current_user.role == 'GESTOR':
         usuarios = Usuario.query.filter_by(prefeitura_id=current_user.prefeitura_id).order_by(Usuario.nome_completo).all()
         return render_template('gestor/dashboard.html', usuarios=usuarios, status_operacional=status_operacional)
-    else:
-        # Lógica do Profissional
-        fila_acolhimento = Paciente.query.filter_by(prefeitura_id=current_user.prefeitura_id, status='AGUARDANDO_ACOLHIMENTO').all()
-        fila_medica = Paciente.query.filter_by(prefeitura_id=current_user.prefeitura_id, status='AGUARDANDO_MEDICO').all()
-        em_atendimento = Consulta.query.filter_by(prefeitura_id=current_user.prefeitura_id, profissional_id=current_user.id, status='INICIADA').first()
-        hoje = datetime.date.today()
-        inicio_dia = datetime.datetime.combine(hoje, datetime.time.min)
-        fim_dia = datetime.datetime.combine(hoje, datetime.time.max)
-        atendimentos_dia = Consulta.query.filter(
-            Consulta.prefeitura_id == current_user.prefeitura_id,
-            Consulta.profissional_id == current_user.id,
-            Consulta.status.in_(['FINALIZADA', 'TRANSFERIDO']),
-            Consulta.data_fim.between(inicio_dia, fim_dia)
-        ).order_by(Consulta.data_fim.desc()).limit(5).all()
-        agenda_do_dia = Consulta.query.filter(
-            Consulta.prefeitura_id == current_user.prefeitura_id,
-            Consulta.profissional_id == current_user.id,
-            Consulta.tipo == 'ELETIVA',
-            Consulta.status == 'AGENDADA',
-            Consulta.data_inicio.between(inicio_dia, fim_dia)
-        ).order_by(Consulta.data_inicio.asc()).all()
-        tarefas_pendentes = Tarefa.query.filter_by(
-            prefeitura_id=current_user.prefeitura_id,
-            atribuido_para_id=current_user.id,
-            status='PENDENTE'
-        ).order_by(Tarefa.data_criacao.asc()).all()
-        outros_profissionais = Usuario.query.filter(
-            Usuario.prefeitura_id == current_user.prefeitura_id,
-            Usuario.id != current_user.id, 
-            Usuario.role == 'PROFISSIONAL_SAUDE'
-        ).order_by(Usuario.nome_completo).all()
-        
-        return render_template(
-            'profissional/dashboard.html',
-            fila_acolhimento=fila_acolhimento,
-            fila_medica=fila_medica,
-            em_atendimento=em_atendimento,
-            atendimentos_dia=atendimentos_dia,
-            agenda_do_dia=agenda_do_dia,
-            tarefas_pendentes=tarefas_pendentes,
-            outros_profissionais=outros_profissionais,
-            status_operacional=status_operacional 
-        )
+    # O ETag é lido antes dos dados: se algo mudar no meio, o próximo polling busca de novo.
+    etag_painel = _etag_painel(status_aberto)
+    return render_template(
+        'profissional/dashboard.html',
+        status_operacional=status_operacional,
+        intervalo_polling=current_app.config.get('PAINEL_POLLING_SEGUNDOS', 10),
+        etag_painel=etag_painel and f'"{etag_painel}"',
+        **_painel_profissional()
+    )
+
+def _painel_profissional():
+    """ Dados do painel do profissional logado (página e /api/painel). """
+    fila_acolhimento = fila_atendimento.listar(current_user.prefeitura_id, 'ACOLHIMENTO_ENF')
+    fila_medica = fila_atendimento.listar(current_user.prefeitura_id, 'CONSULTA_MEDICA')
+    em_atendimento = Consulta.query.options(joinedload(Consulta.paciente)).filter_by(
+        prefeitura_id=current_user.prefeitura_id, profissional_id=current_user.id, status='INICIADA'
+    ).first()
+    hoje = datetime.date.today()
+    inicio_dia = datetime.datetime.combine(hoje, datetime.time.min)
+    fim_dia = datetime.datetime.combine(hoje, datetime.time.max)
+    atendimentos_dia = Consulta.query.options(joinedload(Consulta.paciente)).filter(
+        Consulta.prefeitura_id == current_user.prefeitura_id,
+        Consulta.profissional_id == current_user.id,
+        Consulta.status.in_(['FINALIZADA', 'TRANSFERIDO']),
+        Consulta.data_fim.between(inicio_dia, fim_dia)
+    ).order_by(Consulta.data_fim.desc()).limit(5).all()
+    agenda_do_dia = Consulta.query.options(joinedload(Consulta.paciente)).filter(
+        Consulta.prefeitura_id == current_user.prefeitura_id,
+        Consulta.profissional_id == current_user.id,
+        Consulta.tipo == 'ELETIVA',
+        Consulta.status == 'AGENDADA',
+        Consulta.data_inicio.between(inicio_dia, fim_dia)
+    ).order_by(Consulta.data_inicio.asc()).all()
+    tarefas_pendentes = Tarefa.query.options(joinedload(Tarefa.criado_por)).filter_by(
+        prefeitura_id=current_user.prefeitura_id,
+        atribuido_para_id=current_user.id,
+        status='PENDENTE'
+    ).order_by(Tarefa.data_criacao.asc()).all()
+    outros_profissionais = Usuario.query.filter(
+        Usuario.prefeitura_id == current_user.prefeitura_id,
+        Usuario.id != current_user.id, 
+        Usuario.role == 'PROFISSIONAL_SAUDE'
+    ).order_by(Usuario.nome_completo).all()
+    return dict(
+        fila_acolhimento=fila_acolhimento,
+        fila_medica=fila_medica,
+        previsao_acolhimento=tempo_espera.previsao(current_user.prefeitura_id, 'ACOLHIMENTO_ENF'),
+        previsao_medica=tempo_espera.previsao(current_user.prefeitura_id, 'CONSULTA_MEDICA'),
+        em_atendimento=em_atendimento,
+        atendimentos_dia=atendimentos_dia,
+        agenda_do_dia=agenda_do_dia,
+        tarefas_pendentes=tarefas_pendentes,
+        outros_profissionais=outros_profissionais
+    )
+
+def _etag_painel(status_aberto):
+    """ ETag do painel do usuário logado, ou None se a versão estiver indisponível. """
+    versao = versoes_painel.atual(current_user.prefeitura_id)
+    if versao is None:
+        return None
+    # O painel também depende do usuário, do dia (agenda) e do horário de funcionamento.
+    return f'{current_user.prefeitura_id}.{current_user.id}.{versao}.{datetime.date.today():%Y%m%d}.{int(status_aberto)}'
+
+def _fila_json(entradas, previsao, fila):
+    return [{
+        'paciente_id': entrada.paciente_id,
+        'paciente_nome': entrada.paciente_nome,
+        'entrada_em': entrada.entrada_em.strftime('%H:%M'),
+        'espera_minutos': previsao.para_posicao(posicao).minutos,
+        'url_chamar': url_for('.iniciar_atendimento', paciente_id=entrada.paciente_id, tipo_atendimento=fila),
+    } for posicao, entrada in enumerate(entradas, start=1)]
+
+@bp.route('/api/painel')
+@login_required
+def api_painel():
+    """
+    Estado do painel do profissional em JSON, para o polling da página.
+    O ETag vem da versão do painel da prefeitura (app/services/versao_painel.py):
+    enquanto nada muda, a resposta é 304 sem nenhuma consulta ao banco.
+    """
+    if current_user.role == 'GESTOR':
+        abort(404)
+    status_aberto, mensagem_status = is_servico_aberto(current_user.prefeitura_id)
+    etag = _etag_painel(status_aberto)
+    if etag is not None:
+        if etag in request.if_none_match:
+            resposta = Response(status=304)
+            resposta.set_etag(etag)
+            resposta.headers['Cache-Control'] = 'no-cache'
+            return resposta
+    painel = _painel_profissional()
+    em_atendimento = painel['em_atendimento']
+    resposta = jsonify({
+        'status_operacional': {'aberto': status_aberto, 'mensagem': mensagem_status},
+        'fila_acolhimento': _fila_json(painel['fila_acolhimento'], painel['previsao_acolhimento'], 'ACOLHIMENTO_ENF'),
+        'fila_medica': _fila_json(painel['fila_medica'], painel['previsao_medica'], 'CONSULTA_MEDICA'),
+        'em_atendimento': em_atendimento and {
+            'id': em_atendimento.id,
+            'paciente_nome': em_atendimento.paciente.nome_completo,
+            'tipo': em_atendimento.tipo.replace('_', ' ').title(),
+            'inicio': em_atendimento.data_inicio.strftime('%H:%M'),
+            'url_sala': url_for('.sala_atendimento', consulta_id=em_atendimento.id),
+        },
+        'agenda_do_dia': [{
+            'id': consulta.id,
+            'horario': consulta.data_inicio.strftime('%H:%M'),
+            'paciente_nome': consulta.paciente.nome_completo,
+            'url_iniciar': url_for('.iniciar_atendimento_agendado', consulta_id=consulta.id),
+        } for consulta in painel['agenda_do_dia']],
+        'atendimentos_dia': [{
+            'paciente_nome': consulta.paciente.nome_completo,
+            'resumo': consulta.resumo_atendimento or 'Consulta de rotina',
+            'fim': consulta.data_fim.strftime('%H:%M'),
+        } for consulta in painel['atendimentos_dia']],
+        'tarefas_pendentes': [{
+            'id': tarefa.id,
+            'titulo': tarefa.titulo,
+            'criado_por': tarefa.criado_por.nome_completo,
+            'url_concluir': url_for('.concluir_tarefa', tarefa_id=tarefa.id),
+        } for tarefa in painel['tarefas_pendentes']],
+    })
+    if etag is not None:
+        resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
 
 @bp.route('/atendimento/sala/<int:consulta_id>')
 @login_required
@@ -82,18 +177,33 @@ def sala_atendimento(consulta_id):
         profissional_id=current_user.id,
         status='INICIADA'
     ).first_or_404()
-    video_service = VideoGateway(current_app.config)
-    dados_da_sala = video_service.criar_sala_teleconsulta(consulta.id)
+    try:
+        dados_da_sala = gateways.obter('video').criar_sala_teleconsulta(consulta.id)
+    except ErroGateway as e:
+        current_app.logger.warning('Falha ao criar a sala da consulta %s: %s', consulta.id, e)
+        flash('O serviço de vídeo está indisponível no momento. Tente novamente em instantes.', 'danger')
+        return redirect(url_for('gestor.dashboard'))
     return render_template('profissional/sala_atendimento.html', consulta=consulta, dados_sala=dados_da_sala)
 
-@bp.route('/atendimento/iniciar/<int:paciente_id>/<string:tipo_atendimento>', methods=['POST'])
-@login_required
-def iniciar_atendimento(paciente_id, tipo_atendimento):
+def _atendimento_em_andamento():
     atendimento_existente = Consulta.query.filter_by(prefeitura_id=current_user.prefeitura_id, profissional_id=current_user.id, status='INICIADA').first()
     if atendimento_existente:
         flash('Você já possui um atendimento em andamento. Finalize-o antes de chamar um novo paciente.', 'warning')
-        return redirect(url_for('gestor.dashboard'))
-    paciente = Paciente.query.filter_by(id=paciente_id, prefeitura_id=current_user.prefeitura_id).first_or_404()
+        return True
+    return False
+
+def _atendimento_concorrente():
+    """
+    Outra requisição do profissional (ex: clique duplo) iniciou um atendimento
+    entre a verificação e o commit: ix_consulta_em_andamento é único. O
+    rollback devolve à fila o paciente retirado nesta requisição.
+    """
+    db.session.rollback()
+    flash('Você já possui um atendimento em andamento. Finalize-o antes de chamar um novo paciente.', 'warning')
+    return redirect(url_for('gestor.dashboard'))
+
+def _iniciar_consulta(paciente, tipo_atendimento):
+    """ Cria a consulta de um paciente já retirado da fila e confirma tudo em um único commit. """
     paciente.status = 'EM_ATENDIMENTO'
     nova_consulta = Consulta(
         prefeitura_id=current_user.prefeitura_id, 
@@ -105,27 +215,58 @@ def iniciar_atendimento(paciente_id, tipo_atendimento):
         data_inicio=datetime.datetime.utcnow()
     )
     db.session.add(nova_consulta)
-    log_uso = LogUso(
-        prefeitura_id=current_user.prefeitura_id, 
+    try:
+        # O flush obtém o id da consulta para que os logs já nasçam vinculados a
+        # ela, e tudo é confirmado em um único commit.
+        db.session.flush()
+        auditoria.registrar_acesso(
+            duravel=True,
+            prefeitura_id=current_user.prefeitura_id,
+            usuario_id=current_user.id,
+            paciente_id=paciente.id,
+            consulta_id=nova_consulta.id,
+            acao=f"INICIOU_ATENDIMENTO ({tipo_atendimento})"
+        )
+        db.session.commit()
+    except IntegrityError:
+        return _atendimento_concorrente()
+    auditoria.registrar_uso(
+        prefeitura_id=current_user.prefeitura_id,
         event_type='CONSULTA_INICIADA',
         unit='consulta',
+        related_consulta_id=nova_consulta.id,
         related_usuario_id=current_user.id
     )
-    db.session.add(log_uso)
-    log_acesso = LogAcessoPaciente(
-        prefeitura_id=current_user.prefeitura_id,
-        usuario_id=current_user.id,
-        paciente_id=paciente.id,
-        acao=f"INICIOU_ATENDIMENTO ({tipo_atendimento})"
-    )
-    db.session.add(log_acesso)
-    db.session.commit()
-    log_uso.related_consulta_id = nova_consulta.id
-    log_acesso.consulta_id = nova_consulta.id
-    db.session.commit()
     flash(f'Atendimento com {paciente.nome_completo} iniciado.', 'success')
     return redirect(url_for('.sala_atendimento', consulta_id=nova_consulta.id))
 
+@bp.route('/atendimento/iniciar/<int:paciente_id>/<string:tipo_atendimento>', methods=['POST'])
+@login_required
+def iniciar_atendimento(paciente_id, tipo_atendimento):
+    if _atendimento_em_andamento():
+        return redirect(url_for('gestor.dashboard'))
+    paciente = Paciente.query.filter_by(id=paciente_id, prefeitura_id=current_user.prefeitura_id).first_or_404()
+    if tipo_atendimento not in fila_atendimento.FILAS:
+        abort(404)
+    if not fila_atendimento.remover(current_user.prefeitura_id, tipo_atendimento, paciente.id):
+        flash(f'{paciente.nome_completo} não está mais aguardando nesta fila.', 'warning')
+        return redirect(url_for('gestor.dashboard'))
+    return _iniciar_consulta(paciente, tipo_atendimento)
+
+@bp.route('/atendimento/chamar-proximo/<string:tipo_atendimento>', methods=['POST'])
+@login_required
+def chamar_proximo(tipo_atendimento):
+    if tipo_atendimento not in fila_atendimento.FILAS:
+        abort(404)
+    if _atendimento_em_andamento():
+        return redirect(url_for('gestor.dashboard'))
+    # Cada profissional recebe um paciente diferente, mesmo com chamadas simultâneas.
+    entrada = fila_atendimento.desenfileirar(current_user.prefeitura_id, tipo_atendimento)
+    if entrada is None:
+        flash('Não há pacientes aguardando nesta fila.', 'info')
+        return redirect(url_for('gestor.dashboard'))
+    return _iniciar_consulta(db.session.get(Paciente, entrada.paciente_id), tipo_atendimento)
+
 @bp.route('/atendimento/finalizar/<int:consulta_id>', methods=['POST'])
 @login_required
 def finalizar_atendimento(consulta_id):
@@ -139,6 +280,8 @@ def finalizar_atendimento(consulta_id):
     paciente = Paciente.query.get(consulta.paciente_id)
     paciente.status = 'FINALIZADO'
     db.session.commit()
+    if consulta.tipo == 'ELETIVA':
+        agenda.invalidar_agenda(current_user.prefeitura_id)
     flash(f'Atendimento com {paciente.nome_completo} finalizado com sucesso.', 'success')
     return redirect(url_for('gestor.dashboard'))
 
@@ -153,8 +296,10 @@ def transferir_para_medico(consulta_id):
     consulta.data_fim = datetime.datetime.utcnow()
     consulta.resumo_atendimento = request.form.get('motivo_transferencia', 'Transferido para avaliação médica.')
     paciente = Paciente.query.get(consulta.paciente_id)
-    paciente.status = 'AGUARDANDO_MEDICO'
+    fila_atendimento.enfileirar(paciente, 'CONSULTA_MEDICA')
     db.session.commit()
+    if consulta.tipo == 'ELETIVA':
+        agenda.invalidar_agenda(current_user.prefeitura_id)
     flash(f'Paciente {paciente.nome_completo} transferido para a fila médica.', 'info')
     return redirect(url_for('gestor.dashboard'))
 
@@ -172,23 +317,26 @@ def iniciar_atendimento_agendado(consulta_id):
     consulta.status = 'INICIADA'
     paciente = Paciente.query.get(consulta.paciente_id)
     paciente.status = 'EM_ATENDIMENTO'
-    log_uso = LogUso(
-        prefeitura_id=current_user.prefeitura_id,
-        event_type='CONSULTA_AGENDADA_INICIADA',
-        unit='consulta',
-        related_consulta_id=consulta.id,
-        related_usuario_id=current_user.id
-    )
-    db.session.add(log_uso)
-    log_acesso = LogAcessoPaciente(
+    auditoria.registrar_acesso(
+        duravel=True,
         prefeitura_id=current_user.prefeitura_id,
         usuario_id=current_user.id,
         paciente_id=paciente.id,
         consulta_id=consulta.id,
         acao="INICIOU_ATENDIMENTO_AGENDADO"
     )
-    db.session.add(log_acesso)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        return _atendimento_concorrente()
+    agenda.invalidar_agenda(current_user.prefeitura_id)
+    auditoria.registrar_uso(
+        prefeitura_id=current_user.prefeitura_id,
+        event_type='CONSULTA_AGENDADA_INICIADA',
+        unit='consulta',
+        related_consulta_id=consulta.id,
+        related_usuario_id=current_user.id
+    )
     flash(f'Atendimento agendado com {paciente.nome_completo} foi iniciado.', 'success')
     return redirect(url_for('.sala_atendimento', consulta_id=consulta.id))
 
@@ -230,6 +378,7 @@ def editar_usuario(id):
         if password:
             usuario.set_password(password)
         db.session.commit()
+        invalidar_principal(usuario)
         flash('Usuário atualizado com sucesso!', 'success')
         return redirect(url_for('gestor.dashboard'))
     return render_template('gestor/form_usuario.html', titulo='Editar Usuário', usuario=usuario)
@@ -244,6 +393,7 @@ def toggle_active_usuario(id):
         return redirect(url_for('gestor.dashboard'))
     usuario.is_active = not usuario.is_active
     db.session.commit()
+    invalidar_principal(usuario)
     status = "ativado" if usuario.is_active else "desativado"
     flash(f'Usuário {usuario.nome_completo} foi {status}.', 'info')
     return redirect(url_for('gestor.dashboard'))
@@ -255,14 +405,15 @@ def pagina_documentos(consulta_id):
     if consulta.profissional_id != current_user.id:
         flash('Acesso negado.', 'danger')
         return redirect(url_for('gestor.dashboard'))
-    log_acesso = LogAcessoPaciente(
+    auditoria.registrar_acesso(
+        duravel=True,
         prefeitura_id=current_user.prefeitura_id,
         usuario_id=current_user.id,
         paciente_id=consulta.paciente_id,
         consulta_id=consulta.id,
         acao="ACESSOU_PAGINA_DOCUMENTOS"
     )
-    db.session.add(log_acesso)
+    # Acesso a dados do paciente (LGPD): gravado antes de a resposta sair.
     db.session.commit()
     return render_template('profissional/documentos.html', consulta=consulta)
 
@@ -283,25 +434,82 @@ def criar_atestado(consulta_id):
         conteudo=conteudo_atestado
     )
     db.session.add(novo_documento)
-    log_uso = LogUso(
+    db.session.commit()
+    # O PDF é gerado em segundo plano; a página acompanha pelo status_documento.
+    renderizador_pdf.agendar(novo_documento.id)
+    auditoria.registrar_uso(
         prefeitura_id=current_user.prefeitura_id,
         event_type='DOCUMENTO_EMITIDO',
         unit='documento',
         related_consulta_id=consulta.id,
         related_usuario_id=current_user.id
     )
-    db.session.add(log_uso)
-    db.session.commit()
-    flash('Atestado emitido com sucesso!', 'success')
+    flash('Atestado emitido com sucesso! O PDF estará disponível em instantes.', 'success')
     return redirect(url_for('gestor.pagina_documentos', consulta_id=consulta.id))
 
+def _documento_do_profissional(documento_id):
+    documento = Documento.query.filter_by(id=documento_id, prefeitura_id=current_user.prefeitura_id).first_or_404()
+    if documento.consulta.profissional_id != current_user.id:
+        abort(403)
+    return documento
+
+@bp.route('/documentos/<int:documento_id>/status', methods=['GET'])
+@login_required
+def status_documento(documento_id):
+    documento = _documento_do_profissional(documento_id)
+    status = renderizador_pdf.status(documento)
+    return jsonify({
+        'status': status,
+        'url_pdf': url_for('gestor.baixar_documento', documento_id=documento.id) if status == 'PRONTO' else None,
+    })
+
+@bp.route('/documentos/<int:documento_id>/pdf', methods=['GET'])
+@login_required
+def baixar_documento(documento_id):
+    documento = _documento_do_profissional(documento_id)
+    if renderizador_pdf.status(documento) != 'PRONTO':
+        return jsonify({'status': documento.status_pdf}), 202
+    auditoria.registrar_acesso(
+        duravel=True,
+        prefeitura_id=current_user.prefeitura_id,
+        usuario_id=current_user.id,
+        paciente_id=documento.consulta.paciente_id,
+        consulta_id=documento.consulta_id,
+        acao=f"BAIXOU_DOCUMENTO ({documento.id})"
+    )
+    # Acesso a dados do paciente (LGPD): gravado antes de a resposta sair.
+    db.session.commit()
+    # O arquivo é imutável (nome = hash do conteúdo), então pode ser revalidado pelo ETag.
+    return send_file(
+        renderizador_pdf.caminho(documento.hash_pdf),
+        mimetype='application/pdf',
+        download_name=f"{documento.tipo.lower()}_{documento.id}.pdf",
+        etag=documento.hash_pdf,
+        conditional=True,
+        max_age=3600
+    )
+
 @bp.route('/configuracoes', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def gerenciar_configuracoes():
     if request.method == 'POST':
+        configs_atuais = {c.chave: c for c in Configuracao.query.filter_by(prefeitura_id=current_user.prefeitura_id).all()}
+        novos_valores = {chave: c.valor for chave, c in configs_atuais.items()}
+        novos_valores.update(request.form.items())
+        try:
+            HorarioFuncionamento.compilar(novos_valores)
+        except ValueError as e:
+            flash(f'Horário de funcionamento inválido: {e}', 'danger')
+            return redirect(url_for('gestor.gerenciar_configuracoes'))
+        if novos_valores.get(CHAVE_RETENCAO, '').strip():
+            try:
+                validar_retencao(novos_valores[CHAVE_RETENCAO])
+            except ValueError as e:
+                flash(f'Retenção dos registros de auditoria inválida: {e}', 'danger')
+                return redirect(url_for('gestor.gerenciar_configuracoes'))
         for chave, valor in request.form.items():
-            config = Configuracao.query.filter_by(chave=chave, prefeitura_id=current_user.prefeitura_id).first()
+            config = configs_atuais.get(chave)
             if config:
                 config.valor = valor
             else:
@@ -312,6 +520,9 @@ def gerenciar_configuracoes():
                 )
                 db.session.add(config)
         db.session.commit()
+        invalidar_horario(current_user.prefeitura_id)
+        invalidar_layouts()
+        invalidar_fragmentos(current_user.prefeitura_id)
         flash('Configurações salvas com sucesso!', 'success')
         return redirect(url_for('gestor.gerenciar_configuracoes'))
     configs_query = Configuracao.query.filter_by(prefeitura_id=current_user.prefeitura_id).all()
@@ -386,6 +597,26 @@ def editor_chatbot():
 
     if request.method == 'POST':
         flow_json_str = request.form.get('flow_definition')
+        mensagens_existentes = {
+            msg.chave: msg for msg in MensagemChatbot.query.filter_by(prefeitura_id=current_user.prefeitura_id).all()
+        }
+        textos = {chave: msg.texto for chave, msg in mensagens_existentes.items()}
+        for chave, texto in request.form.items():
+            if chave.startswith('text_') and chave[len('text_'):] in textos:
+                textos[chave[len('text_'):]] = texto
+
+        # Valida e compila o fluxo antes de gravar; um fluxo quebrado não chega aos pacientes.
+        try:
+            fluxo = compilar_fluxo(json.loads(flow_json_str or ''), textos)
+        except json.JSONDecodeError:
+            flash('A definição do fluxo não é um JSON válido. Nada foi salvo.', 'danger')
+            return redirect(url_for('gestor.editor_chatbot'))
+        except FluxoInvalido as e:
+            for erro in e.erros:
+                flash(erro, 'danger')
+            flash('O fluxo possui erros e não foi salvo.', 'danger')
+            return redirect(url_for('gestor.editor_chatbot'))
+
         if config_fluxo:
             config_fluxo.valor = flow_json_str
         else:
@@ -397,15 +628,14 @@ def editor_chatbot():
             )
             db.session.add(config_fluxo)
 
-        for chave, texto in request.form.items():
-            if chave.startswith('text_'):
-                msg_chave = chave.split('text_')[1]
-                mensagem = MensagemChatbot.query.filter_by(chave=msg_chave, prefeitura_id=current_user.prefeitura_id).first()
-                if mensagem:
-                    mensagem.texto = texto
-        
+        for chave, mensagem in mensagens_existentes.items():
+            mensagem.texto = textos[chave]
+
         db.session.commit()
-        flash('Fluxo do chatbot salvo com sucesso!', 'success')
+        publicar_fluxo(current_user.prefeitura_id, fluxo)
+        for aviso in fluxo.avisos:
+            flash(aviso, 'warning')
+        flash(f'Fluxo do chatbot salvo com sucesso! (versão {fluxo.versao})', 'success')
         return redirect(url_for('gestor.editor_chatbot'))
 
     mensagens = MensagemChatbot.query.filter_by(prefeitura_id=current_user.prefeitura_id).all()
@@ -445,30 +675,91 @@ def agendar_consulta_form():
 @login_required
 @admin_required
 def agendar_consulta_submit():
-    paciente_id = request.form.get('paciente_id')
-    profissional_id = request.form.get('profissional_id')
-    data_inicio_str = request.form.get('data_inicio')
-    data_inicio = datetime.datetime.fromisoformat(data_inicio_str)
-    nova_consulta_agendada = Consulta(
-        prefeitura_id=current_user.prefeitura_id,
-        uuid=str(uuid.uuid4()),
-        paciente_id=paciente_id,
-        profissional_id=profissional_id,
-        status='AGENDADA',
-        tipo='ELETIVA',
-        data_inicio=data_inicio
-    )
-    db.session.add(nova_consulta_agendada)
-    db.session.commit()
-    flash('Consulta eletiva agendada com sucesso!', 'success')
+    paciente = Paciente.query.filter_by(
+        id=request.form.get('paciente_id', type=int), prefeitura_id=current_user.prefeitura_id
+    ).first_or_404()
+    try:
+        serie_id, total = agenda.agendar_serie(
+            current_user.prefeitura_id,
+            paciente.id,
+            request.form.get('profissional_id', type=int),
+            agenda.horario_local(datetime.datetime.fromisoformat(request.form.get('data_inicio'))),
+            duracao_minutos=request.form.get('duracao_minutos', agenda.DURACAO_PADRAO_MINUTOS, type=int),
+            repeticoes=request.form.get('repeticoes', 1, type=int),
+            intervalo_dias=request.form.get('intervalo_dias', 7, type=int)
+        )
+    except (TypeError, ValueError) as e:
+        for erro in getattr(e, 'erros', ['Data e hora da consulta inválidas.']):
+            flash(erro, 'danger')
+        return redirect(url_for('gestor.agendar_consulta_form'))
+    if serie_id:
+        flash(f'Série de {total} consultas eletivas agendada com sucesso!', 'success')
+    else:
+        flash('Consulta eletiva agendada com sucesso!', 'success')
     return redirect(url_for('gestor.dashboard'))
 
+@bp.route('/agendamento/horarios-livres', methods=['GET'])
+@login_required
+@admin_required
+def horarios_livres():
+    """ Horários livres de um profissional (ou de qualquer um) entre duas datas, em JSON. """
+    try:
+        inicio = agenda.horario_local(datetime.datetime.fromisoformat(request.args['inicio']))
+        fim = agenda.horario_local(datetime.datetime.fromisoformat(request.args.get('fim') or (inicio.date() + datetime.timedelta(days=1)).isoformat()))
+    except (KeyError, ValueError):
+        return jsonify({'erro': 'Informe inicio (e opcionalmente fim) no formato AAAA-MM-DD[THH:MM].'}), 400
+    if fim - inicio > datetime.timedelta(days=31):
+        return jsonify({'erro': 'O período consultado deve ter no máximo 31 dias.'}), 400
+    livres = agenda.horarios_livres(
+        current_user.prefeitura_id,
+        inicio,
+        fim,
+        profissional_id=request.args.get('profissional_id', type=int),
+        duracao_minutos=min(max(request.args.get('duracao_minutos', agenda.DURACAO_PADRAO_MINUTOS, type=int), 1), agenda.DURACAO_MAXIMA_MINUTOS)
+    )
+    return jsonify({
+        'horarios': [{'inicio': horario.isoformat(timespec='minutes'), 'profissional_id': profissional_id} for horario, profissional_id in livres]
+    })
+
+BIBLIOTECA_POR_PAGINA = 30
+
 @bp.route('/biblioteca', methods=['GET'])
 @login_required
 @admin_required
 def biblioteca_index():
-    conteudos = BibliotecaConteudo.query.filter_by(prefeitura_id=current_user.prefeitura_id).order_by(BibliotecaConteudo.titulo).all()
-    return render_template('gestor/biblioteca/index.html', conteudos=conteudos)
+    consulta = request.args.get('q', '').strip()
+    pagina = request.args.get('pagina', 1, type=int)
+    if consulta:
+        resultado = busca_biblioteca.buscar(current_user.prefeitura_id, consulta, pagina, BIBLIOTECA_POR_PAGINA)
+    else:
+        paginacao = BibliotecaConteudo.query.filter_by(
+            prefeitura_id=current_user.prefeitura_id
+        ).order_by(BibliotecaConteudo.titulo).paginate(page=pagina, per_page=BIBLIOTECA_POR_PAGINA, error_out=False)
+        resultado = busca_biblioteca.ResultadoBusca(paginacao.items, paginacao.total, pagina, BIBLIOTECA_POR_PAGINA)
+    return render_template('gestor/biblioteca/index.html', conteudos=resultado.itens, resultado=resultado, consulta=consulta)
+
+@bp.route('/biblioteca/busca', methods=['GET'])
+@login_required
+def biblioteca_busca():
+    """ Busca ranqueada e paginada na biblioteca, em JSON (profissionais e chatbot). """
+    resultado = busca_biblioteca.buscar(
+        current_user.prefeitura_id,
+        request.args.get('q', ''),
+        request.args.get('pagina', 1, type=int),
+        max(1, min(request.args.get('por_pagina', BIBLIOTECA_POR_PAGINA, type=int), 100))
+    )
+    return jsonify({
+        'total': resultado.total,
+        'pagina': resultado.pagina,
+        'por_pagina': resultado.por_pagina,
+        'itens': [{
+            'id': c.id,
+            'titulo': c.titulo,
+            'palavras_chave': c.palavras_chave,
+            'url_video': c.url_video,
+            'url_imagem': c.url_imagem,
+        } for c in resultado.itens],
+    })
 
 @bp.route('/biblioteca/novo', methods=['GET', 'POST'])
 @login_required
@@ -485,6 +776,7 @@ def biblioteca_novo():
         )
         db.session.add(novo_conteudo)
         db.session.commit()
+        busca_biblioteca.atualizar_indice(novo_conteudo)
         flash('Novo conteúdo adicionado à biblioteca com sucesso!', 'success')
         return redirect(url_for('gestor.biblioteca_index'))
     return render_template('gestor/biblioteca/form.html', titulo="Adicionar Novo Conteúdo")
@@ -501,6 +793,7 @@ def biblioteca_editar(id):
         conteudo.url_imagem = request.form.get('url_imagem')
         conteudo.palavras_chave = request.form.get('palavras_chave')
         db.session.commit()
+        busca_biblioteca.atualizar_indice(conteudo)
         flash('Conteúdo atualizado com sucesso!', 'success')
         return redirect(url_for('gestor.biblioteca_index'))
     return render_template('gestor/biblioteca/form.html', titulo="Editar Conteúdo", conteudo=conteudo)
@@ -512,23 +805,25 @@ def biblioteca_apagar(id):
     conteudo = BibliotecaConteudo.query.filter_by(id=id, prefeitura_id=current_user.prefeitura_id).first_or_404()
     db.session.delete(conteudo)
     db.session.commit()
+    busca_biblioteca.remover_do_indice(current_user.prefeitura_id, id)
     flash('Conteúdo removido da biblioteca com sucesso.', 'info')
     return redirect(url_for('gestor.biblioteca_index'))
 
 @bp.route('/painel_uso')
 @login_required
 @admin_required
+@somente_leitura()
 def painel_uso():
     hoje = datetime.date.today()
     inicio_mes = hoje.replace(day=1)
     dados_de_uso = db.session.query(
-        LogUso.event_type, 
-        func.count(LogUso.id)
+        LogUsoDiario.event_type,
+        func.sum(LogUsoDiario.contagem)
     ).filter(
-        LogUso.prefeitura_id == current_user.prefeitura_id, 
-        LogUso.timestamp >= inicio_mes
+        LogUsoDiario.prefeitura_id == current_user.prefeitura_id,
+        LogUsoDiario.dia >= inicio_mes
     ).group_by(
-        LogUso.event_type
+        LogUsoDiario.event_type
     ).all()
     resumo_uso = {
         'CONSULTA_INICIADA': 0,
@@ -539,7 +834,29 @@ def painel_uso():
         if event_type in resumo_uso:
             resumo_uso[event_type] = count
     resumo_uso['TOTAL_CONSULTAS'] = resumo_uso['CONSULTA_INICIADA'] + resumo_uso['CONSULTA_AGENDADA_INICIADA']
-    return render_template('gestor/painel_uso.html', resumo=resumo_uso, mes_atual=hoje.strftime('%B de %Y'))
+
+    # Histórico dos últimos 12 meses, lido da mesma consolidação diária.
+    inicio_historico = (inicio_mes - datetime.timedelta(days=335)).replace(day=1)
+    ano = extract('year', LogUsoDiario.dia)
+    mes = extract('month', LogUsoDiario.dia)
+    dados_historico = db.session.query(
+        ano, mes, LogUsoDiario.event_type, func.sum(LogUsoDiario.contagem)
+    ).filter(
+        LogUsoDiario.prefeitura_id == current_user.prefeitura_id,
+        LogUsoDiario.dia >= inicio_historico
+    ).group_by(ano, mes, LogUsoDiario.event_type).all()
+    historico = {}
+    for ano_evento, mes_evento, event_type, count in dados_historico:
+        linha = historico.setdefault((int(ano_evento), int(mes_evento)), {'consultas': 0, 'documentos': 0})
+        if event_type in ('CONSULTA_INICIADA', 'CONSULTA_AGENDADA_INICIADA'):
+            linha['consultas'] += count
+        elif event_type == 'DOCUMENTO_EMITIDO':
+            linha['documentos'] += count
+    historico_mensal = [
+        {'mes': f'{mes_evento:02d}/{ano_evento}', **valores}
+        for (ano_evento, mes_evento), valores in sorted(historico.items(), reverse=True)
+    ]
+    return render_template('gestor/painel_uso.html', resumo=resumo_uso, historico=historico_mensal, mes_atual=hoje.strftime('%B de %Y'))
 
 @bp.route('/solicitacoes_correcao')
 @login_required
@@ -592,27 +909,123 @@ def rejeitar_correcao(solicitacao_id):
     flash('Solicitação rejeitada com sucesso.', 'info')
     return redirect(url_for('.solicitacoes_correcao'))
     
+RELATORIO_ESUS_POR_PAGINA = 100
+RELATORIO_ESUS_LOTE_CSV = 1000
+
+def _periodo_relatorio_esus():
+    """
+    Lê data_inicio/data_fim da query string.
+
+    Retorna:
+        Uma tupla (inicio_dia, fim_dia) ou None se o período não foi informado.
+        Lança ValueError se as datas estiverem em formato inválido.
+    """
+    data_inicio_str = request.args.get('data_inicio')
+    data_fim_str = request.args.get('data_fim')
+    if not (data_inicio_str and data_fim_str):
+        return None
+    data_inicio = datetime.datetime.strptime(data_inicio_str, '%Y-%m-%d').date()
+    data_fim = datetime.datetime.strptime(data_fim_str, '%Y-%m-%d').date()
+    return (
+        datetime.datetime.combine(data_inicio, datetime.time.min),
+        datetime.datetime.combine(data_fim, datetime.time.max)
+    )
+
+def _filtros_relatorio_esus(inicio_dia, fim_dia):
+    return (
+        Consulta.prefeitura_id == current_user.prefeitura_id,
+        Consulta.status.in_(['FINALIZADA', 'TRANSFERIDO']),
+        Consulta.data_inicio.between(inicio_dia, fim_dia)
+    )
+
+def _apos_cursor(cursor):
+    """ Condição de keyset: registros depois de (data_inicio, id) do cursor. """
+    data_cursor_str, id_cursor_str = cursor.rsplit('_', 1)
+    data_cursor = datetime.datetime.fromisoformat(data_cursor_str)
+    id_cursor = int(id_cursor_str)
+    return or_(
+        Consulta.data_inicio > data_cursor,
+        and_(Consulta.data_inicio == data_cursor, Consulta.id > id_cursor)
+    )
+
 @bp.route('/relatorio-esus')
 @login_required
 @admin_required
+@somente_leitura()
 def relatorio_esus():
-    data_inicio_str = request.args.get('data_inicio')
-    data_fim_str = request.args.get('data_fim')
     atendimentos = []
-    if data_inicio_str and data_fim_str:
-        try:
-            data_inicio = datetime.datetime.strptime(data_inicio_str, '%Y-%m-%d').date()
-            data_fim = datetime.datetime.strptime(data_fim_str, '%Y-%m-%d').date()
-            inicio_dia = datetime.datetime.combine(data_inicio, datetime.time.min)
-            fim_dia = datetime.datetime.combine(data_fim, datetime.time.max)
-            atendimentos = Consulta.query.filter(
-                Consulta.prefeitura_id == current_user.prefeitura_id,
-                Consulta.status.in_(['FINALIZADA', 'TRANSFERIDO']),
-                Consulta.data_inicio.between(inicio_dia, fim_dia)
-            ).order_by(Consulta.data_inicio.asc()).all()
-        except ValueError:
-            flash('Formato de data inválido. Use AAAA-MM-DD.', 'danger')
-    return render_template('gestor/relatorio_esus.html', atendimentos=atendimentos)
+    proximo_cursor = None
+    try:
+        periodo = _periodo_relatorio_esus()
+        if periodo:
+            query = Consulta.query.options(
+                joinedload(Consulta.paciente),
+                joinedload(Consulta.profissional)
+            ).filter(*_filtros_relatorio_esus(*periodo))
+            cursor = request.args.get('apos')
+            if cursor:
+                query = query.filter(_apos_cursor(cursor))
+            # Busca um registro a mais para saber se existe próxima página.
+            atendimentos = query.order_by(
+                Consulta.data_inicio.asc(), Consulta.id.asc()
+            ).limit(RELATORIO_ESUS_POR_PAGINA + 1).all()
+            if len(atendimentos) > RELATORIO_ESUS_POR_PAGINA:
+                atendimentos = atendimentos[:RELATORIO_ESUS_POR_PAGINA]
+                ultimo = atendimentos[-1]
+                proximo_cursor = f"{ultimo.data_inicio.isoformat()}_{ultimo.id}"
+    except ValueError:
+        flash('Formato de data inválido. Use AAAA-MM-DD.', 'danger')
+        atendimentos = []
+    return render_template('gestor/relatorio_esus.html', atendimentos=atendimentos, proximo_cursor=proximo_cursor)
+
+@bp.route('/relatorio-esus/csv')
+@login_required
+@admin_required
+def relatorio_esus_csv():
+    try:
+        periodo = _periodo_relatorio_esus()
+    except ValueError:
+        periodo = None
+    if not periodo:
+        flash('Informe um período válido (AAAA-MM-DD) para exportar o relatório.', 'danger')
+        return redirect(url_for('.relatorio_esus'))
+
+    # Seleciona apenas as colunas do relatório (sem carregar objetos ORM) e usa
+    # yield_per, que abre um cursor do lado do servidor no PostgreSQL: a memória
+    # fica constante independentemente do tamanho do período.
+    stmt = select(
+        Consulta.data_inicio, Paciente.cns, Paciente.cpf, Paciente.nome_completo,
+        Usuario.nome_completo, Consulta.resumo_atendimento
+    ).join(
+        Paciente, Consulta.paciente_id == Paciente.id
+    ).join(
+        Usuario, Consulta.profissional_id == Usuario.id
+    ).where(
+        *_filtros_relatorio_esus(*periodo)
+    ).order_by(
+        Consulta.data_inicio.asc(), Consulta.id.asc()
+    ).execution_options(yield_per=RELATORIO_ESUS_LOTE_CSV)
+
+    def gerar_linhas():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['Data Atendimento', 'CNS do Paciente', 'CPF do Paciente', 'Nome do Paciente', 'Profissional', 'Resumo / Hipótese'])
+        # O gerador roda depois que a view retornou: marca a leitura aqui dentro.
+        with somente_leitura():
+            for lote in db.session.execute(stmt).partitions():
+                for data_inicio, cns, cpf, nome_paciente, nome_profissional, resumo in lote:
+                    writer.writerow([data_inicio.strftime('%d/%m/%Y'), cns or '', cpf, nome_paciente, nome_profissional, resumo or ''])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+
+    nome_arquivo = f"relatorio_esus_{request.args['data_inicio']}_{request.args['data_fim']}.csv"
+    return Response(
+        stream_with_context(gerar_linhas()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={nome_arquivo}'}
+    )
 
 @bp.route('/importar-pacientes', methods=['GET', 'POST'])
 @login_required
@@ -628,38 +1041,16 @@ def importar_pacientes_form():
             return redirect(request.url)
         if file and file.filename.endswith('.csv'):
             try:
-                stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-                csv_reader = csv.DictReader(stream)
-                pacientes_importados = 0
-                erros = []
-                for row in csv_reader:
-                    cpf = row.get('cpf', '').strip()
-                    if not cpf:
-                        erros.append(f"Linha ignorada por falta de CPF: {row}")
-                        continue
-                    paciente_existente = Paciente.query.filter_by(
-                        cpf=cpf, 
-                        prefeitura_id=current_user.prefeitura_id
-                    ).first()
-                    if not paciente_existente:
-                        novo_paciente = Paciente(
-                            prefeitura_id=current_user.prefeitura_id,
-                            nome_completo=row.get('nome_completo', '').strip(),
-                            cpf=cpf,
-                            cns=row.get('cns', '').strip() or None,
-                            telefone_whatsapp=row.get('telefone_whatsapp', '').strip()
-                        )
-                        db.session.add(novo_paciente)
-                        pacientes_importados += 1
-                db.session.commit()
-                flash(f'{pacientes_importados} pacientes foram importados com sucesso!', 'success')
-                if erros:
-                    flash(f'Ocorreram {len(erros)} erros ou linhas foram ignoradas.', 'warning')
-                return redirect(url_for('.importar_pacientes_form'))
-            except Exception as e:
+                relatorio = importar_pacientes_csv(file.stream, current_user.prefeitura_id)
+            except (UnicodeDecodeError, csv.Error, SQLAlchemyError) as e:
+                # Os lotes anteriores ao erro já foram confirmados.
                 db.session.rollback()
                 flash(f'Ocorreu um erro ao processar o arquivo: {e}', 'danger')
                 return redirect(request.url)
+            flash(f'{relatorio.importados} pacientes foram importados com sucesso!', 'success')
+            if relatorio.total_erros:
+                flash(f'Ocorreram {relatorio.total_erros} erros ou linhas foram ignoradas.', 'warning')
+            return render_template('gestor/importar_pacientes.html', relatorio=relatorio)
         else:
             flash('Formato de arquivo inválido. Por favor, envie um arquivo .csv.', 'danger')
             return redirect(request.url)
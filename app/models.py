@@ -26,7 +26,11 @@ class Usuario(UserMixin, db.Model):
     role = db.Column(db.String(50), nullable=False, default='PROFISSIONAL_SAUDE')
     is_active = db.Column(db.Boolean, default=True)
     prefeitura = db.relationship('Prefeitura', backref=db.backref('usuarios', lazy=True))
-    __table_args__ = (db.UniqueConstraint('email', 'prefeitura_id', name='_email_prefeitura_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('email', 'prefeitura_id', name='_email_prefeitura_uc'),
+        # Listas de usuários/profissionais da prefeitura, em ordem alfabética.
+        db.Index('ix_usuario_prefeitura_nome', 'prefeitura_id', 'nome_completo'),
+    )
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -41,6 +45,8 @@ class Usuario(UserMixin, db.Model):
         return f'<Usuario {self.email}>'
 
 class LogUso(db.Model):
+    # No PostgreSQL a tabela é particionada por mês e a chave primária no banco
+    # é (id, timestamp); ver app/services/particoes_auditoria.py.
     id = db.Column(db.Integer, primary_key=True)
     prefeitura_id = db.Column(db.Integer, db.ForeignKey('prefeitura.id'), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False, index=True)
@@ -49,10 +55,32 @@ class LogUso(db.Model):
     unit = db.Column(db.String(50))
     related_consulta_id = db.Column(db.Integer, db.ForeignKey('consulta.id'), nullable=True)
     related_usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=True)
+    __table_args__ = (
+        # Recálculo da consolidação diária por prefeitura e período.
+        db.Index('ix_log_uso_prefeitura_timestamp', 'prefeitura_id', 'timestamp'),
+    )
 
     def __repr__(self):
         return f'<LogUso {self.timestamp} - {self.event_type}>'
 
+class LogUsoDiario(db.Model):
+    """
+    Consolidação diária de LogUso por prefeitura e tipo de evento (dia em UTC,
+    como LogUso.timestamp). Mantida por app/services/uso_diario.py.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    prefeitura_id = db.Column(db.Integer, db.ForeignKey('prefeitura.id'), nullable=False)
+    dia = db.Column(db.Date, nullable=False)
+    event_type = db.Column(db.String(100), nullable=False)
+    contagem = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Float, nullable=False, default=0.0)
+    __table_args__ = (
+        db.UniqueConstraint('prefeitura_id', 'dia', 'event_type', name='_log_uso_diario_uc'),
+    )
+
+    def __repr__(self):
+        return f'<LogUsoDiario {self.dia} - {self.event_type}: {self.contagem}>'
+
 class Paciente(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     prefeitura_id = db.Column(db.Integer, db.ForeignKey('prefeitura.id'), nullable=False)
@@ -65,6 +93,8 @@ class Paciente(db.Model):
     __table_args__ = (
         db.UniqueConstraint('cpf', 'prefeitura_id', name='_cpf_prefeitura_uc'),
         db.UniqueConstraint('telefone_whatsapp', 'prefeitura_id', name='_telefone_prefeitura_uc'),
+        # Seleção de pacientes da prefeitura em ordem alfabética (agendamento).
+        db.Index('ix_paciente_prefeitura_nome', 'prefeitura_id', 'nome_completo'),
     )
 
     def __repr__(self):
@@ -81,9 +111,74 @@ class Consulta(db.Model):
     data_inicio = db.Column(db.DateTime, nullable=False)
     data_fim = db.Column(db.DateTime)
     resumo_atendimento = db.Column(db.Text)
+    # Agendamentos eletivos (app/services/agenda.py): duração reservada e série recorrente.
+    duracao_minutos = db.Column(db.Integer)
+    serie_id = db.Column(db.String(36), index=True)
     paciente = db.relationship('Paciente', backref=db.backref('consultas', lazy=True))
     profissional = db.relationship('Usuario', backref=db.backref('consultas', lazy=True))
     prefeitura = db.relationship('Prefeitura', backref=db.backref('consultas', lazy=True))
+    __table_args__ = (
+        # Suporta a paginação por keyset (data_inicio, id) dos relatórios por prefeitura.
+        db.Index('ix_consulta_prefeitura_data_inicio_id', 'prefeitura_id', 'data_inicio', 'id'),
+        # Histórico de atendimentos do paciente no portal.
+        db.Index('ix_consulta_paciente_data_inicio_id', 'paciente_id', 'data_inicio', 'id'),
+        # Verificação de conflitos na agenda de cada profissional.
+        db.Index('ix_consulta_profissional_data_inicio', 'profissional_id', 'data_inicio'),
+        # Atendimentos encerrados hoje no painel do profissional.
+        db.Index('ix_consulta_profissional_data_fim', 'profissional_id', 'data_fim'),
+        # "Atendimento em andamento" do profissional, consultado em quase toda ação do painel.
+        # Único: no máximo um atendimento INICIADA por profissional, mesmo com requisições simultâneas.
+        db.Index(
+            'ix_consulta_em_andamento', 'prefeitura_id', 'profissional_id', unique=True,
+            postgresql_where=db.text("status = 'INICIADA'"), sqlite_where=db.text("status = 'INICIADA'")
+        ),
+        # Reservas ativas da agenda eletiva (app/services/agenda.py).
+        db.Index(
+            'ix_consulta_agenda_ativa', 'prefeitura_id', 'data_inicio',
+            postgresql_where=db.text("tipo = 'ELETIVA' AND status IN ('AGENDADA', 'INICIADA')"),
+            sqlite_where=db.text("tipo = 'ELETIVA' AND status IN ('AGENDADA', 'INICIADA')")
+        ),
+    )
+
+class EntradaFila(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    prefeitura_id = db.Column(db.Integer, db.ForeignKey('prefeitura.id'), nullable=False)
+    fila = db.Column(db.String(50), nullable=False)
+    paciente_id = db.Column(db.Integer, db.ForeignKey('paciente.id'), nullable=False)
+    # Copiado do paciente para que o painel monte as filas sem consultar a tabela de pacientes.
+    paciente_nome = db.Column(db.String(120), nullable=False)
+    entrada_em = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    paciente = db.relationship('Paciente', backref=db.backref('entrada_fila', uselist=False))
+    __table_args__ = (
+        # Um paciente só pode aguardar em uma fila por vez.
+        db.UniqueConstraint('paciente_id', name='_entrada_fila_paciente_uc'),
+        db.Index('ix_entrada_fila_ordem', 'prefeitura_id', 'fila', 'entrada_em', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<EntradaFila {self.fila}: Paciente ID {self.paciente_id}>'
+
+class EstatisticaAtendimento(db.Model):
+    """
+    Tempo de atendimento de cada fila por prefeitura, atualizado a cada
+    consulta encerrada. Mantida por app/services/tempo_espera.py.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    prefeitura_id = db.Column(db.Integer, db.ForeignKey('prefeitura.id'), nullable=False)
+    fila = db.Column(db.String(50), nullable=False)
+    amostras = db.Column(db.Integer, nullable=False, default=0)
+    # Média e variância com peso exponencial, em segundos.
+    media_segundos = db.Column(db.Float, nullable=False, default=0.0)
+    variancia = db.Column(db.Float, nullable=False, default=0.0)
+    # Histograma com decaimento exponencial (JSON: pesos por faixa de duração), para os quantis.
+    histograma = db.Column(db.Text, nullable=False, default='[]')
+    atualizado_em = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    __table_args__ = (
+        db.UniqueConstraint('prefeitura_id', 'fila', name='_estatistica_atendimento_uc'),
+    )
+
+    def __repr__(self):
+        return f'<EstatisticaAtendimento {self.fila}: {self.media_segundos:.0f}s ({self.amostras} amostras)>'
 
 class TermoConsentimentoLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -101,11 +196,15 @@ class TermoConsentimentoLog(db.Model):
 class Documento(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     prefeitura_id = db.Column(db.Integer, db.ForeignKey('prefeitura.id'), nullable=False)
-    consulta_id = db.Column(db.Integer, db.ForeignKey('consulta.id'), nullable=False)
+    consulta_id = db.Column(db.Integer, db.ForeignKey('consulta.id'), nullable=False, index=True)
     tipo = db.Column(db.String(50), nullable=False, index=True)
     conteudo = db.Column(db.Text, nullable=False)
     data_emissao = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
     hash_assinatura = db.Column(db.String(256))
+    # PDF gerado em segundo plano (app/services/documentos_pdf.py): PENDENTE, PRONTO ou ERRO.
+    status_pdf = db.Column(db.String(20), nullable=False, default='PENDENTE')
+    hash_pdf = db.Column(db.String(64))
+    erro_pdf = db.Column(db.String(255))
     consulta = db.relationship('Consulta', backref=db.backref('documentos', lazy=True))
 
     def __repr__(self):
@@ -115,9 +214,14 @@ class Configuracao(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     prefeitura_id = db.Column(db.Integer, db.ForeignKey('prefeitura.id'), nullable=False)
     chave = db.Column(db.String(100), nullable=False, index=True)
-    valor = db.Column(db.String(255), nullable=False)
+    # Texto: o fluxo do chatbot (CHATBOT_FLOW_JSON) passa de 255 caracteres.
+    valor = db.Column(db.Text, nullable=False)
     descricao = db.Column(db.Text)
-    __table_args__ = (db.UniqueConstraint('chave', 'prefeitura_id', name='_chave_prefeitura_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('chave', 'prefeitura_id', name='_chave_prefeitura_uc'),
+        # A restrição acima começa por chave; as telas carregam todas as configurações da prefeitura.
+        db.Index('ix_configuracao_prefeitura_id', 'prefeitura_id'),
+    )
 
     def __repr__(self):
         return f'<Configuracao {self.chave}={self.valor}>'
@@ -133,6 +237,13 @@ class Tarefa(db.Model):
     data_conclusao = db.Column(db.DateTime)
     criado_por = db.relationship('Usuario', foreign_keys=[criado_por_id], backref=db.backref('tarefas_criadas', lazy='dynamic'))
     atribuido_para = db.relationship('Usuario', foreign_keys=[atribuido_para_id], backref=db.backref('tarefas_atribuidas', lazy='dynamic'))
+    __table_args__ = (
+        # Tarefas pendentes de cada profissional, no painel.
+        db.Index(
+            'ix_tarefa_pendentes_responsavel', 'atribuido_para_id', 'data_criacao',
+            postgresql_where=db.text("status = 'PENDENTE'"), sqlite_where=db.text("status = 'PENDENTE'")
+        ),
+    )
 
     def __repr__(self):
         return f'<Tarefa {self.id}: {self.titulo}>'
@@ -143,7 +254,10 @@ class MensagemChatbot(db.Model):
     chave = db.Column(db.String(100), nullable=False, index=True)
     texto = db.Column(db.Text, nullable=False)
     descricao = db.Column(db.String(255))
-    __table_args__ = (db.UniqueConstraint('chave', 'prefeitura_id', name='_msg_chatbot_chave_prefeitura_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('chave', 'prefeitura_id', name='_msg_chatbot_chave_prefeitura_uc'),
+        db.Index('ix_mensagem_chatbot_prefeitura_id', 'prefeitura_id'),
+    )
 
     def __repr__(self):
         return f'<MensagemChatbot {self.chave}>'
@@ -168,36 +282,89 @@ class BibliotecaConteudo(db.Model):
     url_imagem = db.Column(db.String(255))
     palavras_chave = db.Column(db.String(255))
     data_criacao = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    # Radicais normalizados de título, palavras-chave e texto (veja app/services/busca_biblioteca.py).
+    texto_busca = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index(
+            'ix_biblioteca_conteudo_busca',
+            db.text("to_tsvector('simple'::regconfig, texto_busca)"),
+            postgresql_using='gin'
+        ).ddl_if(dialect='postgresql'),
+    )
 
     def __repr__(self):
         return f'<BibliotecaConteudo {self.titulo}>'
 
 class LogAcessoPaciente(db.Model):
+    # Particionada por mês no PostgreSQL, como LogUso.
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False, index=True)
     prefeitura_id = db.Column(db.Integer, db.ForeignKey('prefeitura.id'), nullable=False)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False, index=True)
-    paciente_id = db.Column(db.Integer, db.ForeignKey('paciente.id'), nullable=False, index=True)
+    paciente_id = db.Column(db.Integer, db.ForeignKey('paciente.id'), nullable=False)
     consulta_id = db.Column(db.Integer, db.ForeignKey('consulta.id'), nullable=True)
     acao = db.Column(db.String(255), nullable=False)
     usuario = db.relationship('Usuario', backref='logs_de_acesso')
     paciente = db.relationship('Paciente', backref='logs_de_acesso_recebidos')
+    __table_args__ = (
+        # "Quem acessou meus dados" no portal: acessos do paciente, do mais recente ao mais antigo.
+        db.Index('ix_log_acesso_paciente_paciente_timestamp', 'paciente_id', 'timestamp', 'id'),
+    )
 
     def __repr__(self):
         return f'<LogAcesso: Usuario {self.usuario_id} acessou Paciente {self.paciente_id} em {self.timestamp}>'
 
 class MagicLink(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    token = db.Column(db.String(128), unique=True, nullable=False, index=True)
+    # SHA-256 do token; o token em si só existe no link enviado ao paciente.
+    token_hash = db.Column(db.String(64), nullable=False)
     paciente_id = db.Column(db.Integer, db.ForeignKey('paciente.id'), nullable=False)
     prefeitura_id = db.Column(db.Integer, db.ForeignKey('prefeitura.id'), nullable=False)
-    expira_em = db.Column(db.DateTime, nullable=False)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
     usado = db.Column(db.Boolean, default=False, nullable=False)
     paciente = db.relationship('Paciente', backref='magic_links')
+    __table_args__ = (
+        # Só os links ainda não usados entram no índice da validação.
+        db.Index(
+            'ix_magic_link_token_hash_nao_usado', 'token_hash', unique=True,
+            postgresql_where=db.text('NOT usado'), sqlite_where=db.text('usado = 0')
+        ),
+    )
 
     def __repr__(self):
         return f'<MagicLink para Paciente ID {self.paciente_id}>'
         
+class MensagemOutbox(db.Model):
+    """
+    Mensagem a ser enviada por um provedor externo (ex: WhatsApp). Gravada na
+    mesma transação do evento que a originou e enviada depois pelo
+    despachante (app/services/outbox.py).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    prefeitura_id = db.Column(db.Integer, db.ForeignKey('prefeitura.id'), nullable=False)
+    provedor = db.Column(db.String(50), nullable=False, default='whatsapp')
+    destino = db.Column(db.String(50), nullable=False)
+    conteudo = db.Column(db.Text, nullable=False)
+    # Conteúdo com segredo (ex: link mágico): apagado quando a mensagem sai da fila.
+    sensivel = db.Column(db.Boolean, nullable=False, default=False)
+    # Depois disso a mensagem não é mais enviada (ex: o link que ela leva venceu).
+    expira_em = db.Column(db.DateTime)
+    status = db.Column(db.String(50), nullable=False, default='PENDENTE')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    # Próximo envio (ou fim da reserva, enquanto status = 'ENVIANDO').
+    proxima_tentativa_em = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    ultimo_erro = db.Column(db.Text)
+    id_mensagem_provedor = db.Column(db.String(255))
+    criado_em = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    enviado_em = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('ix_mensagem_outbox_status_proxima', 'status', 'proxima_tentativa_em'),
+    )
+
+    def __repr__(self):
+        return f'<MensagemOutbox {self.id} {self.status}>'
+
 class SolicitacaoCorrecao(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
@@ -209,4 +376,11 @@ class SolicitacaoCorrecao(db.Model):
     analisado_por_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=True)
     data_analise = db.Column(db.DateTime, nullable=True)
     resposta_gestor = db.Column(db.Text, nullable=True)
-    paciente = db.relationship('Paciente', backref='solicitacoes_correcao')
\ No newline at end of file
+    paciente = db.relationship('Paciente', backref='solicitacoes_correcao')
+    __table_args__ = (
+        # Fila de solicitações pendentes do gestor, da mais antiga para a mais nova.
+        db.Index(
+            'ix_solicitacao_correcao_pendentes', 'prefeitura_id', 'timestamp',
+            postgresql_where=db.text("status = 'PENDENTE'"), sqlite_where=db.text("status = 'PENDENTE'")
+        ),
+    )
\ No newline at end of file
@@ -1,15 +1,12 @@
 # app/paciente_portal/routes.py
 from . import bp
-from flask import render_template, request, flash, redirect, url_for, session, current_app
-from app.models import (
-    Prefeitura, Paciente, MagicLink, Consulta, 
-    LogAcessoPaciente, SolicitacaoCorrecao
-)
+from flask import render_template, request, flash, redirect, url_for, session
+from app.models import Prefeitura, Paciente, SolicitacaoCorrecao
 from app.extensions import db
-from app.services.messaging_gateway import MessagingGateway # Importa o nosso gateway
-
-import secrets
-from datetime import datetime, timedelta
+from app.services import historico_paciente, tempo_espera
+from app.services.magic_links import emitir_link, consumir_link
+from app.services.outbox import enfileirar_mensagem
+from app.services.replica_leitura import somente_leitura
 
 @bp.route('/solicitar-link', methods=['GET', 'POST'])
 def solicitar_link():
@@ -29,34 +26,20 @@ def solicitar_link():
 
         # --- LÓGICA DE ENVIO DO LINK MODIFICADA ---
         
-        # 1. Gera o token e o link
-        token = secrets.token_urlsafe(32)
-        expiracao = datetime.utcnow() + timedelta(minutes=15)
+        # 1. Gera o token (só o hash vai para a tabela de links) e o link
+        token, expira_em = emitir_link(paciente.id, prefeitura.id)
         link_magico = url_for('.validar_link', token=token, _external=True)
 
-        novo_link = MagicLink(
-            token=token,
-            paciente_id=paciente.id,
-            prefeitura_id=prefeitura.id,
-            expira_em=expiracao
-        )
-        db.session.add(novo_link)
+        # 2. Prepara a mensagem e a grava na outbox, na mesma transação do link.
+        # O envio ao provedor é feito pelo worker (`flask processar-outbox`).
+        # O texto contém o token: ele fica gravado na outbox até o envio e é
+        # apagado em seguida; se não sair até o link expirar, a mensagem é
+        # desistida e apagada do mesmo jeito.
+        mensagem = f"Olá, {paciente.nome_completo.split(' ')[0]}! Acesse seu portal de saúde através do link seguro: {link_magico}"
+        enfileirar_mensagem(prefeitura.id, paciente.telefone_whatsapp, mensagem, sensivel=True, expira_em=expira_em)
         db.session.commit()
-        
-        # 2. Prepara a mensagem e usa o Gateway para "enviar"
-        try:
-            mensagem = f"Olá, {paciente.nome_completo.split(' ')[0]}! Acesse seu portal de saúde através do link seguro: {link_magico}"
-            
-            # Instancia o gateway e envia a mensagem
-            messaging_service = MessagingGateway(current_app.config)
-            messaging_service.enviar_mensagem(paciente.telefone_whatsapp, mensagem)
-            
-            # Atualiza o feedback para o usuário
-            flash('Um link de acesso seguro foi enviado para o seu número de telefone cadastrado.', 'success')
-        
-        except Exception as e:
-            # Em caso de falha no envio, informa o erro
-            flash(f'Não foi possível enviar o link de acesso. Por favor, tente novamente mais tarde. Erro: {e}', 'danger')
+
+        flash('Um link de acesso seguro foi enviado para o seu número de telefone cadastrado.', 'success')
 
         # --- FIM DA MODIFICAÇÃO ---
         
@@ -66,17 +49,13 @@ def solicitar_link():
 
 @bp.route('/validar-link/<token>')
 def validar_link(token):
-    link = MagicLink.query.filter_by(token=token, usado=False).first()
+    acesso = consumir_link(token)
 
-    if not link or datetime.utcnow() > link.expira_em:
+    if not acesso:
         flash('Link de acesso inválido ou expirado. Por favor, solicite um novo.', 'danger')
         return redirect(url_for('.solicitar_link'))
-    
-    link.usado = True
-    db.session.commit()
 
-    session['paciente_id'] = link.paciente_id
-    session['prefeitura_id_paciente'] = link.prefeitura_id
+    session['paciente_id'], session['prefeitura_id_paciente'] = acesso
 
     flash('Acesso autorizado com sucesso!', 'success')
     return redirect(url_for('.dashboard'))
@@ -88,10 +67,30 @@ def dashboard():
         return redirect(url_for('.solicitar_link'))
     
     paciente = Paciente.query.get_or_404(paciente_id)
-    consultas = Consulta.query.filter_by(paciente_id=paciente.id).order_by(Consulta.data_inicio.desc()).all()
-    logs_acesso = LogAcessoPaciente.query.filter_by(paciente_id=paciente.id).order_by(LogAcessoPaciente.timestamp.desc()).all()
-    
-    return render_template('dashboard.html', paciente=paciente, consultas=consultas, logs_acesso=logs_acesso)
+    # A primeira página de cada seção vem do resumo em cache; as seguintes,
+    # pedidas pelos cursores, são consultadas sob demanda.
+    resumo = historico_paciente.resumo(paciente.id)
+    cursor_consultas = request.args.get('consultas_antes')
+    cursor_acessos = request.args.get('acessos_antes')
+    try:
+        # Páginas antigas do histórico podem vir da réplica. O resumo não: ele vai
+        # para o cache e precisa refletir o acesso que acabou de ser registrado.
+        with somente_leitura():
+            consultas = historico_paciente.consultas(paciente.id, cursor_consultas) if cursor_consultas else resumo.consultas
+            acessos = historico_paciente.acessos(paciente.id, cursor_acessos) if cursor_acessos else resumo.acessos
+    except ValueError:
+        return redirect(url_for('.dashboard'))
+
+    return render_template(
+        'dashboard.html',
+        paciente=paciente,
+        espera=tempo_espera.espera_do_paciente(paciente.id),
+        resumo=resumo,
+        consultas=consultas,
+        acessos=acessos,
+        cursor_consultas=cursor_consultas,
+        cursor_acessos=cursor_acessos
+    )
 
 @bp.route('/logout')
 def logout():
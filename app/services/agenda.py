@@ -0,0 +1,250 @@
+# app/services/agenda.py
+"""
+Agenda de consultas eletivas: horários livres e agendamento sem sobreposição.
+
+Cada profissional tem um IndiceIntervalos com os horários já reservados
+(consultas eletivas AGENDADA/INICIADA), ordenados por início. Como nenhuma consulta dura
+mais que DURACAO_MAXIMA_MINUTOS, tudo o que pode se sobrepor a [inicio, fim)
+começa em (inicio - DURACAO_MAXIMA, fim): uma busca binária encontra esse
+trecho, e tanto a verificação de conflito quanto a listagem de horários livres
+custam O(log n + k), sem percorrer a agenda inteira. As janelas de trabalho são
+os turnos do horário de funcionamento da prefeitura (horario_funcionamento).
+
+Os índices ficam em cache por prefeitura. Eles só servem para as consultas
+de disponibilidade. O agendamento bloqueia a linha do profissional
+(SELECT ... FOR UPDATE) e confere os conflitos no banco antes de inserir,
+então duas reservas simultâneas do mesmo horário nunca são aceitas.
+
+Os horários são os do formulário (hora local, sem fuso).
+"""
+
+from bisect import bisect_left, bisect_right
+import datetime
+import uuid
+
+from sqlalchemy import insert, select
+
+from app.cache import CacheTTL
+from app.extensions import db
+from app.models import Consulta, Usuario
+from app.services.historico_paciente import invalidar_resumo
+from app.services.horario_funcionamento import FUSO_HORARIO, obter_horario
+from app.services.versao_painel import marcar_alteracao
+
+DURACAO_PADRAO_MINUTOS = 30
+DURACAO_MAXIMA_MINUTOS = 240
+STATUS_OCUPADOS = ('AGENDADA', 'INICIADA')
+MAXIMO_REPETICOES = 104
+
+_agendas = CacheTTL(ttl_segundos=60)
+
+
+class ConflitoAgenda(ValueError):
+    def __init__(self, erros):
+        super().__init__('; '.join(erros))
+        self.erros = erros
+
+
+class IndiceIntervalos:
+    """ Horários ocupados de um profissional, ordenados por início. """
+    def __init__(self, intervalos=()):
+        ordenados = sorted(intervalos)
+        self.inicios = [inicio for inicio, _, _ in ordenados]
+        self.fins = [fim for _, fim, _ in ordenados]
+        self.ids = [id_ for _, _, id_ in ordenados]
+
+    def _candidatos(self, inicio, fim):
+        primeiro = bisect_right(self.inicios, inicio - datetime.timedelta(minutes=DURACAO_MAXIMA_MINUTOS))
+        ultimo = bisect_left(self.inicios, fim)
+        return range(primeiro, ultimo)
+
+    def conflitos(self, inicio, fim):
+        """ Ids das reservas que se sobrepõem a [inicio, fim). """
+        return [self.ids[i] for i in self._candidatos(inicio, fim) if self.fins[i] > inicio]
+
+    def livres(self, inicio, fim, duracao):
+        """ Horários de `duracao` livres dentro da janela [inicio, fim). """
+        horarios = []
+        cursor = inicio
+        for i in self._candidatos(inicio, fim):
+            if self.fins[i] <= cursor:
+                continue
+            while cursor + duracao <= min(self.inicios[i], fim):
+                horarios.append(cursor)
+                cursor += duracao
+            cursor = max(cursor, self.fins[i])
+        while cursor + duracao <= fim:
+            horarios.append(cursor)
+            cursor += duracao
+        return horarios
+
+
+def _agora():
+    return datetime.datetime.now(FUSO_HORARIO).replace(tzinfo=None, second=0, microsecond=0)
+
+
+def horario_local(momento):
+    """
+    A agenda trabalha com horários locais sem fuso (FUSO_HORARIO). Um horário
+    com fuso (ex: '2026-10-19T00:00+00:00') é convertido para o local; um sem
+    fuso é tomado como local e volta como está.
+    """
+    if momento.tzinfo is None:
+        return momento
+    return momento.astimezone(FUSO_HORARIO).replace(tzinfo=None)
+
+
+def _fim(inicio, duracao_minutos):
+    return inicio + datetime.timedelta(minutes=duracao_minutos or DURACAO_PADRAO_MINUTOS)
+
+
+def _reservas(filtros):
+    linhas = db.session.execute(
+        select(Consulta.profissional_id, Consulta.data_inicio, Consulta.duracao_minutos, Consulta.id)
+        .where(Consulta.tipo == 'ELETIVA', Consulta.status.in_(STATUS_OCUPADOS), *filtros)
+    ).all()
+    por_profissional = {}
+    for profissional_id, inicio, duracao, id_ in linhas:
+        por_profissional.setdefault(profissional_id, []).append((inicio, _fim(inicio, duracao), id_))
+    return por_profissional
+
+
+def _agenda(prefeitura_id):
+    """ {profissional_id: IndiceIntervalos} com as reservas a partir de ontem. """
+    def montar():
+        desde = datetime.datetime.combine(datetime.date.today() - datetime.timedelta(days=1), datetime.time.min)
+        reservas = _reservas([Consulta.prefeitura_id == prefeitura_id, Consulta.data_inicio >= desde])
+        return {profissional_id: IndiceIntervalos(intervalos) for profissional_id, intervalos in reservas.items()}
+    return _agendas.get_or_set(prefeitura_id, montar)
+
+
+def _janelas(prefeitura_id, inicio, fim):
+    """ Turnos de trabalho da prefeitura recortados para [inicio, fim). """
+    horario = obter_horario(prefeitura_id)
+    janelas = []
+    data = inicio.date()
+    while data <= fim.date():
+        meia_noite = datetime.datetime.combine(data, datetime.time.min)
+        for turno_inicio, turno_fim in horario.turnos(data):
+            janela_inicio = max(inicio, meia_noite + datetime.timedelta(minutes=turno_inicio))
+            janela_fim = min(fim, meia_noite + datetime.timedelta(minutes=turno_fim))
+            if janela_inicio < janela_fim:
+                janelas.append((janela_inicio, janela_fim))
+        data += datetime.timedelta(days=1)
+    return janelas
+
+
+def profissionais_ativos(prefeitura_id):
+    return db.session.execute(
+        select(Usuario.id).where(
+            Usuario.prefeitura_id == prefeitura_id,
+            Usuario.role == 'PROFISSIONAL_SAUDE',
+            Usuario.is_active.is_(True)
+        ).order_by(Usuario.nome_completo)
+    ).scalars().all()
+
+
+def horarios_livres(prefeitura_id, inicio, fim, profissional_id=None, duracao_minutos=DURACAO_PADRAO_MINUTOS, limite=200):
+    """
+    Horários livres entre inicio e fim, do profissional informado ou de
+    qualquer profissional ativo.
+
+    Retorna:
+        Lista de tuplas (data_hora, profissional_id), em ordem cronológica.
+    """
+    inicio = max(inicio, _agora())
+    duracao = datetime.timedelta(minutes=duracao_minutos)
+    agenda = _agenda(prefeitura_id)
+    profissionais = [profissional_id] if profissional_id else profissionais_ativos(prefeitura_id)
+    livres = []
+    for janela_inicio, janela_fim in _janelas(prefeitura_id, inicio, fim):
+        for id_profissional in profissionais:
+            indice = agenda.get(id_profissional) or IndiceIntervalos()
+            livres.extend((horario, id_profissional) for horario in indice.livres(janela_inicio, janela_fim, duracao))
+        if len(livres) >= limite:
+            break
+    livres.sort()
+    return livres[:limite]
+
+
+def agendar_serie(prefeitura_id, paciente_id, profissional_id, inicio,
+                  duracao_minutos=DURACAO_PADRAO_MINUTOS, repeticoes=1, intervalo_dias=7):
+    """
+    Agenda uma consulta eletiva ou uma série recorrente (ex: retorno semanal
+    por 52 semanas) de uma vez: ou todas as datas são agendadas, ou nenhuma.
+    Confirma a transação.
+
+    Lança ConflitoAgenda com a lista de problemas (fora do expediente ou
+    horário já ocupado).
+
+    Retorna:
+        O serie_id (None para uma consulta avulsa) e o número de consultas criadas.
+    """
+    if not 1 <= duracao_minutos <= DURACAO_MAXIMA_MINUTOS:
+        raise ConflitoAgenda([f"A duração deve estar entre 1 e {DURACAO_MAXIMA_MINUTOS} minutos."])
+    if not 1 <= repeticoes <= MAXIMO_REPETICOES:
+        raise ConflitoAgenda([f"O número de repetições deve estar entre 1 e {MAXIMO_REPETICOES}."])
+    if repeticoes > 1 and intervalo_dias < 1:
+        raise ConflitoAgenda(["O intervalo entre as consultas da série deve ser de pelo menos 1 dia."])
+
+    horarios = [inicio + datetime.timedelta(days=intervalo_dias * n) for n in range(repeticoes)]
+    horario_funcionamento = obter_horario(prefeitura_id)
+    erros = []
+    if inicio < _agora():
+        erros.append(f"{inicio.strftime('%d/%m/%Y %H:%M')}: horário já passou.")
+    for horario in horarios:
+        minuto_inicio = horario.hour * 60 + horario.minute
+        minuto_fim = minuto_inicio + duracao_minutos
+        if not any(a <= minuto_inicio and minuto_fim <= b for a, b in horario_funcionamento.turnos(horario.date())):
+            erros.append(f"{horario.strftime('%d/%m/%Y %H:%M')}: fora do horário de funcionamento.")
+
+    # Serializa os agendamentos do profissional até o commit.
+    profissional = db.session.execute(
+        select(Usuario.id).where(
+            Usuario.id == profissional_id,
+            Usuario.prefeitura_id == prefeitura_id,
+            Usuario.role == 'PROFISSIONAL_SAUDE'
+        ).with_for_update()
+    ).first()
+    if profissional is None:
+        db.session.rollback()
+        raise ConflitoAgenda(["Profissional não encontrado."])
+
+    ocupados = IndiceIntervalos(_reservas([
+        Consulta.profissional_id == profissional_id,
+        Consulta.data_inicio > horarios[0] - datetime.timedelta(minutes=DURACAO_MAXIMA_MINUTOS),
+        Consulta.data_inicio < _fim(horarios[-1], duracao_minutos),
+    ]).get(profissional_id, []))
+    for horario in horarios:
+        if ocupados.conflitos(horario, _fim(horario, duracao_minutos)):
+            erros.append(f"{horario.strftime('%d/%m/%Y %H:%M')}: o profissional já tem consulta neste horário.")
+
+    if erros:
+        db.session.rollback()
+        raise ConflitoAgenda(erros)
+
+    serie_id = str(uuid.uuid4()) if repeticoes > 1 else None
+    db.session.execute(insert(Consulta), [{
+        'prefeitura_id': prefeitura_id,
+        'uuid': str(uuid.uuid4()),
+        'paciente_id': paciente_id,
+        'profissional_id': profissional_id,
+        'status': 'AGENDADA',
+        'tipo': 'ELETIVA',
+        'data_inicio': horario,
+        'duracao_minutos': duracao_minutos,
+        'serie_id': serie_id,
+    } for horario in horarios])
+    # INSERT direto: não passa pelo flush que atualiza a versão do painel.
+    marcar_alteracao(db.session, prefeitura_id)
+    db.session.commit()
+    # Os outros workers enxergam as novas reservas quando o cache deles expirar.
+    _agendas.invalidar(prefeitura_id)
+    # INSERT direto: os listeners de Consulta que invalidam o histórico do paciente não rodam.
+    invalidar_resumo(paciente_id)
+    return serie_id, len(horarios)
+
+
+def invalidar_agenda(prefeitura_id):
+    """ Chamar quando consultas agendadas mudam de horário ou de status. """
+    _agendas.invalidar(prefeitura_id)
@@ -0,0 +1,130 @@
+# app/services/auditoria.py
+"""
+Escrita dos registros de auditoria (LogUso e LogAcessoPaciente).
+
+Por padrão os registros vão para um buffer em memória e são gravados por uma
+thread em segundo plano, em INSERTs de várias linhas, a cada
+AUDITORIA_INTERVALO_SEGUNDOS ou quando o buffer atinge AUDITORIA_TAMANHO_LOTE.
+Assim a requisição clínica não paga uma ida ao banco por log.
+
+Registros que precisam estar gravados junto com a operação (ex: o acesso ao
+prontuário ao iniciar um atendimento, exigido pela LGPD) usam duravel=True:
+entram na sessão atual e são confirmados no mesmo commit de quem chamou.
+
+Com AUDITORIA_ASSINCRONA=false não há buffer: cada registro não durável é
+gravado na hora, em uma transação própria.
+"""
+
+import atexit
+import datetime
+import threading
+
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.models import LogUso, LogAcessoPaciente
+from app.services.historico_paciente import invalidar_resumo
+from app.services.uso_diario import acumular_uso
+
+
+class EscritorAuditoria:
+    def __init__(self, app=None):
+        self.app = None
+        self._pendentes = []
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.assincrono = app.config.get('AUDITORIA_ASSINCRONA', True)
+        self.intervalo = app.config.get('AUDITORIA_INTERVALO_SEGUNDOS', 2.0)
+        self.tamanho_lote = app.config.get('AUDITORIA_TAMANHO_LOTE', 500)
+        self.limite_buffer = app.config.get('AUDITORIA_LIMITE_BUFFER', 50000)
+        app.extensions['auditoria'] = self
+        # Garante que o que estiver no buffer seja gravado ao encerrar o processo.
+        atexit.register(self.descarregar)
+
+    def registrar_uso(self, duravel=False, **campos):
+        """ Registra um LogUso (event_type, unit, related_consulta_id, ...). """
+        return self._registrar(LogUso, campos, duravel)
+
+    def registrar_acesso(self, duravel=False, **campos):
+        """ Registra um LogAcessoPaciente (usuario_id, paciente_id, acao, ...). """
+        return self._registrar(LogAcessoPaciente, campos, duravel)
+
+    def _registrar(self, modelo, campos, duravel):
+        # O horário é o do evento, não o da gravação.
+        campos.setdefault('timestamp', datetime.datetime.utcnow())
+        if modelo is LogUso:
+            campos.setdefault('quantity', 1.0)
+        if duravel:
+            registro = modelo(**campos)
+            db.session.add(registro)
+            return registro
+        if not self.assincrono:
+            # Sem buffer: grava já, em transação própria (a sessão de quem chamou pode nem ter commit).
+            self._gravar([(modelo, campos)])
+            return None
+        with self._lock:
+            self._pendentes.append((modelo, campos))
+            tamanho = len(self._pendentes)
+            self._iniciar_thread()
+        if tamanho >= self.tamanho_lote:
+            self._acordar.set()
+        return None
+
+    def _iniciar_thread(self):
+        # Iniciada sob demanda (e não em init_app) para funcionar com servidores
+        # que fazem fork dos workers depois de criar a aplicação.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._executar, name='auditoria-flusher', daemon=True)
+            self._thread.start()
+
+    def _executar(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            self.descarregar()
+
+    def descarregar(self):
+        """ Grava imediatamente tudo o que estiver no buffer. """
+        with self._lock:
+            lote, self._pendentes = self._pendentes, []
+        if not lote or self.app is None:
+            return
+        try:
+            with self.app.app_context():
+                self._gravar(lote)
+        except Exception:
+            self.app.logger.exception('Falha ao gravar %d registros de auditoria; nova tentativa no próximo ciclo.', len(lote))
+            with self._lock:
+                self._pendentes = lote + self._pendentes
+                excedente = len(self._pendentes) - self.limite_buffer
+                if excedente > 0:
+                    self.app.logger.error('Buffer de auditoria cheio: %d registros descartados.', excedente)
+                    del self._pendentes[:excedente]
+
+    def _gravar(self, lote):
+        por_modelo = {}
+        for modelo, campos in lote:
+            por_modelo.setdefault(modelo, []).append(campos)
+        with db.engine.begin() as connection:
+            for modelo, registros in por_modelo.items():
+                # Agrupa por conjunto de colunas para que cada INSERT tenha várias linhas.
+                por_colunas = {}
+                for registro in registros:
+                    por_colunas.setdefault(tuple(sorted(registro)), []).append(registro)
+                for grupo in por_colunas.values():
+                    connection.execute(insert(modelo.__table__), grupo)
+                # INSERTs diretos não disparam os listeners do ORM.
+                if modelo is LogUso:
+                    acumular_uso(connection, registros)
+                elif modelo is LogAcessoPaciente:
+                    for paciente_id in {registro['paciente_id'] for registro in registros}:
+                        invalidar_resumo(paciente_id)
+
+
+auditoria = EscritorAuditoria()
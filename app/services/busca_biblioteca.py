@@ -0,0 +1,249 @@
+# app/services/busca_biblioteca.py
+"""
+Busca textual na BibliotecaConteudo (titulo, palavras_chave e conteudo_texto).
+
+O texto de cada conteúdo é normalizado em Python (minúsculas, sem acentos,
+sem stopwords e reduzido ao radical por um stemmer leve de português) e
+gravado em BibliotecaConteudo.texto_busca sempre que o conteúdo é inserido
+ou alterado. Título e palavras-chave são repetidos para pesarem mais no
+ranking. Como a normalização é a mesma nos dois lados, a consulta casa
+"vacinação", "vacinas" e "vacina" sem depender da extensão unaccent.
+
+- PostgreSQL: to_tsvector('simple', texto_busca) com índice GIN,
+  ranqueado por ts_rank_cd.
+- Outros bancos (SQLite em desenvolvimento): índice invertido em memória por
+  prefeitura, montado sob demanda e atualizado pelas rotas da biblioteca.
+
+Conteúdos gravados antes desta coluna existir são indexados com
+`flask reindexar-biblioteca`.
+"""
+
+from bisect import bisect_left
+from collections import namedtuple, Counter
+import math
+import re
+import threading
+import unicodedata
+
+from sqlalchemy import event, func, literal_column, select
+
+from app.cache import CacheTTL
+from app.extensions import db
+from app.models import BibliotecaConteudo
+
+ResultadoBusca = namedtuple('ResultadoBusca', ['itens', 'total', 'pagina', 'por_pagina'])
+
+PESO_TITULO = 3
+PESO_PALAVRAS_CHAVE = 2
+
+STOPWORDS = frozenset("""
+a ao aos as com como da das de do dos e em entre na nas no nos o os ou para
+pela pelas pelo pelos por que se sem sob sobre um uma umas uns ja mais muito
+nao sim seu sua seus suas meu minha eu ele ela eles elas voce voces isso esse
+essa este esta qual quando onde ter tem foi ser sao esta estao
+""".split())
+
+# Sufixos removidos pelo stemmer, do mais longo para o mais curto dentro de cada etapa.
+SUFIXOS_PLURAL = (('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'), ('ois', 'ol'), ('res', 'r'), ('ns', 'm'), ('s', ''))
+SUFIXOS_DERIVACAO = (
+    'amente', 'mente', 'acoes', 'acao', 'icoes', 'icao', 'idades', 'idade', 'ismos', 'ismo',
+    'istas', 'ista', 'aveis', 'avel', 'iveis', 'ivel', 'osas', 'osos', 'osa', 'oso', 'ados', 'adas', 'ado', 'ada', 'ao',
+)
+SUFIXOS_VOGAL = ('a', 'e', 'o')
+TAMANHO_MINIMO_RADICAL = 3
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def _sem_acentos(texto):
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+
+def _radical(palavra):
+    for sufixo, troca in SUFIXOS_PLURAL:
+        if palavra.endswith(sufixo) and len(palavra) - len(sufixo) >= TAMANHO_MINIMO_RADICAL:
+            palavra = palavra[:-len(sufixo)] + troca
+            break
+    for sufixo in SUFIXOS_DERIVACAO:
+        if palavra.endswith(sufixo) and len(palavra) - len(sufixo) >= TAMANHO_MINIMO_RADICAL:
+            palavra = palavra[:-len(sufixo)]
+            break
+    if palavra.endswith(SUFIXOS_VOGAL) and len(palavra) - 1 >= TAMANHO_MINIMO_RADICAL:
+        palavra = palavra[:-1]
+    return palavra
+
+
+def termos(texto):
+    """ Lista de radicais do texto, na ordem em que aparecem. """
+    palavras = _TOKEN.findall(_sem_acentos((texto or '').lower()))
+    return [_radical(p) for p in palavras if p not in STOPWORDS]
+
+
+def texto_de_busca(conteudo):
+    partes = (
+        [conteudo.titulo or ''] * PESO_TITULO
+        + [(conteudo.palavras_chave or '').replace(',', ' ')] * PESO_PALAVRAS_CHAVE
+        + [conteudo.conteudo_texto or '']
+    )
+    return ' '.join(termos(' '.join(partes)))
+
+
+@event.listens_for(BibliotecaConteudo, 'before_insert')
+@event.listens_for(BibliotecaConteudo, 'before_update')
+def _atualizar_texto_busca(mapper, connection, target):
+    target.texto_busca = texto_de_busca(target)
+
+
+class IndiceInvertido:
+    """
+    Índice invertido de uma prefeitura: radical -> {id do conteúdo: frequência}.
+    Ranqueia por TF-IDF normalizado pelo tamanho do documento.
+    """
+    def __init__(self):
+        self._postings = {}
+        self._tamanhos = {}
+        self._vocabulario = None
+        self._lock = threading.Lock()
+
+    def adicionar(self, conteudo_id, texto_busca):
+        frequencias = Counter((texto_busca or '').split())
+        with self._lock:
+            self._remover(conteudo_id)
+            for termo, frequencia in frequencias.items():
+                self._postings.setdefault(termo, {})[conteudo_id] = frequencia
+            self._tamanhos[conteudo_id] = max(sum(frequencias.values()), 1)
+            self._vocabulario = None
+
+    def remover(self, conteudo_id):
+        with self._lock:
+            self._remover(conteudo_id)
+            self._vocabulario = None
+
+    def _remover(self, conteudo_id):
+        if self._tamanhos.pop(conteudo_id, None) is None:
+            return
+        for termo in [t for t, docs in self._postings.items() if conteudo_id in docs]:
+            del self._postings[termo][conteudo_id]
+            if not self._postings[termo]:
+                del self._postings[termo]
+
+    def _expandir(self, prefixo):
+        # Busca por prefixo no vocabulário ordenado ("vacin" casa "vacinal").
+        if self._vocabulario is None:
+            self._vocabulario = sorted(self._postings)
+        inicio = bisect_left(self._vocabulario, prefixo)
+        fim = bisect_left(self._vocabulario, prefixo + '\uffff')
+        return self._vocabulario[inicio:fim]
+
+    def buscar(self, radicais):
+        """ Ids que contêm todos os radicais (por prefixo), do mais ao menos relevante. """
+        with self._lock:
+            total_docs = len(self._tamanhos) or 1
+            pontuacao = None
+            for radical in radicais:
+                pontos_termo = {}
+                for termo in self._expandir(radical):
+                    docs = self._postings[termo]
+                    idf = math.log(1 + total_docs / len(docs))
+                    for conteudo_id, frequencia in docs.items():
+                        pontos_termo[conteudo_id] = pontos_termo.get(conteudo_id, 0.0) + frequencia * idf
+                if pontuacao is None:
+                    pontuacao = pontos_termo
+                else:
+                    pontuacao = {i: p + pontos_termo[i] for i, p in pontuacao.items() if i in pontos_termo}
+                if not pontuacao:
+                    return []
+            return sorted(
+                (pontuacao or {}),
+                key=lambda i: (-pontuacao[i] / math.sqrt(self._tamanhos[i]), i)
+            )
+
+
+_indices = CacheTTL(ttl_segundos=600)
+
+
+def _usa_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def _indice(prefeitura_id):
+    def montar():
+        indice = IndiceInvertido()
+        linhas = db.session.execute(
+            select(BibliotecaConteudo).where(BibliotecaConteudo.prefeitura_id == prefeitura_id)
+        ).scalars()
+        for conteudo in linhas:
+            indice.adicionar(conteudo.id, conteudo.texto_busca or texto_de_busca(conteudo))
+        return indice
+    return _indices.get_or_set(prefeitura_id, montar)
+
+
+def atualizar_indice(conteudo):
+    """ Chamar após o commit de um conteúdo novo ou editado. """
+    if _usa_postgres():
+        return
+    indice = _indices.get(conteudo.prefeitura_id)
+    if indice is not None:
+        indice.adicionar(conteudo.id, conteudo.texto_busca)
+
+
+def remover_do_indice(prefeitura_id, conteudo_id):
+    """ Chamar após o commit da remoção de um conteúdo. """
+    if _usa_postgres():
+        return
+    indice = _indices.get(prefeitura_id)
+    if indice is not None:
+        indice.remover(conteudo_id)
+
+
+def buscar(prefeitura_id, consulta, pagina=1, por_pagina=20):
+    """
+    Busca conteúdos da prefeitura que contenham todos os termos da consulta.
+
+    Retorna:
+        Um ResultadoBusca com os itens da página, ordenados por relevância,
+        e o total de resultados.
+    """
+    pagina = max(pagina, 1)
+    por_pagina = max(por_pagina, 1)
+    radicais = list(dict.fromkeys(termos(consulta)))
+    if not radicais:
+        return ResultadoBusca([], 0, pagina, por_pagina)
+    inicio = (pagina - 1) * por_pagina
+
+    if _usa_postgres():
+        vetor = func.to_tsvector(literal_column("'simple'::regconfig"), BibliotecaConteudo.texto_busca)
+        # Os radicais só têm [a-z0-9], então podem ir direto para o tsquery.
+        tsquery = func.to_tsquery(literal_column("'simple'::regconfig"), ' & '.join(f'{r}:*' for r in radicais))
+        filtro = [BibliotecaConteudo.prefeitura_id == prefeitura_id, vetor.op('@@')(tsquery)]
+        total = db.session.scalar(select(func.count()).select_from(BibliotecaConteudo).where(*filtro))
+        itens = db.session.execute(
+            select(BibliotecaConteudo).where(*filtro).order_by(
+                func.ts_rank_cd(vetor, tsquery).desc(), BibliotecaConteudo.id
+            ).offset(inicio).limit(por_pagina)
+        ).scalars().all()
+        return ResultadoBusca(itens, total, pagina, por_pagina)
+
+    ids = _indice(prefeitura_id).buscar(radicais)
+    pagina_ids = ids[inicio:inicio + por_pagina]
+    por_id = {
+        c.id: c for c in BibliotecaConteudo.query.filter(BibliotecaConteudo.id.in_(pagina_ids)).all()
+    } if pagina_ids else {}
+    return ResultadoBusca([por_id[i] for i in pagina_ids if i in por_id], len(ids), pagina, por_pagina)
+
+
+def reindexar(prefeitura_id=None):
+    """ Recalcula texto_busca de todos os conteúdos. Retorna quantos foram atualizados. """
+    consulta = BibliotecaConteudo.query
+    if prefeitura_id is not None:
+        consulta = consulta.filter_by(prefeitura_id=prefeitura_id)
+    total = 0
+    for conteudo in consulta.all():
+        conteudo.texto_busca = texto_de_busca(conteudo)
+        total += 1
+    db.session.commit()
+    if prefeitura_id is None:
+        _indices.limpar()
+    else:
+        _indices.invalidar(prefeitura_id)
+    return total
@@ -0,0 +1,96 @@
+# app/services/cache_templates.py
+"""
+Cache de bytecode dos templates Jinja e cache de fragmentos renderizados.
+
+- Bytecode: os templates compilados ficam em TEMPLATES_BYTECODE_DIRETORIO
+  (padrão: <instance>/jinja_bytecode), compartilhado por todos os workers e
+  reaproveitado entre reinícios. O Jinja confere o checksum do fonte, então
+  um template alterado é recompilado sozinho. `flask precompilar-templates`
+  compila todos no deploy, antes de os workers subirem.
+- Fragmentos: {% cache 'nome' %}...{% endcache %} guarda o HTML do bloco
+  por FRAGMENTOS_TTL_SEGUNDOS, com chave por prefeitura e papel do usuário
+  (mais as expressões extras: {% cache 'nome', consulta.id %}). Só para
+  blocos que não dependem do usuário em si. Quem altera o que um fragmento
+  mostra chama invalidar_fragmentos(prefeitura_id); nos outros workers o
+  fragmento antigo vale até o TTL.
+"""
+
+import os
+
+from flask import has_request_context, session
+from flask_login import current_user
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from app.cache import CacheTTL
+from app.extensions import db
+from app.models import Prefeitura
+
+_fragmentos = CacheTTL(ttl_segundos=300)
+# Incrementada por invalidar_fragmentos(): muda a chave de todos os fragmentos da prefeitura.
+_geracoes = {}
+
+
+def _escopo():
+    """ (prefeitura_id, papel) de quem está vendo a página. """
+    if not has_request_context():
+        return None, None
+    if current_user.is_authenticated:
+        return current_user.prefeitura_id, current_user.role
+    if session.get('paciente_id'):
+        return session.get('prefeitura_id_paciente'), 'PACIENTE'
+    return None, None
+
+
+def prefeitura_atual():
+    """ Prefeitura de quem está vendo a página; para uso dentro de {% cache %}, onde só é consultada na falta. """
+    prefeitura_id, _ = _escopo()
+    return db.session.get(Prefeitura, prefeitura_id) if prefeitura_id else None
+
+
+class FragmentoCache(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        partes = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            partes.append(parser.parse_expression())
+        corpo = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_renderizar', [nodes.List(partes)]), [], [], corpo
+        ).set_lineno(lineno)
+
+    def _renderizar(self, partes, caller):
+        prefeitura_id, papel = _escopo()
+        chave = (prefeitura_id, _geracoes.get(prefeitura_id, 0), papel, *partes)
+        return _fragmentos.get_or_set(chave, caller)
+
+
+def invalidar_fragmentos(prefeitura_id):
+    """ Descarta (neste processo) todos os fragmentos em cache da prefeitura. """
+    _geracoes[prefeitura_id] = _geracoes.get(prefeitura_id, 0) + 1
+
+
+def init_app(app):
+    diretorio = app.config.get('TEMPLATES_BYTECODE_DIRETORIO') or os.path.join(app.instance_path, 'jinja_bytecode')
+    os.makedirs(diretorio, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(diretorio)
+    app.jinja_env.add_extension(FragmentoCache)
+    app.jinja_env.globals['prefeitura_atual'] = prefeitura_atual
+    _fragmentos.ttl_segundos = app.config.get('FRAGMENTOS_TTL_SEGUNDOS', 300)
+
+
+def precompilar(app):
+    """
+    Compila todos os templates da aplicação (inclusive dos blueprints),
+    gravando o bytecode. Retorna (compilados, [(template, erro)]).
+    """
+    compilados, erros = 0, []
+    for nome in app.jinja_env.list_templates(extensions=('html', 'txt', 'xml')):
+        try:
+            app.jinja_env.get_template(nome)
+            compilados += 1
+        except Exception as e:
+            erros.append((nome, e))
+    return compilados, erros
@@ -0,0 +1,315 @@
+# app/services/dados_sinteticos.py
+"""
+Gerador determinístico de dados sintéticos para testes de carga
+(`flask seed-scale`).
+
+Cada prefeitura gerada recebe um gestor, profissionais, pacientes com CPF e
+CNS válidos, meses de histórico de Consulta (em horário comercial, com alguns
+pacientes concentrando muitos atendimentos), Documentos, LogUso,
+LogAcessoPaciente e a configuração padrão do chatbot. A mesma semente gera
+sempre os mesmos dados.
+
+As tabelas grandes são carregadas com COPY no PostgreSQL (INSERTs de várias
+linhas nos outros bancos), com ids atribuídos aqui e as sequences ajustadas
+no final, então não há ida e volta ao banco por linha. Como os INSERTs
+diretos não passam pelos listeners do ORM, a consolidação LogUsoDiario é
+recalculada ao final de cada prefeitura.
+
+Os ids são reservados a partir do maior id existente: não rodar com a
+aplicação gravando no mesmo banco.
+"""
+
+import csv
+import datetime
+import io
+import json
+import random
+import uuid
+
+from sqlalchemy import func, insert, select, text
+from werkzeug.security import generate_password_hash
+
+from app.extensions import db
+from app.models import (
+    Prefeitura, Usuario, Paciente, Consulta, Documento, LogUso, LogAcessoPaciente, Configuracao, MensagemChatbot
+)
+from app.services import fila_atendimento
+from app.services.fluxo_chatbot import CHAVE_FLUXO, FLUXO_PADRAO, MENSAGENS_PADRAO
+from app.services.uso_diario import recalcular_uso_diario
+
+PACIENTES_POR_ESCALA = 2000
+PACIENTES_POR_PROFISSIONAL = 250
+CONSULTAS_POR_PACIENTE_MES = 0.4
+ACESSOS_EXTRAS_POR_CONSULTA = 2
+PACIENTES_NA_FILA = 10
+TAMANHO_LOTE = 10000
+
+NOMES = (
+    'Ana', 'Maria', 'Francisca', 'Antônia', 'Adriana', 'Juliana', 'Márcia', 'Fernanda', 'Patrícia', 'Aline',
+    'José', 'João', 'Antônio', 'Francisco', 'Carlos', 'Paulo', 'Pedro', 'Lucas', 'Luiz', 'Marcos',
+)
+SOBRENOMES = (
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa',
+)
+DDDS = ('11', '21', '31', '41', '51', '61', '71', '81', '85', '91')
+# (tipo, peso, status possíveis)
+TIPOS_CONSULTA = (
+    ('ACOLHIMENTO_ENF', 60, ('FINALIZADA', 'FINALIZADA', 'FINALIZADA', 'TRANSFERIDO')),
+    ('CONSULTA_MEDICA', 30, ('FINALIZADA',)),
+    ('ELETIVA', 10, ('FINALIZADA', 'FINALIZADA', 'CANCELADA')),
+)
+RESUMOS = (
+    'Aferição de pressão arterial. Orientado sobre dieta.',
+    'Queixa de dor de cabeça há 2 dias. Orientado repouso e hidratação.',
+    'Renovação de receita de uso contínuo.',
+    'Sintomas gripais leves. Orientações gerais.',
+    'Retorno com exames. Sem alterações.',
+)
+
+
+def gerar_cpf(base):
+    """ CPF válido a partir dos 9 primeiros dígitos (inteiro de 0 a 999999999). """
+    digitos = [int(d) for d in f'{base:09d}']
+    for tamanho in (9, 10):
+        soma = sum(d * peso for d, peso in zip(digitos, range(tamanho + 1, 1, -1)))
+        resto = soma * 10 % 11
+        digitos.append(0 if resto == 10 else resto)
+    return ''.join(map(str, digitos))
+
+
+def gerar_cns(aleatorio):
+    """ CNS definitivo válido (começa com 1 ou 2, derivado de um PIS). """
+    while True:
+        pis = str(aleatorio.choice((1, 2))) + ''.join(str(aleatorio.randrange(10)) for _ in range(10))
+        soma = sum(int(d) * peso for d, peso in zip(pis, range(15, 4, -1)))
+        dv = 11 - soma % 11
+        if dv == 11:
+            dv = 0
+        if dv != 10:
+            return f'{pis}000{dv}'
+        soma += 2
+        dv = 11 - soma % 11
+        if dv != 10:
+            return f'{pis}001{0 if dv == 11 else dv}'
+
+
+class _Carregador:
+    """ Grava linhas em lote por COPY (PostgreSQL) ou INSERT de várias linhas. """
+    def __init__(self, conexao):
+        self.conexao = conexao
+        self.copy = conexao.dialect.name == 'postgresql' and hasattr(conexao.connection.dbapi_connection, 'cursor')
+        self.proximos_ids = {}
+
+    def reservar_ids(self, modelo, quantidade):
+        tabela = modelo.__tablename__
+        if tabela not in self.proximos_ids:
+            self.proximos_ids[tabela] = (self.conexao.scalar(select(func.max(modelo.id))) or 0) + 1
+        inicio = self.proximos_ids[tabela]
+        self.proximos_ids[tabela] += quantidade
+        return range(inicio, inicio + quantidade)
+
+    def carregar(self, modelo, colunas, linhas):
+        lote = []
+        for linha in linhas:
+            lote.append(linha)
+            if len(lote) >= TAMANHO_LOTE:
+                self._gravar(modelo, colunas, lote)
+                lote = []
+        if lote:
+            self._gravar(modelo, colunas, lote)
+
+    def _gravar(self, modelo, colunas, lote):
+        if self.copy:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(lote)
+            buffer.seek(0)
+            cursor = self.conexao.connection.dbapi_connection.cursor()
+            cursor.copy_expert(
+                f"COPY {modelo.__tablename__} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        else:
+            self.conexao.execute(insert(modelo.__table__), [dict(zip(colunas, linha)) for linha in lote])
+
+    def ajustar_sequences(self):
+        if self.conexao.dialect.name != 'postgresql':
+            return
+        for tabela in self.proximos_ids:
+            self.conexao.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{tabela}', 'id'), (SELECT max(id) FROM {tabela}))"
+            ))
+
+
+class GeradorPrefeitura:
+    def __init__(self, carregador, subdominio, escala=1.0, meses=6, semente=0, senha_hash=None):
+        self.carregador = carregador
+        self.subdominio = subdominio
+        self.escala = escala
+        self.meses = meses
+        self.aleatorio = random.Random(f'{semente}:{subdominio}')
+        self.senha_hash = senha_hash
+        self.totais = {}
+
+    def gerar(self, numero):
+        conexao = self.carregador.conexao
+        self.prefeitura_id = conexao.execute(insert(Prefeitura).values(
+            nome_cidade=f'Município Sintético {numero:03d} ({self.subdominio})', subdominio=self.subdominio,
+            status_assinatura='ATIVA', limite_consultas_mes=1000000, limite_atendimentos_mes=1000000,
+            limite_usuarios_profissionais=1000
+        ).returning(Prefeitura.id)).scalar_one()
+        self._usuarios()
+        self._pacientes()
+        self._consultas()
+        self._chatbot()
+        return self.prefeitura_id
+
+    def _nome(self):
+        return f'{self.aleatorio.choice(NOMES)} {self.aleatorio.choice(SOBRENOMES)} {self.aleatorio.choice(SOBRENOMES)}'
+
+    def _usuarios(self):
+        total = max(3, round(PACIENTES_POR_ESCALA * self.escala / PACIENTES_POR_PROFISSIONAL))
+        ids = self.carregador.reservar_ids(Usuario, total + 1)
+        self.gestor_id, self.profissionais = ids[0], list(ids[1:])
+        linhas = [(self.gestor_id, self.prefeitura_id, 'Gestor Sintético', f'gestor@{self.subdominio}', self.senha_hash, 'GESTOR', True)]
+        linhas += [
+            (id_, self.prefeitura_id, self._nome(), f'prof{i}@{self.subdominio}', self.senha_hash, 'PROFISSIONAL_SAUDE', True)
+            for i, id_ in enumerate(self.profissionais)
+        ]
+        self.carregador.carregar(
+            Usuario, ('id', 'prefeitura_id', 'nome_completo', 'email', 'password_hash', 'role', 'is_active'), linhas
+        )
+        self.totais['usuarios'] = len(linhas)
+
+    def _pacientes(self):
+        total = max(1, round(PACIENTES_POR_ESCALA * self.escala))
+        self.pacientes = list(self.carregador.reservar_ids(Paciente, total))
+        deslocamento = self.aleatorio.randrange(10 ** 9)
+        ddd = self.aleatorio.choice(DDDS)
+
+        def linhas():
+            for i, id_ in enumerate(self.pacientes):
+                # Multiplicar por um primo com 10^9 é uma bijeção: CPFs distintos, mas sem sequência aparente.
+                cpf = gerar_cpf((i * 7919 + deslocamento) % 10 ** 9)
+                cns = gerar_cns(self.aleatorio) if self.aleatorio.random() < 0.8 else None
+                telefone = f'+55{ddd}9{i:08d}'
+                yield (id_, self.prefeitura_id, self._nome(), cpf, cns, telefone, 'FINALIZADO')
+        self.carregador.carregar(
+            Paciente, ('id', 'prefeitura_id', 'nome_completo', 'cpf', 'cns', 'telefone_whatsapp', 'status'), linhas()
+        )
+        self.totais['pacientes'] = len(self.pacientes)
+
+    def _horario(self, inicio_periodo, dias):
+        """ Dia útil em horário comercial, com pico pela manhã. """
+        while True:
+            dia = inicio_periodo + datetime.timedelta(days=self.aleatorio.randrange(dias))
+            if dia.weekday() < 5 or self.aleatorio.random() < 0.05:
+                break
+        hora = min(17.9, max(7.0, self.aleatorio.gauss(10.5, 2.5)))
+        return datetime.datetime.combine(dia, datetime.time.min) + datetime.timedelta(minutes=int(hora * 60))
+
+    def _consultas(self):
+        aleatorio = self.aleatorio
+        dias = max(1, self.meses * 30)
+        hoje = datetime.date.today()
+        inicio_periodo = hoje - datetime.timedelta(days=dias)
+        total = round(len(self.pacientes) * CONSULTAS_POR_PACIENTE_MES * self.meses)
+        ids = self.carregador.reservar_ids(Consulta, total)
+        # Pesos de Pareto: poucos pacientes (crônicos) concentram muitos atendimentos.
+        pesos_pacientes = [aleatorio.paretovariate(1.5) for _ in self.pacientes]
+        pacientes = aleatorio.choices(self.pacientes, weights=pesos_pacientes, k=total)
+        tipos = aleatorio.choices(TIPOS_CONSULTA, weights=[peso for _, peso, _ in TIPOS_CONSULTA], k=total)
+
+        consultas, documentos, usos, acessos = [], [], [], []
+        for id_, paciente_id, (tipo, _, status_possiveis) in zip(ids, pacientes, tipos):
+            profissional_id = aleatorio.choice(self.profissionais)
+            inicio = self._horario(inicio_periodo, dias)
+            status = aleatorio.choice(status_possiveis)
+            fim = inicio + datetime.timedelta(minutes=max(3, int(aleatorio.lognormvariate(2.7, 0.5))))
+            consultas.append((
+                id_, self.prefeitura_id, str(uuid.UUID(int=aleatorio.getrandbits(128), version=4)), paciente_id,
+                profissional_id, status, tipo, inicio, None if status == 'CANCELADA' else fim,
+                None if status == 'CANCELADA' else aleatorio.choice(RESUMOS), 30 if tipo == 'ELETIVA' else None
+            ))
+            if status == 'CANCELADA':
+                continue
+            usos.append((self.prefeitura_id, inicio, 'CONSULTA_INICIADA', 1.0, 'consulta', id_, profissional_id))
+            acessos.append((inicio, self.prefeitura_id, profissional_id, paciente_id, id_, f'INICIOU_ATENDIMENTO ({tipo})'))
+            for _ in range(aleatorio.randrange(ACESSOS_EXTRAS_POR_CONSULTA * 2 + 1)):
+                momento = inicio + datetime.timedelta(minutes=aleatorio.randrange(60 * 24 * 7))
+                acessos.append((momento, self.prefeitura_id, aleatorio.choice(self.profissionais), paciente_id, None, 'ACESSOU_PRONTUARIO'))
+            if tipo == 'CONSULTA_MEDICA' and aleatorio.random() < 0.3:
+                dias_afastamento = aleatorio.randint(1, 5)
+                documentos.append((
+                    self.prefeitura_id, id_, 'ATESTADO',
+                    f'Atesto para os devidos fins que o(a) paciente necessita de {dias_afastamento} dias de afastamento.',
+                    fim, 'PENDENTE'
+                ))
+                usos.append((self.prefeitura_id, fim, 'DOCUMENTO_EMITIDO', 1.0, 'documento', id_, profissional_id))
+
+        self.carregador.carregar(Consulta, (
+            'id', 'prefeitura_id', 'uuid', 'paciente_id', 'profissional_id', 'status', 'tipo', 'data_inicio',
+            'data_fim', 'resumo_atendimento', 'duracao_minutos'
+        ), consultas)
+        self.carregador.carregar(
+            Documento, ('id', 'prefeitura_id', 'consulta_id', 'tipo', 'conteudo', 'data_emissao', 'status_pdf'),
+            self._com_ids(Documento, documentos)
+        )
+        self.carregador.carregar(LogUso, (
+            'id', 'prefeitura_id', 'timestamp', 'event_type', 'quantity', 'unit', 'related_consulta_id', 'related_usuario_id'
+        ), self._com_ids(LogUso, usos))
+        acessos.sort(key=lambda linha: linha[0])
+        self.carregador.carregar(LogAcessoPaciente, (
+            'id', 'timestamp', 'prefeitura_id', 'usuario_id', 'paciente_id', 'consulta_id', 'acao'
+        ), self._com_ids(LogAcessoPaciente, acessos))
+        self.inicio_periodo = inicio_periodo
+        self.totais.update(consultas=len(consultas), documentos=len(documentos), logs_uso=len(usos), logs_acesso=len(acessos))
+
+    def _com_ids(self, modelo, linhas):
+        ids = self.carregador.reservar_ids(modelo, len(linhas))
+        return [(id_,) + linha for id_, linha in zip(ids, linhas)]
+
+    def _chatbot(self):
+        conexao = self.carregador.conexao
+        conexao.execute(insert(Configuracao).values(
+            prefeitura_id=self.prefeitura_id, chave=CHAVE_FLUXO, valor=json.dumps(FLUXO_PADRAO),
+            descricao='Definição do fluxo do chatbot em formato JSON.'
+        ))
+        conexao.execute(insert(MensagemChatbot), [
+            {'prefeitura_id': self.prefeitura_id, 'chave': chave, 'texto': texto, 'descricao': f'Mensagem para o nó {chave}'}
+            for chave, texto in MENSAGENS_PADRAO.items()
+        ])
+
+
+def gerar_prefeituras(quantidade, escala=1.0, meses=6, semente=0, prefixo='escala', senha='1234', subdominios=None):
+    """
+    Gera `quantidade` prefeituras (subdomínios <prefixo>-001, ...). As que já
+    existem são puladas. Os usuários são gestor@<subdominio> e
+    prof<N>@<subdominio>, todos com a mesma senha.
+
+    Retorna:
+        Lista de (subdominio, totais por tabela) das prefeituras geradas.
+    """
+    subdominios = subdominios or [f'{prefixo}-{numero:03d}' for numero in range(1, quantidade + 1)]
+    existentes = set(db.session.scalars(select(Prefeitura.subdominio).where(Prefeitura.subdominio.in_(subdominios))))
+    # Um único hash para todos os usuários: gerar milhares de hashes PBKDF2 levaria minutos.
+    senha_hash = generate_password_hash(senha)
+    geradas = []
+    for numero, subdominio in enumerate(subdominios, start=1):
+        if subdominio in existentes:
+            continue
+        with db.engine.begin() as conexao:
+            carregador = _Carregador(conexao)
+            gerador = GeradorPrefeitura(carregador, subdominio, escala, meses, semente, senha_hash)
+            prefeitura_id = gerador.gerar(numero)
+            carregador.ajustar_sequences()
+        recalcular_uso_diario(gerador.inicio_periodo, prefeitura_id=prefeitura_id)
+        _enfileirar_pacientes(prefeitura_id, gerador.pacientes[:PACIENTES_NA_FILA])
+        geradas.append((subdominio, gerador.totais))
+    return geradas
+
+
+def _enfileirar_pacientes(prefeitura_id, pacientes_ids):
+    """ Alguns pacientes aguardando nas filas, pelo caminho normal da aplicação. """
+    for i, paciente in enumerate(Paciente.query.filter(Paciente.id.in_(pacientes_ids)).order_by(Paciente.id)):
+        fila_atendimento.enfileirar(paciente, 'ACOLHIMENTO_ENF' if i % 3 else 'CONSULTA_MEDICA')
+    db.session.commit()
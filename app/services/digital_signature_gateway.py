@@ -1,12 +1,16 @@
 # app/services/digital_signature_gateway.py
 
+import base64
+
 class DigitalSignatureGateway:
     """
     Interface para o provedor de serviços de assinatura digital.
+    Uma instância por processo, obtida de gateways.obter('assinatura') (app/services/gateways.py).
     """
-    def __init__(self, app_config):
+    def __init__(self, app_config, cliente=None):
         self.config = app_config
-        print("Gateway de Assinatura Digital Inicializado.")
+        # ClienteHTTP do provedor; None enquanto GATEWAY_ASSINATURA_URL não estiver configurada.
+        self.cliente = cliente
 
     def assinar_documento(self, conteudo_documento, dados_signatario):
         """
@@ -15,6 +19,13 @@ class DigitalSignatureGateway:
         Retorna:
             Um hash ou identificador da assinatura.
         """
+        if self.cliente is not None:
+            if isinstance(conteudo_documento, bytes):
+                conteudo_documento = base64.b64encode(conteudo_documento).decode()
+            resposta = self.cliente.requisitar('POST', '/assinaturas', {
+                'documento': conteudo_documento, 'signatario': dados_signatario
+            }, operacao='assinar_documento')
+            return resposta['hash_assinatura']
         print(f"Enviando documento para assinatura pelo signatário: {dados_signatario['nome']}")
         # Lógica de integração com a API de assinatura virá aqui.
         return 'hash_de_assinatura_exemplo_fghij'
\ No newline at end of file
@@ -0,0 +1,198 @@
+# app/services/documentos_pdf.py
+"""
+Geração em segundo plano dos PDFs dos Documentos (atestados e demais tipos).
+
+Ao emitir um documento, a rota só grava a linha (status_pdf='PENDENTE') e
+chama renderizador_pdf.agendar(); um pool de threads gera o PDF e marca o
+documento como PRONTO, então a requisição não espera a renderização.
+
+- Layouts: compilados uma vez por (prefeitura, tipo de documento) e mantidos
+  em cache. O cabeçalho pode ser personalizado pela Configuracao
+  DOCUMENTO_CABECALHO; quem alterar essa configuração chama invalidar_layouts().
+- Armazenamento: cada PDF é gravado em PDF_DIRETORIO com o nome igual ao
+  SHA-256 do seu conteúdo de origem (layout + dados do documento). O mesmo
+  conteúdo nunca é renderizado duas vezes, e os downloads servem o arquivo
+  gravado.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import tempfile
+import textwrap
+import threading
+
+from sqlalchemy import update
+
+from app.cache import CacheTTL
+from app.extensions import db
+from app.models import Documento, Configuracao, Prefeitura
+from app.services.pdf_simples import ALTURA_A4, LARGURA_A4, montar_pdf, operador_texto
+
+TITULOS = {
+    'ATESTADO': 'ATESTADO MÉDICO',
+}
+
+MARGEM = 60
+ALTURA_LINHA = 16
+# Helvetica 11pt tem em média ~5,5pt por caractere.
+CARACTERES_POR_LINHA = 86
+LINHAS_POR_PAGINA = 38
+
+Layout = namedtuple('Layout', ['versao', 'cabecalho', 'largura'])
+
+_layouts = CacheTTL(ttl_segundos=600)
+
+
+def _compilar_layout(prefeitura_id, tipo):
+    config = Configuracao.query.filter_by(prefeitura_id=prefeitura_id, chave='DOCUMENTO_CABECALHO').first()
+    if config and config.valor:
+        cabecalho = config.valor
+    else:
+        prefeitura = db.session.get(Prefeitura, prefeitura_id)
+        cabecalho = f'Prefeitura Municipal de {prefeitura.nome_cidade}'
+    titulo = TITULOS.get(tipo, tipo.replace('_', ' ').upper())
+    # A parte fixa de todas as páginas já vai pronta em operadores de PDF.
+    fixo = (
+        operador_texto(MARGEM, ALTURA_A4 - MARGEM, cabecalho, tamanho=12, fonte='negrito')
+        + b'%d %d m %d %d l S\n' % (MARGEM, ALTURA_A4 - MARGEM - 8, LARGURA_A4 - MARGEM, ALTURA_A4 - MARGEM - 8)
+        + operador_texto(MARGEM, ALTURA_A4 - MARGEM - 50, titulo, tamanho=16, fonte='negrito')
+    )
+    versao = hashlib.sha256(fixo + str(CARACTERES_POR_LINHA).encode()).hexdigest()[:16]
+    return Layout(versao, fixo, CARACTERES_POR_LINHA)
+
+
+def obter_layout(prefeitura_id, tipo):
+    return _layouts.get_or_set((prefeitura_id, tipo), lambda: _compilar_layout(prefeitura_id, tipo))
+
+
+def invalidar_layouts():
+    _layouts.limpar()
+
+
+def _campos(documento):
+    consulta = documento.consulta
+    return {
+        'tipo': documento.tipo,
+        'conteudo': documento.conteudo,
+        'data_emissao': documento.data_emissao.strftime('%d/%m/%Y %H:%M'),
+        'profissional': consulta.profissional.nome_completo,
+        'consulta': consulta.uuid,
+    }
+
+
+def hash_conteudo(layout, campos):
+    return hashlib.sha256(
+        (layout.versao + json.dumps(campos, sort_keys=True, ensure_ascii=False)).encode()
+    ).hexdigest()
+
+
+def renderizar(layout, campos):
+    linhas = []
+    for paragrafo in campos['conteudo'].splitlines() or ['']:
+        linhas.extend(textwrap.wrap(paragrafo, layout.largura) or [''])
+    rodape = (
+        f"Emitido em {campos['data_emissao']} por {campos['profissional']}. "
+        f"Atendimento {campos['consulta']}."
+    )
+    paginas = []
+    for inicio in range(0, len(linhas), LINHAS_POR_PAGINA):
+        conteudo = bytearray(layout.cabecalho)
+        y = ALTURA_A4 - MARGEM - 100
+        for linha in linhas[inicio:inicio + LINHAS_POR_PAGINA]:
+            conteudo += operador_texto(MARGEM, y, linha)
+            y -= ALTURA_LINHA
+        conteudo += operador_texto(MARGEM, MARGEM - 20, rodape, tamanho=8)
+        paginas.append(bytes(conteudo))
+    return montar_pdf(paginas)
+
+
+class RenderizadorPDF:
+    def __init__(self, app=None):
+        self.app = None
+        self._pool = None
+        self._em_andamento = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.assincrono = app.config.get('PDF_RENDERIZACAO_ASSINCRONA', True)
+        self.workers = app.config.get('PDF_WORKERS', 2)
+        self.diretorio = app.config.get('PDF_DIRETORIO') or os.path.join(app.instance_path, 'documentos')
+        app.extensions['renderizador_pdf'] = self
+
+    def caminho(self, hash_pdf):
+        return os.path.join(self.diretorio, hash_pdf[:2], f'{hash_pdf}.pdf')
+
+    def agendar(self, documento_id):
+        """ Coloca o documento na fila de renderização (ignora se já está na fila). """
+        with self._lock:
+            if documento_id in self._em_andamento:
+                return
+            self._em_andamento.add(documento_id)
+            if self.assincrono and self._pool is None:
+                # Criado sob demanda para funcionar com servidores que fazem fork dos workers.
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='pdf')
+        if self.assincrono:
+            self._pool.submit(self._executar, documento_id)
+        else:
+            self._executar(documento_id)
+
+    def status(self, documento):
+        """
+        Status do PDF do documento. Documentos pendentes que não estão na fila
+        deste processo (ex: o worker que os recebeu foi reiniciado) são
+        reagendados.
+        """
+        if documento.status_pdf == 'PENDENTE':
+            self.agendar(documento.id)
+        return documento.status_pdf
+
+    def _executar(self, documento_id):
+        try:
+            with self.app.app_context():
+                try:
+                    self._renderizar_documento(documento_id)
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.exception('Falha ao gerar o PDF do documento %s.', documento_id)
+                    db.session.execute(
+                        update(Documento).where(Documento.id == documento_id)
+                        .values(status_pdf='ERRO', erro_pdf=f'{type(e).__name__}: {e}'[:255])
+                    )
+                    db.session.commit()
+        finally:
+            with self._lock:
+                self._em_andamento.discard(documento_id)
+
+    def _renderizar_documento(self, documento_id):
+        documento = db.session.get(Documento, documento_id)
+        if documento is None:
+            return
+        layout = obter_layout(documento.prefeitura_id, documento.tipo)
+        campos = _campos(documento)
+        hash_pdf = hash_conteudo(layout, campos)
+        destino = self.caminho(hash_pdf)
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            # Grava em arquivo temporário e renomeia: quem ler nunca vê um PDF pela metade.
+            descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+            with os.fdopen(descritor, 'wb') as arquivo:
+                arquivo.write(renderizar(layout, campos))
+            os.replace(temporario, destino)
+        db.session.execute(
+            update(Documento).where(Documento.id == documento_id)
+            .values(status_pdf='PRONTO', hash_pdf=hash_pdf, erro_pdf=None)
+        )
+        db.session.commit()
+
+    def encerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+
+renderizador_pdf = RenderizadorPDF()
@@ -0,0 +1,150 @@
+# app/services/fila_atendimento.py
+"""
+Filas de atendimento por prefeitura, ordenadas por horário de chegada.
+
+Cada paciente aguardando ocupa uma linha em EntradaFila. O índice
+(prefeitura_id, fila, entrada_em, id) mantém as entradas já na ordem da fila,
+então consultar o início, retirar ou contar não varre a tabela de pacientes.
+As funções apenas adicionam/removem da sessão; o commit fica com quem chama,
+junto com o restante da operação (ex: a criação da Consulta).
+
+Retirar um paciente da fila é um único DELETE ... RETURNING: se dois
+profissionais chamam ao mesmo tempo, só um recebe a linha e o outro recebe
+None, sem iniciar duas consultas para o mesmo paciente. Para chamar o
+próximo, o início da fila é escolhido com SELECT ... FOR UPDATE SKIP LOCKED
+no PostgreSQL: quem chega enquanto outro profissional segura a primeira
+entrada pula para a seguinte em vez de esperar por ela. No SQLite (sem
+FOR UPDATE) o mesmo statement é atômico porque o banco só aceita um escritor
+por vez.
+"""
+
+from sqlalchemy import and_, delete, func, select
+
+from app.extensions import db
+from app.models import EntradaFila
+from app.services.versao_painel import marcar_alteracao
+
+# Nome da fila (o mesmo usado em Consulta.tipo e na ação JOIN_QUEUE do chatbot)
+# -> status do paciente enquanto aguarda nela.
+FILAS = {
+    'ACOLHIMENTO_ENF': 'AGUARDANDO_ACOLHIMENTO',
+    'CONSULTA_MEDICA': 'AGUARDANDO_MEDICO',
+}
+
+
+def _validar_fila(fila):
+    if fila not in FILAS:
+        raise ValueError(f"Fila desconhecida: {fila}")
+
+
+def _ordenadas(prefeitura_id, fila):
+    return EntradaFila.query.filter_by(
+        prefeitura_id=prefeitura_id, fila=fila
+    ).order_by(EntradaFila.entrada_em.asc(), EntradaFila.id.asc())
+
+
+def enfileirar(paciente, fila):
+    """
+    Coloca o paciente no fim da fila e atualiza seu status.
+    Se ele já aguardava em outra fila, é movido; se já está nesta, mantém a posição.
+    """
+    _validar_fila(fila)
+    paciente.status = FILAS[fila]
+    entrada = EntradaFila.query.filter_by(paciente_id=paciente.id).first()
+    if entrada and entrada.fila == fila:
+        return entrada
+    if entrada:
+        db.session.delete(entrada)
+        db.session.flush()
+    entrada = EntradaFila(
+        prefeitura_id=paciente.prefeitura_id,
+        fila=fila,
+        paciente_id=paciente.id,
+        paciente_nome=paciente.nome_completo
+    )
+    db.session.add(entrada)
+    return entrada
+
+
+def acao_join_queue(paciente, no_fluxo):
+    """
+    Executa a ação JOIN_QUEUE de um nó do fluxo do chatbot, ex:
+    {"type": "action", "action": "JOIN_QUEUE", "queue": "ACOLHIMENTO_ENF"}.
+    """
+    return enfileirar(paciente, no_fluxo['queue'])
+
+
+def espiar(prefeitura_id, fila):
+    """ Retorna a primeira entrada da fila, sem removê-la (ou None). """
+    _validar_fila(fila)
+    return _ordenadas(prefeitura_id, fila).first()
+
+
+def _retirar(prefeitura_id, condicao):
+    resultado = db.session.execute(
+        delete(EntradaFila).where(condicao).returning(
+            EntradaFila.id, EntradaFila.paciente_id, EntradaFila.paciente_nome, EntradaFila.entrada_em
+        ).execution_options(synchronize_session=False)
+    ).first()
+    if resultado is not None:
+        # O DELETE direto não passa pelo flush, que é quem atualiza a versão do painel.
+        marcar_alteracao(db.session, prefeitura_id)
+        # Alguma entrada carregada antes nesta sessão não existe mais.
+        entrada = db.session.identity_map.get(db.session.identity_key(EntradaFila, resultado.id))
+        if entrada is not None:
+            db.session.expunge(entrada)
+    return resultado
+
+
+def desenfileirar(prefeitura_id, fila):
+    """
+    Retira o primeiro paciente da fila que não esteja sendo chamado por outro
+    profissional, em um único statement.
+
+    Retorna:
+        A linha removida (id, paciente_id, paciente_nome, entrada_em), ou None
+        se a fila estiver vazia.
+    """
+    _validar_fila(fila)
+    primeira = select(EntradaFila.id).where(
+        EntradaFila.prefeitura_id == prefeitura_id,
+        EntradaFila.fila == fila
+    ).order_by(
+        EntradaFila.entrada_em.asc(), EntradaFila.id.asc()
+    ).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+    return _retirar(prefeitura_id, EntradaFila.id == primeira)
+
+
+def remover(prefeitura_id, fila, paciente_id):
+    """
+    Retira um paciente específico da fila (ex: chamado diretamente pelo profissional).
+
+    Retorna:
+        A linha removida, ou None se o paciente não estava aguardando nesta
+        fila (ou se outro profissional acabou de chamá-lo).
+    """
+    _validar_fila(fila)
+    return _retirar(prefeitura_id, and_(
+        EntradaFila.prefeitura_id == prefeitura_id,
+        EntradaFila.fila == fila,
+        EntradaFila.paciente_id == paciente_id
+    ))
+
+
+def tamanho(prefeitura_id, fila):
+    _validar_fila(fila)
+    return db.session.scalar(
+        select(func.count(EntradaFila.id)).where(
+            EntradaFila.prefeitura_id == prefeitura_id,
+            EntradaFila.fila == fila
+        )
+    )
+
+
+def listar(prefeitura_id, fila, limite=None):
+    """ Entradas da fila em ordem de chegada. """
+    _validar_fila(fila)
+    query = _ordenadas(prefeitura_id, fila)
+    if limite:
+        query = query.limit(limite)
+    return query.all()
@@ -0,0 +1,255 @@
+# app/services/fluxo_chatbot.py
+"""
+Compilação e execução do fluxo do chatbot (Configuracao CHATBOT_FLOW_JSON).
+
+Ao salvar, o JSON do fluxo é validado e transformado em um FluxoCompilado:
+os nós ficam indexados por id, com os textos de MensagemChatbot já resolvidos
+e as ações já ligadas à função que as executa. O resultado é guardado em cache
+por prefeitura com um carimbo de versão, então executar um passo da conversa
+é uma busca em dicionário, sem acesso ao banco.
+
+Formato do fluxo:
+    {"start_node": "boas_vindas",
+     "nodes": {"boas_vindas": {"message_key": "...", "type": "static", "next_node": "menu"},
+               "menu": {"message_key": "...", "type": "options",
+                        "options": [{"label": "...", "next_node": "..."}]},
+               "fila": {"message_key": "...", "type": "action",
+                        "action": "JOIN_QUEUE", "queue": "ACOLHIMENTO_ENF"}}}
+"""
+
+from collections import namedtuple
+import hashlib
+import json
+from types import MappingProxyType
+
+from app.cache import CacheTTL
+from app.services import fila_atendimento
+
+CHAVE_FLUXO = 'CHATBOT_FLOW_JSON'
+TIPOS_DE_NO = ('static', 'options', 'action')
+
+# Ação -> (função executora, validador dos parâmetros do nó).
+ACOES = {
+    'JOIN_QUEUE': (
+        fila_atendimento.acao_join_queue,
+        lambda no: None if isinstance(no.get('queue'), str) and no['queue'] in fila_atendimento.FILAS
+        else f"fila desconhecida '{no.get('queue')}'"
+    ),
+}
+
+# Fluxo e mensagens iniciais de uma prefeitura nova (flask seed-db, seed-scale).
+FLUXO_PADRAO = {
+    "start_node": "boas_vindas",
+    "nodes": {
+        "boas_vindas": {
+            "message_key": "msg_bem_vindo_geral", "type": "static", "next_node": "menu_principal"
+        },
+        "menu_principal": {
+            "message_key": "msg_menu_principal", "type": "options",
+            "options": [
+                {"label": "Falar com Enfermagem", "next_node": "fila_acolhimento"},
+                {"label": "Falar com Médico", "next_node": "fila_medico"}
+            ]
+        },
+        "fila_acolhimento": {
+            "message_key": "msg_fila_acolhimento", "type": "action",
+            "action": "JOIN_QUEUE", "queue": "ACOLHIMENTO_ENF"
+        },
+        "fila_medico": {
+            "message_key": "msg_fila_medico", "type": "action",
+            "action": "JOIN_QUEUE", "queue": "CONSULTA_MEDICA"
+        }
+    }
+}
+MENSAGENS_PADRAO = {
+    "msg_bem_vindo_geral": "Olá! Bem-vindo(a) ao nosso serviço de saúde digital.",
+    "msg_menu_principal": "Como podemos ajudar hoje?",
+    "msg_fila_acolhimento": "Ok, você está na fila para falar com a enfermagem. Aguarde um momento.",
+    "msg_fila_medico": "Certo, você está na fila para falar com um médico. Aguarde um momento."
+}
+
+NoCompilado = namedtuple('NoCompilado', ['id', 'tipo', 'texto', 'proximo', 'opcoes', 'acao', 'parametros'])
+Opcao = namedtuple('Opcao', ['label', 'proximo'])
+
+_cache_fluxos = CacheTTL(ttl_segundos=300)
+
+
+class FluxoInvalido(ValueError):
+    def __init__(self, erros):
+        super().__init__('; '.join(erros))
+        self.erros = erros
+
+
+class FluxoCompilado:
+    """
+    Fluxo validado e imutável. Use no() e proximo() para conduzir a conversa.
+    """
+    def __init__(self, inicio, nos, versao, avisos):
+        self.inicio = inicio
+        self.nos = MappingProxyType(nos)
+        self.versao = versao
+        self.avisos = tuple(avisos)
+
+    def no(self, no_id):
+        return self.nos[no_id]
+
+    def primeiro(self):
+        return self.nos[self.inicio]
+
+    def proximo(self, no_id, escolha=None):
+        """
+        Nó seguinte a no_id. Em nós de opções, escolha é o número da opção
+        (a partir de 1) ou o seu texto. Retorna None se a conversa terminou
+        ou se a escolha não corresponde a nenhuma opção.
+        """
+        no = self.nos[no_id]
+        if no.tipo != 'options':
+            return self.nos[no.proximo] if no.proximo else None
+        for indice, opcao in enumerate(no.opcoes, start=1):
+            if escolha == indice or str(escolha).strip().lower() in (str(indice), opcao.label.lower()):
+                return self.nos[opcao.proximo]
+        return None
+
+    def executar_acao(self, no, paciente):
+        """ Executa a ação do nó (ex: JOIN_QUEUE) para o paciente. """
+        executor, _ = ACOES[no.acao]
+        return executor(paciente, no.parametros)
+
+
+def compilar_fluxo(fluxo, mensagens):
+    """
+    Valida e compila o fluxo.
+
+    fluxo: dict já decodificado do JSON.
+    mensagens: dict {chave: texto} das MensagemChatbot da prefeitura.
+
+    Lança FluxoInvalido com a lista de problemas encontrados.
+    """
+    erros = []
+    nos_brutos = fluxo.get('nodes') if isinstance(fluxo, dict) else None
+    if not isinstance(nos_brutos, dict) or not nos_brutos:
+        raise FluxoInvalido(["O fluxo não possui nós ('nodes')."])
+    inicio = fluxo.get('start_node')
+    if not isinstance(inicio, str):
+        raise FluxoInvalido([f"O nó inicial ('start_node') deve ser o id de um nó, não {json.dumps(inicio)}."])
+    if inicio not in nos_brutos:
+        erros.append(f"Nó inicial '{inicio}' não existe.")
+
+    def destino(no_id, proximo, origem):
+        if proximo is None:
+            return
+        if not isinstance(proximo, str):
+            erros.append(f"Nó '{no_id}': {origem} deve ser o id de um nó, não {json.dumps(proximo)}.")
+        elif proximo not in nos_brutos:
+            erros.append(f"Nó '{no_id}': {origem} aponta para o nó inexistente '{proximo}'.")
+
+    nos = {}
+    for no_id, no in nos_brutos.items():
+        if not isinstance(no, dict):
+            erros.append(f"Nó '{no_id}': deve ser um objeto com 'type' e 'message_key'.")
+            continue
+        tipo = no.get('type')
+        if tipo not in TIPOS_DE_NO:
+            erros.append(f"Nó '{no_id}': tipo desconhecido '{tipo}'.")
+            continue
+        chave_msg = no.get('message_key')
+        if not isinstance(chave_msg, str):
+            erros.append(f"Nó '{no_id}': 'message_key' deve ser um texto, não {json.dumps(chave_msg)}.")
+            chave_msg = None
+        elif chave_msg not in mensagens:
+            erros.append(f"Nó '{no_id}': mensagem desconhecida '{chave_msg}'.")
+        opcoes = ()
+        acao = None
+        parametros = {}
+        if tipo == 'options':
+            opcoes_brutas = no.get('options')
+            if not opcoes_brutas:
+                erros.append(f"Nó '{no_id}': nó de opções sem nenhuma opção.")
+            elif not isinstance(opcoes_brutas, list) or not all(isinstance(o, dict) for o in opcoes_brutas):
+                erros.append(f"Nó '{no_id}': 'options' deve ser uma lista de objetos com 'label' e 'next_node'.")
+                opcoes_brutas = None
+            opcoes = tuple(Opcao(str(o.get('label', '')), o.get('next_node')) for o in opcoes_brutas or [])
+            for opcao in opcoes:
+                if opcao.proximo is None:
+                    erros.append(f"Nó '{no_id}': a opção '{opcao.label}' não indica o próximo nó.")
+                destino(no_id, opcao.proximo, f"a opção '{opcao.label}'")
+        elif tipo == 'action':
+            acao = no.get('action')
+            if not isinstance(acao, str) or acao not in ACOES:
+                erros.append(f"Nó '{no_id}': ação desconhecida '{acao}'.")
+            else:
+                problema = ACOES[acao][1](no)
+                if problema:
+                    erros.append(f"Nó '{no_id}': {problema}.")
+            parametros = MappingProxyType({k: v for k, v in no.items() if k not in ('type', 'message_key', 'action', 'next_node')})
+        destino(no_id, no.get('next_node'), 'next_node')
+        nos[no_id] = NoCompilado(
+            id=no_id, tipo=tipo, texto=mensagens.get(chave_msg, ''),
+            proximo=no.get('next_node') if tipo != 'options' else None,
+            opcoes=opcoes, acao=acao, parametros=parametros
+        )
+
+    if erros:
+        raise FluxoInvalido(erros)
+
+    def vizinhos(no):
+        return [o.proximo for o in no.opcoes] if no.tipo == 'options' else [p for p in (no.proximo,) if p]
+
+    # Nós alcançáveis a partir do início.
+    alcancaveis = set()
+    pendentes = [inicio]
+    while pendentes:
+        no_id = pendentes.pop()
+        if no_id not in alcancaveis:
+            alcancaveis.add(no_id)
+            pendentes.extend(vizinhos(nos[no_id]))
+
+    # Nós que conseguem chegar a um fim de conversa (nó sem próximo ou ação).
+    anteriores = {no_id: [] for no_id in nos}
+    for no in nos.values():
+        for proximo in vizinhos(no):
+            anteriores[proximo].append(no.id)
+    com_saida = set()
+    pendentes = [no.id for no in nos.values() if not vizinhos(no) or no.tipo == 'action']
+    while pendentes:
+        no_id = pendentes.pop()
+        if no_id not in com_saida:
+            com_saida.add(no_id)
+            pendentes.extend(anteriores[no_id])
+
+    sem_saida = sorted(alcancaveis - com_saida)
+    if sem_saida:
+        raise FluxoInvalido([f"Ciclo sem saída envolvendo os nós: {', '.join(sem_saida)}."])
+
+    avisos = [f"Nó '{no_id}' não é alcançável a partir do início." for no_id in sorted(set(nos) - alcancaveis)]
+    versao = hashlib.sha1(
+        json.dumps([fluxo, {chave: mensagens[chave] for chave in sorted(mensagens)}], sort_keys=True).encode()
+    ).hexdigest()[:12]
+    return FluxoCompilado(inicio, nos, versao, avisos)
+
+
+def _carregar_fluxo(prefeitura_id):
+    from app.models import Configuracao, MensagemChatbot
+    config = Configuracao.query.filter_by(chave=CHAVE_FLUXO, prefeitura_id=prefeitura_id).first()
+    if not config or not config.valor:
+        return None
+    mensagens = {m.chave: m.texto for m in MensagemChatbot.query.filter_by(prefeitura_id=prefeitura_id).all()}
+    try:
+        return compilar_fluxo(json.loads(config.valor), mensagens)
+    except (json.JSONDecodeError, FluxoInvalido):
+        return None
+
+
+def obter_fluxo(prefeitura_id):
+    """ Fluxo compilado da prefeitura (do cache), ou None se não houver um fluxo válido. """
+    fluxo = _cache_fluxos.get(prefeitura_id)
+    if fluxo is None:
+        fluxo = _carregar_fluxo(prefeitura_id)
+        if fluxo is not None:
+            _cache_fluxos.set(prefeitura_id, fluxo)
+    return fluxo
+
+
+def publicar_fluxo(prefeitura_id, fluxo_compilado):
+    """ Substitui o fluxo em cache logo após salvar uma nova versão. """
+    _cache_fluxos.set(prefeitura_id, fluxo_compilado)
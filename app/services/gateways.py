@@ -0,0 +1,308 @@
+# app/services/gateways.py
+"""
+Registro dos gateways de provedores externos (vídeo, WhatsApp, assinatura).
+
+Cada provedor tem uma única instância do seu gateway por processo, criada no
+init_app e obtida com gateways.obter('video'). Com a URL do provedor
+configurada (GATEWAY_<PROVEDOR>_URL) o gateway recebe um ClienteHTTP, que:
+
+- mantém um pool de conexões keep-alive (http.client), reaproveitadas entre
+  requisições; uma conexão ociosa que o servidor fechou é refeita uma vez;
+- limita as chamadas simultâneas a GATEWAY_CONEXOES[provedor]: quem não
+  consegue conexão em GATEWAY_ESPERA_CONEXAO_SEGUNDOS recebe GatewayOcupado;
+- aplica timeout por chamada (GATEWAY_TIMEOUT_SEGUNDOS, ou o passado na chamada);
+- tem um disjuntor: após GATEWAY_FALHAS_PARA_ABRIR falhas seguidas (erro de
+  rede, timeout, 429 ou 5xx) as chamadas falham na hora com CircuitoAberto por
+  GATEWAY_CIRCUITO_ABERTO_SEGUNDOS; depois disso uma chamada de teste decide
+  se o circuito fecha ou volta a abrir;
+- registra duração e resultado de cada chamada por provedor e operação,
+  exportados junto com as demais métricas em /metrics.
+
+Sem a URL o gateway roda em modo de exemplo, sem chamadas HTTP. Para testar
+contra um servidor local (ex: um http.server que responda JSON), basta
+apontar GATEWAY_<PROVEDOR>_URL para ele.
+"""
+
+from http.client import HTTPConnection, HTTPException, HTTPSConnection, RemoteDisconnected
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from app.services.digital_signature_gateway import DigitalSignatureGateway
+from app.services.messaging_gateway import MessagingGateway
+from app.services.metricas_sql import Histograma, BUCKETS_DURACAO, _escapar_rotulo
+from app.services.video_gateway import VideoGateway
+
+PROVEDORES = {
+    'video': VideoGateway,
+    'whatsapp': MessagingGateway,
+    'assinatura': DigitalSignatureGateway,
+}
+RESULTADOS = ('sucesso', 'erro_cliente', 'falha', 'circuito_aberto', 'ocupado')
+
+
+class ErroGateway(Exception):
+    """ Falha ao chamar um provedor externo. """
+
+
+class CircuitoAberto(ErroGateway):
+    """ O provedor está degradado e as chamadas estão suspensas. """
+
+
+class GatewayOcupado(ErroGateway):
+    """ Todas as conexões com o provedor estão em uso. """
+
+
+class RespostaInvalida(ErroGateway):
+    """ O provedor respondeu com erro. Falhas do provedor (429/5xx) contam para o disjuntor. """
+
+    def __init__(self, status, corpo):
+        super().__init__(f"HTTP {status}: {corpo[:200]}")
+        self.status = status
+
+
+class Disjuntor:
+    """ Circuit breaker por contagem de falhas seguidas. """
+
+    def __init__(self, falhas_para_abrir, aberto_segundos):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.aberto_segundos = aberto_segundos
+        self.falhas = 0
+        self.aberto_ate = None
+        self._testando = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        with self._lock:
+            if self.aberto_ate is None:
+                return 'fechado'
+            return 'aberto' if time.monotonic() < self.aberto_ate else 'meio_aberto'
+
+    def permitir(self):
+        """ True se a chamada pode ir ao provedor. Meio aberto: só uma chamada de teste por vez. """
+        with self._lock:
+            if self.aberto_ate is None:
+                return True
+            if time.monotonic() < self.aberto_ate or self._testando:
+                return False
+            self._testando = True
+            return True
+
+    def sucesso(self):
+        with self._lock:
+            self.falhas = 0
+            self.aberto_ate = None
+            self._testando = False
+
+    def falha(self):
+        with self._lock:
+            self.falhas += 1
+            if self._testando or self.falhas >= self.falhas_para_abrir:
+                self.aberto_ate = time.monotonic() + self.aberto_segundos
+            self._testando = False
+
+    def liberar(self):
+        """ Chamada de teste que terminou sem dizer nada sobre o provedor (ex: erro 4xx). """
+        with self._lock:
+            self._testando = False
+
+
+class MetricasGateway:
+    def __init__(self):
+        self.duracao = Histograma(BUCKETS_DURACAO)
+        self.resultados = dict.fromkeys(RESULTADOS, 0)
+
+
+class ClienteHTTP:
+    """ Cliente JSON de um provedor, com pool keep-alive, limite de concorrência e disjuntor. """
+
+    def __init__(self, nome, url, token=None, timeout=5.0, conexoes=4, espera_conexao=1.0,
+                 falhas_para_abrir=5, aberto_segundos=30):
+        partes = urlsplit(url)
+        self.nome = nome
+        self._classe = HTTPSConnection if partes.scheme == 'https' else HTTPConnection
+        self._endereco = partes.netloc
+        self._prefixo = partes.path.rstrip('/')
+        self._cabecalhos = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if token:
+            self._cabecalhos['Authorization'] = f'Bearer {token}'
+        self.timeout = timeout
+        self.espera_conexao = espera_conexao
+        self.disjuntor = Disjuntor(falhas_para_abrir, aberto_segundos)
+        self._vagas = threading.BoundedSemaphore(conexoes)
+        self._ociosas = []
+        self._lock = threading.Lock()
+        self.metricas = {}
+
+    def requisitar(self, metodo, caminho, dados=None, operacao=None, timeout=None):
+        """
+        Faz a chamada e retorna o JSON da resposta (ou None se vier vazia).
+
+        Levanta:
+            CircuitoAberto, GatewayOcupado, RespostaInvalida ou ErroGateway (rede/timeout).
+        """
+        operacao = operacao or caminho
+        if not self.disjuntor.permitir():
+            self._registrar(operacao, 'circuito_aberto', 0.0)
+            raise CircuitoAberto(f"Provedor {self.nome} indisponível (circuito aberto).")
+        if not self._vagas.acquire(timeout=self.espera_conexao):
+            self.disjuntor.liberar()
+            self._registrar(operacao, 'ocupado', 0.0)
+            raise GatewayOcupado(f"Todas as conexões com o provedor {self.nome} estão em uso.")
+        inicio = time.perf_counter()
+        try:
+            status, corpo = self._executar(
+                metodo, self._prefixo + caminho,
+                json.dumps(dados).encode() if dados is not None else None,
+                timeout or self.timeout
+            )
+        except (OSError, HTTPException) as e:
+            # Inclui timeouts de socket, erros de conexão e respostas HTTP malformadas.
+            self.disjuntor.falha()
+            self._registrar(operacao, 'falha', time.perf_counter() - inicio)
+            raise ErroGateway(f"Falha ao chamar o provedor {self.nome}: {type(e).__name__}: {e}") from e
+        except BaseException:
+            # Erro que não diz nada sobre o provedor (ex: dados que não viram JSON):
+            # libera a chamada de teste para o disjuntor não ficar preso meio aberto.
+            self.disjuntor.liberar()
+            raise
+        finally:
+            self._vagas.release()
+        duracao = time.perf_counter() - inicio
+        if status == 429 or status >= 500:
+            self.disjuntor.falha()
+            self._registrar(operacao, 'falha', duracao)
+            raise RespostaInvalida(status, corpo.decode(errors='replace'))
+        if status >= 400:
+            self.disjuntor.liberar()
+            self._registrar(operacao, 'erro_cliente', duracao)
+            raise RespostaInvalida(status, corpo.decode(errors='replace'))
+        self.disjuntor.sucesso()
+        self._registrar(operacao, 'sucesso', duracao)
+        try:
+            return json.loads(corpo) if corpo else None
+        except ValueError as e:
+            raise ErroGateway(f"Resposta inválida do provedor {self.nome}: {e}") from e
+
+    def _executar(self, metodo, caminho, corpo, timeout):
+        conexao, reaproveitada = self._pegar_conexao(timeout)
+        try:
+            try:
+                return self._enviar(conexao, metodo, caminho, corpo)
+            except (RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if not reaproveitada:
+                    raise
+                # O servidor fechou a conexão ociosa: tenta uma vez com uma conexão nova.
+                conexao.close()
+                conexao = self._classe(self._endereco, timeout=timeout)
+                return self._enviar(conexao, metodo, caminho, corpo)
+        except BaseException:
+            conexao.close()
+            raise
+        finally:
+            if conexao.sock is not None:
+                with self._lock:
+                    self._ociosas.append(conexao)
+
+    def _enviar(self, conexao, metodo, caminho, corpo):
+        conexao.request(metodo, caminho, body=corpo, headers=self._cabecalhos)
+        resposta = conexao.getresponse()
+        conteudo = resposta.read()
+        if resposta.will_close:
+            conexao.close()
+        return resposta.status, conteudo
+
+    def _pegar_conexao(self, timeout):
+        with self._lock:
+            conexao = self._ociosas.pop() if self._ociosas else None
+        if conexao is None:
+            return self._classe(self._endereco, timeout=timeout), False
+        conexao.timeout = timeout
+        conexao.sock.settimeout(timeout)
+        return conexao, True
+
+    def _registrar(self, operacao, resultado, duracao):
+        with self._lock:
+            metricas = self.metricas.get(operacao)
+            if metricas is None:
+                metricas = self.metricas[operacao] = MetricasGateway()
+            metricas.resultados[resultado] += 1
+            if resultado not in ('circuito_aberto', 'ocupado'):
+                metricas.duracao.observar(duracao)
+
+    def fechar(self):
+        with self._lock:
+            ociosas, self._ociosas = self._ociosas, []
+        for conexao in ociosas:
+            conexao.close()
+
+
+class RegistroGateways:
+    def __init__(self, app=None):
+        self.app = None
+        self._gateways = {}
+        self._clientes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        conexoes = app.config.get('GATEWAY_CONEXOES', {})
+        self._gateways, self._clientes = {}, {}
+        for nome, classe in PROVEDORES.items():
+            chave = nome.upper()
+            url = app.config.get(f'GATEWAY_{chave}_URL')
+            cliente = None
+            if url:
+                cliente = self._clientes[nome] = ClienteHTTP(
+                    nome, url,
+                    token=app.config.get(f'GATEWAY_{chave}_TOKEN'),
+                    timeout=app.config.get('GATEWAY_TIMEOUT_SEGUNDOS', 5.0),
+                    conexoes=conexoes.get(nome, 4),
+                    espera_conexao=app.config.get('GATEWAY_ESPERA_CONEXAO_SEGUNDOS', 1.0),
+                    falhas_para_abrir=app.config.get('GATEWAY_FALHAS_PARA_ABRIR', 5),
+                    aberto_segundos=app.config.get('GATEWAY_CIRCUITO_ABERTO_SEGUNDOS', 30),
+                )
+            self._gateways[nome] = classe(app.config, cliente=cliente)
+        app.extensions['gateways'] = self
+        metricas = app.extensions.get('metricas_sql')
+        if metricas is not None:
+            metricas.exportadores.append(self.exportar)
+
+    def obter(self, nome):
+        """ Gateway do provedor ('video', 'whatsapp' ou 'assinatura'), compartilhado pelo processo. """
+        return self._gateways[nome]
+
+    def exportar(self):
+        """ Métricas das chamadas aos provedores no formato texto do Prometheus. """
+        linhas = [
+            '# HELP gateway_chamada_duracao_segundos Duração das chamadas aos provedores externos.',
+            '# TYPE gateway_chamada_duracao_segundos histogram',
+        ]
+        contagens = [
+            '# HELP gateway_chamadas_total Chamadas aos provedores externos por resultado.',
+            '# TYPE gateway_chamadas_total counter',
+        ]
+        circuitos = [
+            '# HELP gateway_circuito_aberto 1 se o disjuntor do provedor está aberto ou em teste.',
+            '# TYPE gateway_circuito_aberto gauge',
+        ]
+        for nome, cliente in sorted(self._clientes.items()):
+            with cliente._lock:
+                operacoes = sorted(cliente.metricas.items())
+                for operacao, metricas in operacoes:
+                    rotulos = f'provedor="{nome}",operacao="{_escapar_rotulo(operacao)}"'
+                    linhas.extend(metricas.duracao.linhas('gateway_chamada_duracao_segundos', rotulos))
+                    for resultado, total in metricas.resultados.items():
+                        contagens.append(f'gateway_chamadas_total{{{rotulos},resultado="{resultado}"}} {total}')
+            circuitos.append(f'gateway_circuito_aberto{{provedor="{nome}"}} {int(cliente.disjuntor.estado != "fechado")}')
+        return '\n'.join(linhas + contagens + circuitos) + '\n'
+
+    def fechar(self):
+        for cliente in self._clientes.values():
+            cliente.fechar()
+
+
+gateways = RegistroGateways()
@@ -0,0 +1,101 @@
+# app/services/historico_paciente.py
+"""
+Linha do tempo do Portal do Paciente: atendimentos e acessos ao prontuário.
+
+As duas seções são paginadas por keyset, do mais recente para o mais antigo:
+(data_inicio, id) para Consulta e (timestamp, id) para LogAcessoPaciente,
+ambas servidas por índices compostos que começam por paciente_id. Cada página
+é um único SELECT com JOIN no profissional, sem carregar objetos do ORM.
+
+O resumo do paciente (totais e a primeira página de cada seção, que é o que
+quase toda visita ao portal mostra) fica em cache por paciente e é invalidado
+quando Consulta ou LogAcessoPaciente do paciente são gravados.
+"""
+
+from collections import namedtuple
+import datetime
+
+from sqlalchemy import and_, event, func, or_, select
+
+from app.cache import CacheTTL
+from app.extensions import db
+from app.models import Consulta, LogAcessoPaciente, Usuario
+
+ITENS_POR_PAGINA = 10
+
+ItemConsulta = namedtuple('ItemConsulta', ['id', 'tipo', 'data_inicio', 'resumo_atendimento', 'profissional_nome'])
+ItemAcesso = namedtuple('ItemAcesso', ['id', 'timestamp', 'acao', 'usuario_nome'])
+Pagina = namedtuple('Pagina', ['itens', 'proximo_cursor'])
+Resumo = namedtuple('Resumo', ['total_consultas', 'total_acessos', 'consultas', 'acessos'])
+
+_resumos = CacheTTL(ttl_segundos=120)
+
+
+def _cursor(data, id_):
+    return f'{data.isoformat()}_{id_}'
+
+
+def _antes_do_cursor(cursor, coluna_data, coluna_id):
+    """ Condição de keyset: registros anteriores a (data, id) do cursor. """
+    data_cursor_str, id_cursor_str = cursor.rsplit('_', 1)
+    data_cursor = datetime.datetime.fromisoformat(data_cursor_str)
+    id_cursor = int(id_cursor_str)
+    return or_(coluna_data < data_cursor, and_(coluna_data == data_cursor, coluna_id < id_cursor))
+
+
+def _paginar(query, cursor, coluna_data, coluna_id, fabrica, campo_data):
+    if cursor:
+        query = query.where(_antes_do_cursor(cursor, coluna_data, coluna_id))
+    linhas = db.session.execute(
+        query.order_by(coluna_data.desc(), coluna_id.desc()).limit(ITENS_POR_PAGINA + 1)
+    ).all()
+    itens = [fabrica(*linha) for linha in linhas[:ITENS_POR_PAGINA]]
+    proximo = None
+    if len(linhas) > ITENS_POR_PAGINA:
+        ultimo = itens[-1]
+        proximo = _cursor(getattr(ultimo, campo_data), ultimo.id)
+    return Pagina(itens, proximo)
+
+
+def consultas(paciente_id, cursor=None):
+    """ Página de atendimentos do paciente, anteriores ao cursor. """
+    query = select(
+        Consulta.id, Consulta.tipo, Consulta.data_inicio, Consulta.resumo_atendimento, Usuario.nome_completo
+    ).join(Usuario, Consulta.profissional_id == Usuario.id).where(Consulta.paciente_id == paciente_id)
+    return _paginar(query, cursor, Consulta.data_inicio, Consulta.id, ItemConsulta, 'data_inicio')
+
+
+def acessos(paciente_id, cursor=None):
+    """ Página de acessos ao prontuário do paciente, anteriores ao cursor. """
+    query = select(
+        LogAcessoPaciente.id, LogAcessoPaciente.timestamp, LogAcessoPaciente.acao, Usuario.nome_completo
+    ).join(Usuario, LogAcessoPaciente.usuario_id == Usuario.id).where(LogAcessoPaciente.paciente_id == paciente_id)
+    return _paginar(query, cursor, LogAcessoPaciente.timestamp, LogAcessoPaciente.id, ItemAcesso, 'timestamp')
+
+
+def resumo(paciente_id):
+    def montar():
+        return Resumo(
+            total_consultas=db.session.scalar(
+                select(func.count(Consulta.id)).where(Consulta.paciente_id == paciente_id)
+            ),
+            total_acessos=db.session.scalar(
+                select(func.count(LogAcessoPaciente.id)).where(LogAcessoPaciente.paciente_id == paciente_id)
+            ),
+            consultas=consultas(paciente_id),
+            acessos=acessos(paciente_id),
+        )
+    return _resumos.get_or_set(paciente_id, montar)
+
+
+def invalidar_resumo(paciente_id):
+    _resumos.invalidar(paciente_id)
+
+
+@event.listens_for(Consulta, 'after_insert')
+@event.listens_for(Consulta, 'after_update')
+@event.listens_for(Consulta, 'after_delete')
+@event.listens_for(LogAcessoPaciente, 'after_insert')
+@event.listens_for(LogAcessoPaciente, 'after_delete')
+def _invalidar_ao_gravar(mapper, connection, target):
+    invalidar_resumo(target.paciente_id)
@@ -0,0 +1,210 @@
+# app/services/horario_funcionamento.py
+"""
+Horário de funcionamento compilado por prefeitura.
+
+As chaves de Configuracao são interpretadas uma única vez e transformadas em
+intervalos (minutos desde a meia-noite) ordenados por dia da semana. Responder
+"está aberto agora?" passa a ser uma busca binária em memória, sem consulta
+ao banco. O resultado fica em cache por prefeitura e é invalidado quando as
+configurações são salvas.
+
+Chaves suportadas:
+    HORARIO_INICIO / HORARIO_FIM  turno único, ex: 08:00 e 18:00
+    TURNOS                        vários turnos no dia (substitui o turno único),
+                                  ex: 07:00-12:00,13:00-19:00
+    DIAS_FUNCIONAMENTO            ex: Segunda,Terça,Quarta,Quinta,Sexta
+    FERIADOS                      DD/MM (todo ano) ou DD/MM/AAAA, ex: 25/12,20/11/2026
+    EXCECOES_HORARIO              horário especial em uma data, que vale mesmo em
+                                  feriados ou dias sem expediente,
+                                  ex: 24/12=08:00-12:00;31/12/2026=08:00-11:00
+                                  (use "fechado" para fechar o dia inteiro)
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+import unicodedata
+
+import pytz
+
+from app.cache import CacheTTL
+
+FUSO_HORARIO = pytz.timezone('America/Sao_Paulo')
+DIAS_DA_SEMANA = ["segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo"]
+SEM_TURNOS = ((), ())
+CHAVES_HORARIO = ('HORARIO_INICIO', 'HORARIO_FIM', 'TURNOS', 'DIAS_FUNCIONAMENTO', 'FERIADOS', 'EXCECOES_HORARIO')
+
+# Outros workers enxergam uma alteração de horário em no máximo este intervalo.
+_cache_horarios = CacheTTL(ttl_segundos=300)
+
+
+def _sem_acentos(texto):
+    normalizado = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in normalizado if not unicodedata.combining(c)).strip().lower()
+
+
+def _minutos(hora_str):
+    hora = datetime.strptime(hora_str.strip(), '%H:%M').time()
+    return hora.hour * 60 + hora.minute
+
+
+def _compilar_turnos(turnos_str):
+    """ '07:00-12:00,13:00-19:00' -> ((420, 780), (720, 1140)) """
+    if _sem_acentos(turnos_str) == 'fechado':
+        return SEM_TURNOS
+    turnos = []
+    for turno in turnos_str.split(','):
+        if not turno.strip():
+            continue
+        inicio_str, fim_str = turno.split('-')
+        inicio, fim = _minutos(inicio_str), _minutos(fim_str)
+        if fim <= inicio:
+            raise ValueError(f"Turno inválido: {turno.strip()}")
+        turnos.append((inicio, fim))
+    turnos.sort()
+    for (_, fim_anterior), (inicio, _) in zip(turnos, turnos[1:]):
+        if inicio < fim_anterior:
+            raise ValueError(f"Turnos sobrepostos em: {turnos_str}")
+    # Inícios e fins em tuplas separadas para a busca binária.
+    return (tuple(inicio for inicio, _ in turnos), tuple(fim for _, fim in turnos))
+
+
+def _compilar_data(data_str):
+    """ 'DD/MM' -> (mes, dia) para datas anuais; 'DD/MM/AAAA' -> date. """
+    partes = data_str.strip().split('/')
+    if len(partes) == 2:
+        dia, mes = int(partes[0]), int(partes[1])
+        datetime(2000, mes, dia)  # valida (2000 é bissexto, aceita 29/02)
+        return (mes, dia)
+    return datetime.strptime(data_str.strip(), '%d/%m/%Y').date()
+
+
+class HorarioFuncionamento:
+    """
+    Representação compilada e imutável do horário de uma prefeitura.
+    """
+    def __init__(self, turnos_por_dia, feriados, excecoes):
+        self._turnos_por_dia = turnos_por_dia  # 7 pares (inicios, fins), ordenados
+        self._feriados = feriados              # set de date e (mes, dia)
+        self._excecoes = excecoes              # dict date|(mes, dia) -> (inicios, fins)
+
+    @classmethod
+    def compilar(cls, configs):
+        """
+        Cria o horário a partir de um dict {chave: valor} de Configuracao.
+        Lança ValueError se algum valor estiver em formato inválido.
+        """
+        if configs.get('TURNOS', '').strip():
+            turnos = _compilar_turnos(configs['TURNOS'])
+        else:
+            turnos = _compilar_turnos(f"{configs.get('HORARIO_INICIO', '08:00')}-{configs.get('HORARIO_FIM', '18:00')}")
+
+        dias_str = configs.get('DIAS_FUNCIONAMENTO', 'segunda,terca,quarta,quinta,sexta')
+        dias_permitidos = {_sem_acentos(dia) for dia in dias_str.split(',') if dia.strip()}
+        desconhecidos = dias_permitidos - set(DIAS_DA_SEMANA)
+        if desconhecidos:
+            raise ValueError(f"Dia(s) de funcionamento desconhecido(s): {', '.join(sorted(desconhecidos))}")
+        turnos_por_dia = tuple(turnos if dia in dias_permitidos else SEM_TURNOS for dia in DIAS_DA_SEMANA)
+
+        feriados = {
+            _compilar_data(data) for data in configs.get('FERIADOS', '').split(',') if data.strip()
+        }
+
+        excecoes = {}
+        for excecao in configs.get('EXCECOES_HORARIO', '').split(';'):
+            if not excecao.strip():
+                continue
+            data_str, turnos_str = excecao.split('=', 1)
+            excecoes[_compilar_data(data_str)] = _compilar_turnos(turnos_str)
+
+        return cls(turnos_por_dia, feriados, excecoes)
+
+    def _turnos_da_data(self, data):
+        """ Retorna (turnos, motivo_fechado) válidos para a data. """
+        for chave in (data, (data.month, data.day)):
+            if chave in self._excecoes:
+                return self._excecoes[chave], "FECHADO (Horário especial)"
+        if data in self._feriados or (data.month, data.day) in self._feriados:
+            return SEM_TURNOS, "FECHADO (Feriado)"
+        turnos = self._turnos_por_dia[data.weekday()]
+        if not turnos[0]:
+            return SEM_TURNOS, "FECHADO (Fora do dia de funcionamento)"
+        return turnos, "FECHADO (Fora do horário de expediente)"
+
+    def status(self, momento=None):
+        """
+        Retorna:
+            Uma tupla (bool, str) indicando (status_aberto, mensagem).
+        """
+        momento = momento or datetime.now(FUSO_HORARIO)
+        (inicios, fins), motivo_fechado = self._turnos_da_data(momento.date())
+        minuto = momento.hour * 60 + momento.minute
+        posicao = bisect_right(inicios, minuto) - 1
+        if posicao >= 0 and minuto < fins[posicao]:
+            return (True, "ABERTO")
+        return (False, motivo_fechado)
+
+    def esta_aberto(self, momento=None):
+        return self.status(momento)[0]
+
+    def turnos(self, data):
+        """ Turnos da data como lista de (inicio, fim) em minutos desde a meia-noite. """
+        (inicios, fins), _ = self._turnos_da_data(data)
+        return list(zip(inicios, fins))
+
+    def proxima_abertura(self, momento=None, dias_max=366):
+        """
+        Próximo instante (no fuso de Brasília) em que o serviço abre, ou o
+        próprio momento se já estiver aberto. None se não abrir em dias_max dias.
+        """
+        momento = momento or datetime.now(FUSO_HORARIO)
+        if momento.tzinfo is None:
+            momento = FUSO_HORARIO.localize(momento)
+        if self.esta_aberto(momento):
+            return momento
+        minuto = momento.hour * 60 + momento.minute
+        data = momento.date()
+        for deslocamento in range(dias_max):
+            dia = data + timedelta(days=deslocamento)
+            (inicios, _), _ = self._turnos_da_data(dia)
+            posicao = bisect_right(inicios, minuto) if deslocamento == 0 else 0
+            if posicao < len(inicios):
+                inicio = inicios[posicao]
+                ingenuo = datetime.combine(dia, datetime.min.time()) + timedelta(minutes=inicio)
+                return FUSO_HORARIO.localize(ingenuo)
+        return None
+
+
+class HorarioInvalido:
+    """ Usado quando as configurações salvas não puderam ser compiladas. """
+    def status(self, momento=None):
+        return (False, "ERRO (Formato de hora inválido nas configurações)")
+
+    def esta_aberto(self, momento=None):
+        return False
+
+    def turnos(self, data):
+        return []
+
+    def proxima_abertura(self, momento=None, dias_max=366):
+        return None
+
+
+def _carregar_horario(prefeitura_id):
+    from app.models import Configuracao
+    configs_query = Configuracao.query.filter(
+        Configuracao.prefeitura_id == prefeitura_id,
+        Configuracao.chave.in_(CHAVES_HORARIO)
+    ).all()
+    try:
+        return HorarioFuncionamento.compilar({c.chave: c.valor for c in configs_query})
+    except ValueError:
+        return HorarioInvalido()
+
+
+def obter_horario(prefeitura_id):
+    """ Horário compilado da prefeitura, vindo do cache sempre que possível. """
+    return _cache_horarios.get_or_set(prefeitura_id, lambda: _carregar_horario(prefeitura_id))
+
+
+def invalidar_horario(prefeitura_id):
+    _cache_horarios.invalidar(prefeitura_id)
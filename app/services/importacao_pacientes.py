@@ -0,0 +1,186 @@
+# app/services/importacao_pacientes.py
+
+import csv
+import io
+import re
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from app.extensions import db
+from app.models import Paciente
+from app.services.versao_painel import marcar_alteracao
+
+CAMPOS_OBRIGATORIOS = ('nome_completo', 'cpf', 'telefone_whatsapp')
+TAMANHO_LOTE_PADRAO = 1000
+# Limite de erros detalhados guardados no relatório (os totais são sempre contados).
+LIMITE_ERROS_DETALHADOS = 500
+# Pacientes importados não aguardam em nenhuma fila: entram nela pelo chatbot
+# (JOIN_QUEUE). Sem isso ficariam com o status padrão AGUARDANDO_ACOLHIMENTO
+# sem ter uma EntradaFila.
+STATUS_IMPORTADO = 'CADASTRADO'
+
+
+class RelatorioImportacao:
+    """
+    Resultado de uma importação: totais e a lista de erros por linha.
+    """
+    def __init__(self):
+        self.linhas_lidas = 0
+        self.importados = 0
+        self.total_erros = 0
+        self.erros = []
+
+    def registrar_erro(self, linha, cpf, motivo):
+        self.total_erros += 1
+        if len(self.erros) < LIMITE_ERROS_DETALHADOS:
+            self.erros.append({'linha': linha, 'cpf': cpf, 'motivo': motivo})
+
+    @property
+    def erros_omitidos(self):
+        return self.total_erros - len(self.erros)
+
+
+def importar_pacientes_csv(arquivo_binario, prefeitura_id, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Importa pacientes de um CSV lendo o arquivo de forma incremental.
+
+    As linhas são processadas em lotes: para cada lote, os CPFs e telefones já
+    cadastrados são buscados em uma única consulta, os novos pacientes são
+    gravados com um INSERT de várias linhas e o lote é confirmado (commit).
+    Linhas inválidas entram no relatório em vez de abortar o arquivo inteiro.
+
+    Retorna:
+        Um RelatorioImportacao.
+    """
+    relatorio = RelatorioImportacao()
+    # 'utf-8-sig' aceita arquivos exportados pelo Excel (com BOM).
+    stream = io.TextIOWrapper(arquivo_binario, encoding='utf-8-sig', newline='')
+    leitor = csv.DictReader(stream)
+
+    lote = []
+    # A linha 1 é o cabeçalho, então os dados começam na linha 2.
+    for numero_linha, row in enumerate(leitor, start=2):
+        relatorio.linhas_lidas += 1
+        lote.append((numero_linha, row))
+        if len(lote) >= tamanho_lote:
+            _processar_lote(lote, prefeitura_id, relatorio)
+            lote = []
+    if lote:
+        _processar_lote(lote, prefeitura_id, relatorio)
+
+    stream.detach()
+    return relatorio
+
+
+def _somente_digitos(valor):
+    return re.sub(r'\D', '', valor or '')
+
+
+def _normalizar_linha(row):
+    # CPF e CNS aceitam a forma formatada (123.456.789-01) e são gravados só com os dígitos.
+    return {
+        'nome_completo': (row.get('nome_completo') or '').strip(),
+        'cpf': _somente_digitos(row.get('cpf')),
+        'cns': _somente_digitos(row.get('cns')) or None,
+        'telefone_whatsapp': (row.get('telefone_whatsapp') or '').strip(),
+    }
+
+
+def _problemas_de_formato(dados):
+    """ Valores que não cabem nas colunas de Paciente. """
+    problemas = []
+    if len(dados['cpf']) != 11:
+        problemas.append('CPF deve ter 11 dígitos')
+    if dados['cns'] and len(dados['cns']) != 15:
+        problemas.append('CNS deve ter 15 dígitos')
+    if len(dados['nome_completo']) > Paciente.nome_completo.type.length:
+        problemas.append(f'Nome com mais de {Paciente.nome_completo.type.length} caracteres')
+    if len(dados['telefone_whatsapp']) > Paciente.telefone_whatsapp.type.length:
+        problemas.append(f'Telefone WhatsApp com mais de {Paciente.telefone_whatsapp.type.length} caracteres')
+    return problemas
+
+
+def _processar_lote(lote, prefeitura_id, relatorio):
+    candidatos = []
+    for numero_linha, row in lote:
+        dados = _normalizar_linha(row)
+        faltando = [campo for campo in CAMPOS_OBRIGATORIOS if not dados[campo]]
+        if faltando:
+            relatorio.registrar_erro(numero_linha, dados['cpf'], f"Campos obrigatórios ausentes: {', '.join(faltando)}")
+            continue
+        problemas = _problemas_de_formato(dados)
+        if problemas:
+            relatorio.registrar_erro(numero_linha, dados['cpf'], '; '.join(problemas))
+            continue
+        candidatos.append((numero_linha, dados))
+
+    if not candidatos:
+        return
+
+    cpfs_existentes = set(db.session.scalars(
+        select(Paciente.cpf).where(
+            Paciente.prefeitura_id == prefeitura_id,
+            Paciente.cpf.in_({dados['cpf'] for _, dados in candidatos})
+        )
+    ))
+    telefones_existentes = set(db.session.scalars(
+        select(Paciente.telefone_whatsapp).where(
+            Paciente.prefeitura_id == prefeitura_id,
+            Paciente.telefone_whatsapp.in_({dados['telefone_whatsapp'] for _, dados in candidatos})
+        )
+    ))
+
+    novos = []
+    for numero_linha, dados in candidatos:
+        if dados['cpf'] in cpfs_existentes:
+            relatorio.registrar_erro(numero_linha, dados['cpf'], 'CPF já cadastrado')
+            continue
+        if dados['telefone_whatsapp'] in telefones_existentes:
+            relatorio.registrar_erro(numero_linha, dados['cpf'], 'Telefone WhatsApp já cadastrado para outro paciente')
+            continue
+        # Marca como usados para detectar duplicidades dentro do próprio arquivo.
+        cpfs_existentes.add(dados['cpf'])
+        telefones_existentes.add(dados['telefone_whatsapp'])
+        dados['prefeitura_id'] = prefeitura_id
+        dados['status'] = STATUS_IMPORTADO
+        novos.append((numero_linha, dados))
+
+    if not novos:
+        return
+
+    try:
+        db.session.execute(insert(Paciente), [dados for _, dados in novos])
+        # INSERT direto: não passa pelo flush que atualiza a versão do painel.
+        marcar_alteracao(db.session, prefeitura_id)
+        db.session.commit()
+        relatorio.importados += len(novos)
+    except DBAPIError:
+        # Algum registro concorrente entrou entre a verificação e o INSERT (ou o
+        # banco recusou um valor): refaz o lote linha a linha para identificar
+        # exatamente quais falharam.
+        db.session.rollback()
+        _inserir_individualmente(novos, prefeitura_id, relatorio)
+
+
+def _inserir_individualmente(novos, prefeitura_id, relatorio):
+    for numero_linha, dados in novos:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Paciente), [dados])
+            relatorio.importados += 1
+        except IntegrityError as e:
+            relatorio.registrar_erro(numero_linha, dados['cpf'], _motivo_integrity_error(e))
+        except DBAPIError as e:
+            relatorio.registrar_erro(numero_linha, dados['cpf'], f'Valor recusado pelo banco: {e.orig}')
+    marcar_alteracao(db.session, prefeitura_id)
+    db.session.commit()
+
+
+def _motivo_integrity_error(erro):
+    mensagem = str(erro.orig)
+    if '_telefone_prefeitura_uc' in mensagem or 'telefone_whatsapp' in mensagem:
+        return 'Telefone WhatsApp já cadastrado para outro paciente'
+    if '_cpf_prefeitura_uc' in mensagem or 'cpf' in mensagem:
+        return 'CPF já cadastrado'
+    return f'Erro de integridade: {mensagem}'
@@ -0,0 +1,103 @@
+# app/services/magic_links.py
+"""
+Links mágicos de acesso ao Portal do Paciente.
+
+Na tabela de links só fica o SHA-256 do token (MagicLink.token_hash). O token
+em texto puro só existe na mensagem que leva o link ao paciente: ela fica na
+outbox (MensagemOutbox.conteudo) até ser enviada ou desistida, o que acontece
+no máximo quando o link expira, e então o conteúdo é apagado. Fora dessa
+janela, quem tiver acesso ao banco não consegue montar um link válido.
+
+A validação é um único UPDATE que
+marca o link como usado se ele ainda não foi usado e não expirou, então dois
+cliques simultâneos no mesmo link não abrem duas sessões.
+
+A busca usa um índice parcial sobre os links ainda não usados, que continua
+pequeno independentemente de quantos links já foram emitidos. Links vencidos
+são apagados por `flask purgar-magic-links` (agendar no cron).
+"""
+
+import datetime
+import hashlib
+import secrets
+
+from flask import current_app
+from sqlalchemy import delete, select, update
+
+from app.extensions import db
+from app.models import MagicLink
+
+
+def _hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def emitir_link(paciente_id, prefeitura_id):
+    """
+    Cria um link na sessão atual (o commit fica com quem chama).
+
+    Retorna:
+        Uma tupla (token, expira_em): o token em texto puro, para montar a URL
+        enviada ao paciente, e a validade do link (UTC). Só o hash do token vai
+        para MagicLink; a mensagem com a URL deve ser enfileirada com
+        expira_em, para não ficar na outbox (nem ser enviada) depois disso.
+    """
+    token = secrets.token_urlsafe(32)
+    validade = current_app.config.get('MAGIC_LINK_VALIDADE_MINUTOS', 15)
+    expira_em = datetime.datetime.utcnow() + datetime.timedelta(minutes=validade)
+    db.session.add(MagicLink(
+        token_hash=_hash_token(token),
+        paciente_id=paciente_id,
+        prefeitura_id=prefeitura_id,
+        expira_em=expira_em
+    ))
+    return token, expira_em
+
+
+def consumir_link(token):
+    """
+    Marca o link como usado, se ele for válido, e confirma a transação.
+
+    Retorna:
+        Uma tupla (paciente_id, prefeitura_id), ou None se o link não existe,
+        já foi usado ou expirou.
+    """
+    condicao = (
+        MagicLink.token_hash == _hash_token(token),
+        # `NOT usado` (`usado = 0` no SQLite): a mesma expressão do índice
+        # parcial, para o planner usá-lo. `IS false` não casa com ele.
+        ~MagicLink.usado,
+        MagicLink.expira_em > datetime.datetime.utcnow(),
+    )
+    if db.engine.dialect.update_returning:
+        linha = db.session.execute(
+            update(MagicLink).where(*condicao).values(usado=True)
+            .returning(MagicLink.paciente_id, MagicLink.prefeitura_id)
+        ).first()
+    else:
+        linha = db.session.execute(
+            select(MagicLink.id, MagicLink.paciente_id, MagicLink.prefeitura_id).where(*condicao)
+        ).first()
+        if linha is not None:
+            # Só quem conseguir mudar a linha de não usado para usado leva o acesso.
+            resultado = db.session.execute(
+                update(MagicLink).where(MagicLink.id == linha.id, ~MagicLink.usado).values(usado=True)
+            )
+            if resultado.rowcount != 1:
+                linha = None
+    db.session.commit()
+    return (linha.paciente_id, linha.prefeitura_id) if linha is not None else None
+
+
+def purgar_links(antes=None):
+    """
+    Apaga os links que expiraram antes de `antes` (padrão: agora). Como todo
+    link expira em poucos minutos, isso inclui também os já usados.
+
+    Retorna:
+        O número de links apagados.
+    """
+    antes = antes or datetime.datetime.utcnow()
+    resultado = db.session.execute(delete(MagicLink).where(MagicLink.expira_em < antes))
+    db.session.commit()
+    return resultado.rowcount
@@ -1,20 +1,48 @@
 # app/services/messaging_gateway.py
 
+import time
+
 class MessagingGateway:
     """
     Interface para o provedor de serviços de mensageria (ex: WhatsApp).
+    Uma instância por processo, obtida de gateways.obter('whatsapp') (app/services/gateways.py).
     """
-    def __init__(self, app_config):
+    def __init__(self, app_config, cliente=None):
         self.config = app_config
-        # Ex: self.auth_token = app_config.get('TWILIO_AUTH_TOKEN')
-        print("Gateway de Mensageria Inicializado.")
+        # ClienteHTTP do provedor; None enquanto GATEWAY_WHATSAPP_URL não estiver configurada.
+        self.cliente = cliente
 
     def enviar_mensagem(self, telefone_destino, mensagem):
         """
         Envia uma mensagem de texto para o destinatário.
         """
+        if self.cliente is not None:
+            resposta = self.cliente.requisitar(
+                'POST', '/mensagens', {'destino': telefone_destino, 'texto': mensagem}, operacao='enviar_mensagem'
+            )
+            return {'status': 'sucesso', 'id_mensagem': resposta['id_mensagem']}
         # --- CORREÇÃO: Removidas as aspas simples ao redor de {mensagem} ---
         print(f"Enviando mensagem para {telefone_destino}: {mensagem}")
         # ------------------------------------------------------------------
         # A lógica de integração com a API de WhatsApp virá aqui.
-        return {'status': 'sucesso', 'id_mensagem': 'msg_exemplo_abcde'}
\ No newline at end of file
+        return {'status': 'sucesso', 'id_mensagem': 'msg_exemplo_abcde'}
+
+class FakeMessagingGateway:
+    """
+    Provedor local para desenvolvimento e testes: não envia nada, apenas
+    guarda as mensagens. Pode simular falhas e lentidão do provedor real.
+    """
+    def __init__(self, app_config, falhas_restantes=0, atraso_segundos=0):
+        self.config = app_config
+        self.enviadas = []
+        self.falhas_restantes = falhas_restantes
+        self.atraso_segundos = atraso_segundos
+
+    def enviar_mensagem(self, telefone_destino, mensagem):
+        if self.atraso_segundos:
+            time.sleep(self.atraso_segundos)
+        if self.falhas_restantes > 0:
+            self.falhas_restantes -= 1
+            raise ConnectionError("Falha simulada do provedor de mensageria.")
+        self.enviadas.append((telefone_destino, mensagem))
+        return {'status': 'sucesso', 'id_mensagem': f'fake_{len(self.enviadas)}'}
@@ -0,0 +1,256 @@
+# app/services/metricas_sql.py
+"""
+Instrumentação das consultas SQL por requisição.
+
+Listeners de engine do SQLAlchemy (before/after_cursor_execute) contam cada
+statement executado durante uma requisição e medem o tempo gasto no banco.
+Ao final da requisição os números entram em histogramas por endpoint
+(duração, número de consultas e tempo de banco), expostos em /metrics no
+formato texto do Prometheus.
+
+Um mesmo statement (o SQL parametrizado, sem os valores) executado
+METRICAS_LIMITE_N_MAIS_1 vezes ou mais na mesma requisição é o padrão de
+N+1 (ex: acessar um relacionamento dentro de um loop no template): a
+requisição é registrada no log com o statement suspeito e o contador
+sql_n_mais_1_suspeitas_total do endpoint é incrementado. Os statements
+mais lentos de cada endpoint ficam em /metrics/sql-lentas.
+
+As métricas são por processo: com vários workers, cada um expõe as suas e o
+Prometheus deve coletar todos. Em modo debug (ou com
+METRICAS_CABECALHO_SQL), cada resposta leva o cabeçalho X-SQL-Consultas.
+
+/metrics e /metrics/sql-lentas exigem "Authorization: Bearer <METRICAS_TOKEN>";
+sem METRICAS_TOKEN definido eles respondem 404.
+"""
+
+import heapq
+import hmac
+import threading
+import time
+
+from flask import Response, abort, current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+TAMANHO_MAXIMO_STATEMENT = 500
+
+
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+        self.soma += valor
+        self.total += 1
+
+    def linhas(self, nome, rotulos):
+        for limite, contagem in zip(self.buckets, self.contagens):
+            yield f'{nome}_bucket{{{rotulos},le="{limite}"}} {contagem}'
+        yield f'{nome}_bucket{{{rotulos},le="+Inf"}} {self.total}'
+        yield f'{nome}_sum{{{rotulos}}} {self.soma:.6f}'
+        yield f'{nome}_count{{{rotulos}}} {self.total}'
+
+
+class MetricasEndpoint:
+    def __init__(self):
+        self.duracao = Histograma(BUCKETS_DURACAO)
+        self.consultas = Histograma(BUCKETS_CONSULTAS)
+        self.tempo_banco = Histograma(BUCKETS_DURACAO)
+        self.n_mais_1 = 0
+        # Heap mínimo (tempo, statement) com os statements mais lentos.
+        self.lentas = []
+
+
+class _Requisicao:
+    """ Consultas da requisição em andamento (guardado em flask.g). """
+    __slots__ = ('inicio', 'consultas', 'tempo_banco', 'statements')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_banco = 0.0
+        self.statements = {}  # statement -> [execuções, tempo total, tempo máximo]
+
+
+def _escapar_rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+class MetricasSQL:
+    def __init__(self, app=None):
+        self.app = None
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self._listeners_registrados = False
+        # Funções de outras extensões que devolvem mais métricas para /metrics (ex: gateways).
+        self.exportadores = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.habilitado = app.config.get('METRICAS_HABILITADAS', True)
+        self.limite_n_mais_1 = app.config.get('METRICAS_LIMITE_N_MAIS_1', 5)
+        self.total_lentas = app.config.get('METRICAS_TOTAL_SQL_LENTAS', 5)
+        self.cabecalho = app.config.get('METRICAS_CABECALHO_SQL', False) or app.debug
+        app.extensions['metricas_sql'] = self
+        if not self.habilitado:
+            return
+        if not self._listeners_registrados:
+            # Na classe Engine: vale para todos os engines (inclusive binds extras).
+            event.listen(Engine, 'before_cursor_execute', self._antes_de_executar)
+            event.listen(Engine, 'after_cursor_execute', self._depois_de_executar)
+            self._listeners_registrados = True
+        app.before_request(self._iniciar_requisicao)
+        app.after_request(self._finalizar_resposta)
+        app.teardown_request(self._encerrar_requisicao)
+        app.add_url_rule('/metrics', 'metricas', self._view_metricas)
+        app.add_url_rule('/metrics/sql-lentas', 'metricas_sql_lentas', self._view_lentas)
+
+    # --- Coleta ---
+
+    def _atual(self):
+        if not has_request_context():
+            return None
+        return g.get('_metricas_sql')
+
+    def _antes_de_executar(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None and self._atual() is not None:
+            context._metricas_inicio = time.perf_counter()
+
+    def _depois_de_executar(self, conn, cursor, statement, parameters, context, executemany):
+        inicio = getattr(context, '_metricas_inicio', None)
+        atual = self._atual()
+        if inicio is None or atual is None:
+            return
+        tempo = time.perf_counter() - inicio
+        atual.consultas += 1
+        atual.tempo_banco += tempo
+        estatisticas = atual.statements.get(statement)
+        if estatisticas is None:
+            atual.statements[statement] = [1, tempo, tempo]
+        else:
+            estatisticas[0] += 1
+            estatisticas[1] += tempo
+            estatisticas[2] = max(estatisticas[2], tempo)
+
+    def _iniciar_requisicao(self):
+        if request.endpoint not in ('metricas', 'metricas_sql_lentas'):
+            g._metricas_sql = _Requisicao()
+
+    def _finalizar_resposta(self, response):
+        atual = self._atual()
+        if atual is not None and self.cabecalho:
+            response.headers['X-SQL-Consultas'] = (
+                f'{atual.consultas}; tempo={atual.tempo_banco * 1000:.1f}ms; '
+                f'n+1={len(self._suspeitas(atual))}'
+            )
+        return response
+
+    def _encerrar_requisicao(self, exc=None):
+        # teardown roda também quando a view levanta exceção.
+        atual = g.pop('_metricas_sql', None)
+        if atual is None:
+            return
+        endpoint = request.endpoint or 'desconhecido'
+        duracao = time.perf_counter() - atual.inicio
+        suspeitas = self._suspeitas(atual)
+        for statement, (execucoes, tempo, _) in suspeitas:
+            current_app.logger.warning(
+                'Possível N+1 em %s: statement executado %d vezes (%.1f ms no total): %s',
+                endpoint, execucoes, tempo * 1000, statement[:TAMANHO_MAXIMO_STATEMENT]
+            )
+        with self._lock:
+            metricas = self._endpoints.get(endpoint)
+            if metricas is None:
+                metricas = self._endpoints[endpoint] = MetricasEndpoint()
+            metricas.duracao.observar(duracao)
+            metricas.consultas.observar(atual.consultas)
+            metricas.tempo_banco.observar(atual.tempo_banco)
+            metricas.n_mais_1 += len(suspeitas)
+            for statement, (_, _, tempo_maximo) in atual.statements.items():
+                self._registrar_lenta(metricas.lentas, tempo_maximo, statement)
+
+    def _suspeitas(self, atual):
+        return [
+            (statement, estatisticas) for statement, estatisticas in atual.statements.items()
+            if estatisticas[0] >= self.limite_n_mais_1
+        ]
+
+    def _registrar_lenta(self, lentas, tempo, statement):
+        for i, (tempo_registrado, registrado) in enumerate(lentas):
+            if registrado == statement:
+                if tempo > tempo_registrado:
+                    lentas[i] = (tempo, statement)
+                    heapq.heapify(lentas)
+                return
+        if len(lentas) < self.total_lentas:
+            heapq.heappush(lentas, (tempo, statement))
+        elif tempo > lentas[0][0]:
+            heapq.heapreplace(lentas, (tempo, statement))
+
+    # --- Exposição ---
+
+    def _autorizar(self):
+        token = current_app.config.get('METRICAS_TOKEN')
+        if not token:
+            # Sem token configurado os endpoints ficam fechados: expõem SQL e nomes internos.
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(401)
+
+    def exportar(self):
+        """ Métricas no formato texto do Prometheus. """
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            blocos = {
+                'http_requisicao_duracao_segundos': ('histogram', 'Duração das requisições.', 'duracao'),
+                'sql_consultas_por_requisicao': ('histogram', 'Consultas SQL executadas por requisição.', 'consultas'),
+                'sql_tempo_por_requisicao_segundos': ('histogram', 'Tempo gasto no banco por requisição.', 'tempo_banco'),
+            }
+            linhas = []
+            for nome, (tipo, ajuda, atributo) in blocos.items():
+                linhas.append(f'# HELP {nome} {ajuda}')
+                linhas.append(f'# TYPE {nome} {tipo}')
+                for endpoint, metricas in endpoints:
+                    linhas.extend(getattr(metricas, atributo).linhas(nome, f'endpoint="{_escapar_rotulo(endpoint)}"'))
+            linhas.append('# HELP sql_n_mais_1_suspeitas_total Statements repetidos na mesma requisição (possível N+1).')
+            linhas.append('# TYPE sql_n_mais_1_suspeitas_total counter')
+            for endpoint, metricas in endpoints:
+                linhas.append(f'sql_n_mais_1_suspeitas_total{{endpoint="{_escapar_rotulo(endpoint)}"}} {metricas.n_mais_1}')
+        return '\n'.join(linhas) + '\n'
+
+    def sql_lentas(self):
+        """ {endpoint: [{'tempo_ms', 'statement'}, ...]}, do mais lento para o mais rápido. """
+        with self._lock:
+            return {
+                endpoint: [
+                    {'tempo_ms': round(tempo * 1000, 3), 'statement': statement[:TAMANHO_MAXIMO_STATEMENT]}
+                    for tempo, statement in sorted(metricas.lentas, reverse=True)
+                ]
+                for endpoint, metricas in sorted(self._endpoints.items())
+            }
+
+    def limpar(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def _view_metricas(self):
+        self._autorizar()
+        texto = self.exportar() + ''.join(exportador() for exportador in self.exportadores)
+        return Response(texto, mimetype='text/plain; version=0.0.4')
+
+    def _view_lentas(self):
+        self._autorizar()
+        return jsonify(self.sql_lentas())
+
+
+metricas_sql = MetricasSQL()
@@ -0,0 +1,194 @@
+# app/services/outbox.py
+"""
+Envio assíncrono de mensagens pela tabela de outbox (MensagemOutbox).
+
+Quem precisa mandar uma mensagem chama enfileirar_mensagem() antes do seu
+commit: a mensagem é gravada na mesma transação do evento (ex: o MagicLink),
+então nunca se perde e a requisição não espera o provedor.
+
+O DespachanteOutbox (executado por `flask processar-outbox`) reserva lotes de
+mensagens prontas, envia em paralelo respeitando o limite de concorrência de
+cada provedor e registra o resultado. Falhas são reenviadas com backoff
+exponencial; após OUTBOX_MAX_TENTATIVAS a mensagem vai para FALHA_DEFINITIVA
+(dead letter) com o último erro registrado. Mensagens com `expira_em` (ex: as
+que levam um link mágico) também vão para FALHA_DEFINITIVA quando passam da
+validade sem terem sido enviadas, em vez de saírem atrasadas.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import threading
+
+from flask import current_app
+from sqlalchemy import case, or_, update
+
+from app.extensions import db
+from app.models import MensagemOutbox
+from app.services.gateways import CircuitoAberto, GatewayOcupado, gateways
+from app.services.messaging_gateway import FakeMessagingGateway
+
+ERRO_EXPIRADA = 'Mensagem expirada antes do envio'
+
+PROVEDORES = {
+    # A instância do registro: conexões, disjuntor e métricas compartilhados com o resto do processo.
+    'whatsapp': lambda app_config: gateways.obter('whatsapp'),
+    'fake': FakeMessagingGateway,
+}
+
+
+def enfileirar_mensagem(prefeitura_id, destino, conteudo, provedor=None, sensivel=False, expira_em=None):
+    """
+    Adiciona a mensagem à outbox na sessão atual. O commit fica com quem chama.
+
+    Mensagens sensíveis (com tokens de acesso) têm o conteúdo apagado assim
+    que são enviadas ou desistidas. Com `expira_em` (UTC), a mensagem é
+    desistida se não sair até esse momento; para um token, use a validade dele.
+    """
+    mensagem = MensagemOutbox(
+        prefeitura_id=prefeitura_id,
+        provedor=provedor or current_app.config.get('OUTBOX_PROVEDOR_PADRAO', 'whatsapp'),
+        destino=destino,
+        conteudo=conteudo,
+        sensivel=sensivel,
+        expira_em=expira_em
+    )
+    db.session.add(mensagem)
+    return mensagem
+
+
+class DespachanteOutbox:
+    def __init__(self, app_config, provedores=None):
+        self.tamanho_lote = app_config.get('OUTBOX_TAMANHO_LOTE', 50)
+        self.max_tentativas = app_config.get('OUTBOX_MAX_TENTATIVAS', 8)
+        self.backoff_base = app_config.get('OUTBOX_BACKOFF_BASE_SEGUNDOS', 5)
+        self.backoff_max = app_config.get('OUTBOX_BACKOFF_MAX_SEGUNDOS', 3600)
+        self.reserva_segundos = app_config.get('OUTBOX_RESERVA_SEGUNDOS', 120)
+        concorrencia = app_config.get('OUTBOX_CONCORRENCIA', {})
+        # Uma instância de cada provedor, reaproveitada entre os lotes.
+        self.provedores = provedores or {nome: fabrica(app_config) for nome, fabrica in PROVEDORES.items()}
+        self._limites = {
+            nome: threading.BoundedSemaphore(concorrencia.get(nome, 4)) for nome in self.provedores
+        }
+        self._pool = ThreadPoolExecutor(
+            max_workers=sum(concorrencia.get(nome, 4) for nome in self.provedores),
+            thread_name_prefix='outbox'
+        )
+
+    def _reservar(self):
+        """
+        Reserva um lote de mensagens prontas para envio. No PostgreSQL usa
+        FOR UPDATE SKIP LOCKED, então vários despachantes podem rodar juntos
+        sem pegar as mesmas mensagens. Mensagens reservadas por um despachante
+        que caiu voltam a ficar disponíveis quando a reserva expira.
+
+        Antes disso, desiste das mensagens que passaram da validade, inclusive
+        as reagendadas para depois dela.
+        """
+        agora = datetime.datetime.utcnow()
+        self._descartar_expiradas(agora)
+        mensagens = MensagemOutbox.query.filter(
+            or_(MensagemOutbox.status == 'PENDENTE', MensagemOutbox.status == 'ENVIANDO'),
+            MensagemOutbox.proxima_tentativa_em <= agora
+        ).order_by(
+            MensagemOutbox.proxima_tentativa_em.asc()
+        ).limit(self.tamanho_lote).with_for_update(skip_locked=True).all()
+        reservadas = []
+        for mensagem in mensagens:
+            mensagem.status = 'ENVIANDO'
+            mensagem.proxima_tentativa_em = agora + datetime.timedelta(seconds=self.reserva_segundos)
+            reservadas.append((
+                mensagem.id, mensagem.provedor, mensagem.destino, mensagem.conteudo,
+                mensagem.tentativas, mensagem.sensivel, mensagem.expira_em
+            ))
+        db.session.commit()
+        return reservadas
+
+    def _descartar_expiradas(self, agora):
+        """ Move para FALHA_DEFINITIVA as mensagens na fila cuja validade passou. """
+        db.session.execute(
+            update(MensagemOutbox).where(
+                or_(
+                    MensagemOutbox.status == 'PENDENTE',
+                    # Reservas vencidas (despachante caiu); as vigentes ainda estão sendo enviadas.
+                    (MensagemOutbox.status == 'ENVIANDO') & (MensagemOutbox.proxima_tentativa_em <= agora)
+                ),
+                MensagemOutbox.expira_em <= agora
+            ).values(
+                status='FALHA_DEFINITIVA', ultimo_erro=ERRO_EXPIRADA,
+                conteudo=case((MensagemOutbox.sensivel, ''), else_=MensagemOutbox.conteudo)
+            ).execution_options(synchronize_session=False)
+        )
+
+    def _enviar(self, provedor, destino, conteudo, expira_em=None):
+        """ Retorna (sucesso, id no provedor, erro, conta como tentativa). """
+        if expira_em is not None and datetime.datetime.utcnow() >= expira_em:
+            return False, None, ERRO_EXPIRADA, False
+        gateway = self.provedores.get(provedor)
+        if gateway is None:
+            return False, None, f"Provedor desconhecido: {provedor}", True
+        with self._limites[provedor]:
+            try:
+                resposta = gateway.enviar_mensagem(destino, conteudo)
+            except (CircuitoAberto, GatewayOcupado) as e:
+                # Recusada antes de chegar ao provedor: reagenda sem gastar tentativa.
+                return False, None, f"{type(e).__name__}: {e}", False
+            except Exception as e:
+                return False, None, f"{type(e).__name__}: {e}", True
+        if resposta.get('status') != 'sucesso':
+            return False, None, str(resposta), True
+        return True, resposta.get('id_mensagem'), None, True
+
+    def _espera(self, tentativas):
+        return min(self.backoff_base * (2 ** (tentativas - 1)), self.backoff_max)
+
+    def processar_lote(self):
+        """
+        Envia um lote de mensagens.
+
+        Retorna:
+            Uma tupla (enviadas, falhas) do lote.
+        """
+        reservadas = self._reservar()
+        if not reservadas:
+            return (0, 0)
+        futuros = [
+            (id_mensagem, tentativas, sensivel, expira_em, self._pool.submit(self._enviar, provedor, destino, conteudo, expira_em))
+            for id_mensagem, provedor, destino, conteudo, tentativas, sensivel, expira_em in reservadas
+        ]
+        enviadas = falhas = 0
+        for id_mensagem, tentativas, sensivel, expira_em, futuro in futuros:
+            sucesso, id_provedor, erro, conta_tentativa = futuro.result()
+            agora = datetime.datetime.utcnow()
+            if conta_tentativa:
+                tentativas += 1
+            if not sucesso and expira_em is not None and agora >= expira_em:
+                # Não adianta reenviar depois da validade (o link já não abre).
+                valores = dict(status='FALHA_DEFINITIVA', tentativas=tentativas, ultimo_erro=erro)
+                falhas += 1
+            elif not conta_tentativa:
+                # Provedor com o circuito aberto ou sem conexões livres: só adia.
+                valores = dict(
+                    status='PENDENTE', ultimo_erro=erro,
+                    proxima_tentativa_em=agora + datetime.timedelta(seconds=self._espera(tentativas + 1))
+                )
+                falhas += 1
+            elif sucesso:
+                valores = dict(status='ENVIADA', tentativas=tentativas, enviado_em=agora, id_mensagem_provedor=id_provedor, ultimo_erro=None)
+                enviadas += 1
+            elif tentativas >= self.max_tentativas:
+                valores = dict(status='FALHA_DEFINITIVA', tentativas=tentativas, ultimo_erro=erro)
+                falhas += 1
+            else:
+                valores = dict(
+                    status='PENDENTE', tentativas=tentativas, ultimo_erro=erro,
+                    proxima_tentativa_em=agora + datetime.timedelta(seconds=self._espera(tentativas))
+                )
+                falhas += 1
+            if sensivel and valores['status'] != 'PENDENTE':
+                valores['conteudo'] = ''
+            db.session.execute(update(MensagemOutbox).where(MensagemOutbox.id == id_mensagem).values(**valores))
+        db.session.commit()
+        return (enviadas, falhas)
+
+    def encerrar(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,350 @@
+# app/services/particoes_auditoria.py
+"""
+Particionamento mensal, arquivamento e retenção dos logs de auditoria
+(LogUso e LogAcessoPaciente). Só PostgreSQL; ver a migração 3f1a8c6e2d94.
+
+- Partições: uma por mês, <tabela>_AAAAMM, com intervalo [dia 1, dia 1 do mês
+  seguinte) em timestamp, mais <tabela>_padrao para o que não couber em
+  nenhuma. criar_particoes() mantém AUDITORIA_PARTICOES_A_FRENTE meses
+  futuros criados; se a partição padrão já recebeu linhas do mês, elas são
+  movidas para a nova partição antes do ATTACH.
+- Arquivamento: partições com mais de AUDITORIA_MESES_ONLINE meses são
+  desanexadas (DETACH), exportadas com COPY para
+  AUDITORIA_ARQUIVO_DIRETORIO/<tabela>/AAAAMM/prefeitura_<id>.tsv.gz (formato
+  texto do COPY: uma linha por registro, colunas separadas por tab, \\N para
+  NULL) e apagadas só depois de conferido o número de linhas. O
+  manifesto.json do diretório guarda colunas, intervalo e, por prefeitura,
+  linhas e sha256 do arquivo. restaurar_particao() anexa o mês de volta.
+- Retenção: os arquivos de cada prefeitura são apagados quando o fim do mês
+  somado à retenção já passou. A retenção vem da Configuracao
+  AUDITORIA_RETENCAO_MESES da prefeitura (ou de AUDITORIA_RETENCAO_MESES da
+  aplicação), nunca abaixo do mínimo da tabela em RETENCAO_MINIMA_MESES.
+
+Os relatórios de uso continuam completos após o arquivamento, porque leem
+LogUsoDiario; não rodar recalcular-uso-diario sobre meses já arquivados.
+"""
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from flask import current_app
+from sqlalchemy import select, text
+
+from app.extensions import db
+from app.models import Configuracao
+
+TABELAS = ('log_uso', 'log_acesso_paciente')
+
+# A LGPD não fixa prazo de guarda para trilhas de auditoria; os mínimos abaixo
+# seguem as normas que se aplicam ao conteúdo de cada tabela.
+RETENCAO_MINIMA_MESES = {
+    # Uso faturável da plataforma: 5 anos, prazo de decadência tributária (CTN, art. 173).
+    'log_uso': 60,
+    # Acessos ao prontuário: mesmo prazo do prontuário, 20 anos (Lei 13.787/2018, art. 6º; CFM 1.821/2007).
+    'log_acesso_paciente': 240,
+}
+CHAVE_RETENCAO = 'AUDITORIA_RETENCAO_MESES'
+
+_NOME_PARTICAO = re.compile(r'^(?P<tabela>[a-z_]+)_(?P<ano>\d{4})(?P<mes>\d{2})$')
+
+
+def _somar_meses(data, meses):
+    indice = data.year * 12 + data.month - 1 + meses
+    return datetime.date(indice // 12, indice % 12 + 1, 1)
+
+
+def _mes_atual():
+    return datetime.date.today().replace(day=1)
+
+
+def nome_particao(tabela, mes):
+    return f'{tabela}_{mes:%Y%m}'
+
+
+def suportado():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def _diretorio():
+    return current_app.config.get('AUDITORIA_ARQUIVO_DIRETORIO') or os.path.join(
+        current_app.instance_path, 'arquivo_auditoria'
+    )
+
+
+def listar_particoes(tabela, conexao=None):
+    """ Meses (date do dia 1) com partição anexada, em ordem. """
+    consulta = text(
+        "SELECT filha.relname FROM pg_inherits "
+        "JOIN pg_class filha ON filha.oid = pg_inherits.inhrelid "
+        "JOIN pg_class mae ON mae.oid = pg_inherits.inhparent "
+        "WHERE mae.relname = :tabela"
+    )
+    nomes = (conexao or db.session).execute(consulta, {'tabela': tabela}).scalars()
+    meses = []
+    for nome in nomes:
+        encontrado = _NOME_PARTICAO.match(nome)
+        if encontrado and encontrado['tabela'] == tabela:
+            meses.append(datetime.date(int(encontrado['ano']), int(encontrado['mes']), 1))
+    return sorted(meses)
+
+
+def _anexar(conexao, tabela, mes):
+    """ Anexa <tabela>_AAAAMM (já criada e populada), trazendo as linhas do mês que estiverem na partição padrão. """
+    nome = nome_particao(tabela, mes)
+    intervalo = {'inicio': mes, 'fim': _somar_meses(mes, 1)}
+    filtro = 'timestamp >= :inicio AND timestamp < :fim'
+    conexao.execute(text(f'INSERT INTO {nome} SELECT * FROM {tabela}_padrao WHERE {filtro}'), intervalo)
+    conexao.execute(text(f'DELETE FROM {tabela}_padrao WHERE {filtro}'), intervalo)
+    conexao.execute(text(
+        f"ALTER TABLE {tabela} ATTACH PARTITION {nome} "
+        f"FOR VALUES FROM ('{intervalo['inicio']}') TO ('{intervalo['fim']}')"
+    ))
+
+
+def _criar_tabela_avulsa(conexao, tabela, mes):
+    conexao.execute(text(
+        f'CREATE TABLE {nome_particao(tabela, mes)} (LIKE {tabela} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    ))
+
+
+def criar_particoes(meses_a_frente=None):
+    """
+    Garante as partições do mês atual e dos próximos meses_a_frente.
+    Retorna os nomes das partições criadas.
+    """
+    if meses_a_frente is None:
+        meses_a_frente = current_app.config.get('AUDITORIA_PARTICOES_A_FRENTE', 3)
+    criadas = []
+    for tabela in TABELAS:
+        existentes = set(listar_particoes(tabela))
+        for deslocamento in range(meses_a_frente + 1):
+            mes = _somar_meses(_mes_atual(), deslocamento)
+            if mes in existentes:
+                continue
+            with db.engine.begin() as conexao:
+                _criar_tabela_avulsa(conexao, tabela, mes)
+                _anexar(conexao, tabela, mes)
+            criadas.append(nome_particao(tabela, mes))
+    return criadas
+
+
+def particoes_para_arquivar(meses_online=None):
+    """ [(tabela, mes)] das partições anexadas mais antigas que meses_online. """
+    if meses_online is None:
+        meses_online = current_app.config.get('AUDITORIA_MESES_ONLINE', 12)
+    limite = _somar_meses(_mes_atual(), -meses_online)
+    return [(tabela, mes) for tabela in TABELAS for mes in listar_particoes(tabela) if mes < limite]
+
+
+def _sha256(caminho):
+    resumo = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+def _ler_manifesto(destino):
+    caminho = os.path.join(destino, 'manifesto.json')
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def _gravar_manifesto(destino, manifesto):
+    caminho = os.path.join(destino, 'manifesto.json')
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2, ensure_ascii=False)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def _exportar(tabela, mes, destino):
+    """ Grava a partição desanexada em um arquivo por prefeitura e devolve o manifesto. """
+    nome = nome_particao(tabela, mes)
+    colunas = list(db.session.execute(text(
+        "SELECT attname FROM pg_attribute WHERE attrelid = CAST(:nome AS regclass) "
+        "AND attnum > 0 AND NOT attisdropped ORDER BY attnum"
+    ), {'nome': nome}).scalars())
+    posicao = colunas.index('prefeitura_id')
+    temporario = destino + '.tmp'
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+
+    prefeituras = {}
+    conexao = db.engine.raw_connection()
+    try:
+        with tempfile.TemporaryFile('w+', encoding='utf-8', newline='\n') as bruto:
+            conexao.cursor().copy_expert(
+                f"COPY (SELECT {', '.join(colunas)} FROM {nome} ORDER BY prefeitura_id, id) TO STDOUT", bruto
+            )
+            conexao.rollback()
+            bruto.seek(0)
+            arquivo = None
+            atual = None
+            try:
+                for linha in bruto:
+                    prefeitura_id = linha.split('\t', posicao + 1)[posicao]
+                    if prefeitura_id != atual:
+                        if arquivo is not None:
+                            arquivo.close()
+                        atual = prefeitura_id
+                        prefeituras[atual] = {'arquivo': f'prefeitura_{atual}.tsv.gz', 'linhas': 0}
+                        arquivo = gzip.open(os.path.join(temporario, prefeituras[atual]['arquivo']), 'wt', encoding='utf-8', newline='\n')
+                    arquivo.write(linha)
+                    prefeituras[atual]['linhas'] += 1
+            finally:
+                if arquivo is not None:
+                    arquivo.close()
+    finally:
+        conexao.close()
+
+    for dados in prefeituras.values():
+        dados['sha256'] = _sha256(os.path.join(temporario, dados['arquivo']))
+    # Prefeituras já expurgadas em um arquivamento anterior (partição restaurada) continuam registradas.
+    anterior = _ler_manifesto(destino) or {'prefeituras': {}}
+    for prefeitura_id, dados in anterior['prefeituras'].items():
+        if dados.get('expurgado_em') and prefeitura_id not in prefeituras:
+            prefeituras[prefeitura_id] = dados
+    manifesto = {
+        'tabela': tabela,
+        'particao': nome,
+        'inicio': mes.isoformat(),
+        'fim': _somar_meses(mes, 1).isoformat(),
+        'colunas': colunas,
+        'arquivado_em': datetime.datetime.utcnow().isoformat(timespec='seconds'),
+        'prefeituras': prefeituras,
+    }
+    _gravar_manifesto(temporario, manifesto)
+    return manifesto, temporario
+
+
+def arquivar_particao(tabela, mes, diretorio=None):
+    """
+    Desanexa, exporta e apaga a partição do mês. Se a exportação falhar, a
+    partição é anexada de novo. Retorna o número de linhas arquivadas.
+    """
+    nome = nome_particao(tabela, mes)
+    destino = os.path.join(diretorio or _diretorio(), tabela, f'{mes:%Y%m}')
+    with db.engine.begin() as conexao:
+        conexao.execute(text(f'ALTER TABLE {tabela} DETACH PARTITION {nome}'))
+    try:
+        manifesto, temporario = _exportar(tabela, mes, destino)
+        total = db.session.execute(text(f'SELECT count(*) FROM {nome}')).scalar_one()
+        db.session.rollback()
+        exportadas = sum(dados['linhas'] for dados in manifesto['prefeituras'].values() if not dados.get('expurgado_em'))
+        if exportadas != total:
+            raise RuntimeError(f'{nome}: {total} linhas na partição, {exportadas} exportadas')
+    except Exception:
+        db.session.rollback()
+        with db.engine.begin() as conexao:
+            _anexar(conexao, tabela, mes)
+        raise
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporario, destino)
+    with db.engine.begin() as conexao:
+        conexao.execute(text(f'DROP TABLE {nome}'))
+    return total
+
+
+def restaurar_particao(tabela, mes, diretorio=None):
+    """
+    Recria e anexa a partição do mês a partir dos arquivos (exceto os já
+    expurgados). Lança ValueError se não houver arquivo ou se algum sha256
+    não conferir. Retorna o número de linhas restauradas.
+    """
+    nome = nome_particao(tabela, mes)
+    destino = os.path.join(diretorio or _diretorio(), tabela, f'{mes:%Y%m}')
+    manifesto = _ler_manifesto(destino)
+    if manifesto is None:
+        raise ValueError(f'Nenhum arquivo de {nome} em {destino}.')
+    if mes in listar_particoes(tabela):
+        raise ValueError(f'{nome} já está anexada.')
+    db.session.rollback()
+    arquivos = []
+    for dados in manifesto['prefeituras'].values():
+        if dados.get('expurgado_em'):
+            continue
+        caminho = os.path.join(destino, dados['arquivo'])
+        if _sha256(caminho) != dados['sha256']:
+            raise ValueError(f'{caminho} não confere com o manifesto (sha256).')
+        arquivos.append((caminho, dados['linhas']))
+
+    with db.engine.begin() as conexao:
+        _criar_tabela_avulsa(conexao, tabela, mes)
+        cursor = conexao.connection.dbapi_connection.cursor()
+        for caminho, _ in arquivos:
+            with gzip.open(caminho, 'rt', encoding='utf-8', newline='\n') as arquivo:
+                cursor.copy_expert(f"COPY {nome} ({', '.join(manifesto['colunas'])}) FROM STDIN", arquivo)
+        _anexar(conexao, tabela, mes)
+    return sum(linhas for _, linhas in arquivos)
+
+
+def validar_retencao(valor):
+    """ Converte a retenção informada pelo gestor. Lança ValueError se inválida. """
+    try:
+        meses = int(str(valor).strip())
+    except ValueError:
+        raise ValueError(f"'{valor}' não é um número de meses.")
+    minimo = min(RETENCAO_MINIMA_MESES.values())
+    if meses < minimo:
+        raise ValueError(f'A retenção mínima dos registros de auditoria é de {minimo} meses.')
+    return meses
+
+
+def retencao_meses(tabela, prefeitura_id):
+    """ Retenção efetiva, em meses, dos registros da prefeitura na tabela. """
+    valor = db.session.execute(
+        select(Configuracao.valor).filter_by(prefeitura_id=prefeitura_id, chave=CHAVE_RETENCAO)
+    ).scalar_one_or_none()
+    try:
+        meses = validar_retencao(valor) if valor else current_app.config.get('AUDITORIA_RETENCAO_MESES', 60)
+    except ValueError:
+        current_app.logger.warning('Retenção de auditoria inválida na prefeitura %s: %r', prefeitura_id, valor)
+        meses = current_app.config.get('AUDITORIA_RETENCAO_MESES', 60)
+    return max(meses, RETENCAO_MINIMA_MESES[tabela])
+
+
+def aplicar_retencao(diretorio=None, hoje=None):
+    """
+    Apaga os arquivos cuja retenção já venceu e registra o expurgo no
+    manifesto. Retorna [(tabela, mes, prefeitura_id, linhas)] expurgados.
+    """
+    diretorio = diretorio or _diretorio()
+    hoje = hoje or datetime.date.today()
+    retencoes = {}
+    expurgados = []
+    for tabela in TABELAS:
+        raiz = os.path.join(diretorio, tabela)
+        if not os.path.isdir(raiz):
+            continue
+        for nome_mes in sorted(os.listdir(raiz)):
+            destino = os.path.join(raiz, nome_mes)
+            manifesto = _ler_manifesto(destino)
+            if manifesto is None:
+                continue
+            fim = datetime.date.fromisoformat(manifesto['fim'])
+            alterado = False
+            for prefeitura_id, dados in manifesto['prefeituras'].items():
+                if dados.get('expurgado_em'):
+                    continue
+                chave = (tabela, prefeitura_id)
+                if chave not in retencoes:
+                    retencoes[chave] = retencao_meses(tabela, int(prefeitura_id))
+                if _somar_meses(fim, retencoes[chave]) > hoje:
+                    continue
+                caminho = os.path.join(destino, dados['arquivo'])
+                if os.path.exists(caminho):
+                    os.remove(caminho)
+                dados['expurgado_em'] = hoje.isoformat()
+                alterado = True
+                expurgados.append((tabela, datetime.date.fromisoformat(manifesto['inicio']), int(prefeitura_id), dados['linhas']))
+            if alterado:
+                _gravar_manifesto(destino, manifesto)
+    return expurgados
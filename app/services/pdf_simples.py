@@ -0,0 +1,64 @@
+# app/services/pdf_simples.py
+"""
+Gerador mínimo de PDF (texto em Helvetica, A4), sem dependências externas.
+
+Suficiente para os documentos clínicos emitidos pelo sistema (atestados,
+declarações...), que são só texto. Os textos são codificados em cp1252
+(WinAnsiEncoding), que cobre a acentuação do português.
+"""
+
+LARGURA_A4 = 595
+ALTURA_A4 = 842
+
+FONTES = {'normal': 'F1', 'negrito': 'F2'}
+
+
+def _texto_pdf(texto):
+    codificado = texto.encode('cp1252', errors='replace')
+    return codificado.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def operador_texto(x, y, texto, tamanho=11, fonte='normal'):
+    """ Operadores de conteúdo que escrevem uma linha de texto na posição (x, y). """
+    return b'BT /%s %d Tf %d %d Td (%s) Tj ET\n' % (
+        FONTES[fonte].encode(), tamanho, x, y, _texto_pdf(texto)
+    )
+
+
+def montar_pdf(paginas):
+    """
+    Monta o arquivo PDF.
+
+    paginas: lista com o stream de conteúdo (bytes) de cada página.
+    """
+    objetos = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # /Pages, preenchido depois que os ids das páginas são conhecidos
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+    ]
+    ids_paginas = []
+    for conteudo in paginas:
+        objetos.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(conteudo), conteudo))
+        id_conteudo = len(objetos)
+        objetos.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+            % (LARGURA_A4, ALTURA_A4, id_conteudo)
+        )
+        ids_paginas.append(len(objetos))
+    objetos[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % i for i in ids_paginas), len(ids_paginas)
+    )
+
+    saida = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    posicoes = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posicoes.append(len(saida))
+        saida += b'%d 0 obj\n%s\nendobj\n' % (numero, objeto)
+    inicio_xref = len(saida)
+    saida += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1)
+    for posicao in posicoes:
+        saida += b'%010d 00000 n \n' % posicao
+    saida += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%EOF\n' % (len(objetos) + 1, inicio_xref)
+    return bytes(saida)
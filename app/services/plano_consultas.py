@@ -0,0 +1,272 @@
+# app/services/plano_consultas.py
+"""
+Verificação dos planos de execução das consultas mais frequentes
+(`flask explicar-consultas`).
+
+CONSULTAS_MONITORADAS reproduz as consultas das telas mais usadas (painel do
+profissional, filas, relatório e-SUS, portal do paciente, agenda...). Cada uma
+é montada com parâmetros reais de uma prefeitura, passada por EXPLAIN e o
+plano é analisado em busca de:
+
+- leitura sequencial de uma tabela grande (Seq Scan / SCAN sem índice);
+- ordenação em memória de muitas linhas, quando um índice poderia entregar
+  as linhas já ordenadas;
+- com --analyze (só PostgreSQL), índices pouco seletivos, que leem muito
+  mais linhas do que devolvem.
+
+No PostgreSQL usa EXPLAIN (FORMAT JSON), com as estimativas do planejador;
+no SQLite, EXPLAIN QUERY PLAN. Tabelas pequenas são sempre lidas
+sequencialmente, então o resultado só é significativo em uma base com volume
+(ex: depois do `flask seed-scale`).
+"""
+
+from collections import namedtuple
+import datetime
+import json
+
+from sqlalchemy import func, select, text
+
+from app.extensions import db
+from app.models import (
+    Consulta, Documento, EntradaFila, LogAcessoPaciente, LogUso, LogUsoDiario, Paciente, SolicitacaoCorrecao,
+    Tarefa, Usuario
+)
+
+LIMIAR_LINHAS = 1000
+
+Parametros = namedtuple('Parametros', ['prefeitura_id', 'profissional_id', 'paciente_id', 'consulta_id', 'hoje'])
+Diagnostico = namedtuple('Diagnostico', ['nome', 'indices', 'alertas', 'plano'])
+
+
+def _dia(parametros):
+    inicio = datetime.datetime.combine(parametros.hoje, datetime.time.min)
+    return inicio, datetime.datetime.combine(parametros.hoje, datetime.time.max)
+
+
+def _em_andamento(p):
+    return select(Consulta).where(
+        Consulta.prefeitura_id == p.prefeitura_id, Consulta.profissional_id == p.profissional_id,
+        Consulta.status == 'INICIADA'
+    ).limit(1)
+
+
+def _atendimentos_dia(p):
+    inicio, fim = _dia(p)
+    return select(Consulta).where(
+        Consulta.prefeitura_id == p.prefeitura_id, Consulta.profissional_id == p.profissional_id,
+        Consulta.status.in_(['FINALIZADA', 'TRANSFERIDO']), Consulta.data_fim.between(inicio, fim)
+    ).order_by(Consulta.data_fim.desc()).limit(5)
+
+
+def _agenda_do_dia(p):
+    inicio, fim = _dia(p)
+    return select(Consulta).where(
+        Consulta.prefeitura_id == p.prefeitura_id, Consulta.profissional_id == p.profissional_id,
+        Consulta.tipo == 'ELETIVA', Consulta.status == 'AGENDADA', Consulta.data_inicio.between(inicio, fim)
+    ).order_by(Consulta.data_inicio.asc())
+
+
+def _tarefas_pendentes(p):
+    return select(Tarefa).where(
+        Tarefa.prefeitura_id == p.prefeitura_id, Tarefa.atribuido_para_id == p.profissional_id,
+        Tarefa.status == 'PENDENTE'
+    ).order_by(Tarefa.data_criacao.asc())
+
+
+def _profissionais(p):
+    return select(Usuario).where(
+        Usuario.prefeitura_id == p.prefeitura_id, Usuario.role == 'PROFISSIONAL_SAUDE'
+    ).order_by(Usuario.nome_completo)
+
+
+def _fila(p):
+    return select(EntradaFila).where(
+        EntradaFila.prefeitura_id == p.prefeitura_id, EntradaFila.fila == 'ACOLHIMENTO_ENF'
+    ).order_by(EntradaFila.entrada_em.asc(), EntradaFila.id.asc())
+
+
+def _relatorio_esus(p):
+    inicio = datetime.datetime.combine(p.hoje - datetime.timedelta(days=30), datetime.time.min)
+    _, fim = _dia(p)
+    return select(Consulta).where(
+        Consulta.prefeitura_id == p.prefeitura_id, Consulta.status.in_(['FINALIZADA', 'TRANSFERIDO']),
+        Consulta.data_inicio.between(inicio, fim)
+    ).order_by(Consulta.data_inicio.asc(), Consulta.id.asc()).limit(50)
+
+
+def _historico_consultas(p):
+    return select(Consulta.id, Consulta.data_inicio, Usuario.nome_completo).join(
+        Usuario, Consulta.profissional_id == Usuario.id
+    ).where(Consulta.paciente_id == p.paciente_id).order_by(Consulta.data_inicio.desc(), Consulta.id.desc()).limit(11)
+
+
+def _historico_acessos(p):
+    return select(LogAcessoPaciente.id, LogAcessoPaciente.timestamp, Usuario.nome_completo).join(
+        Usuario, LogAcessoPaciente.usuario_id == Usuario.id
+    ).where(LogAcessoPaciente.paciente_id == p.paciente_id).order_by(
+        LogAcessoPaciente.timestamp.desc(), LogAcessoPaciente.id.desc()
+    ).limit(11)
+
+
+def _agenda_reservas(p):
+    desde = datetime.datetime.combine(p.hoje - datetime.timedelta(days=1), datetime.time.min)
+    return select(Consulta.profissional_id, Consulta.data_inicio, Consulta.duracao_minutos, Consulta.id).where(
+        Consulta.tipo == 'ELETIVA', Consulta.status.in_(('AGENDADA', 'INICIADA')),
+        Consulta.prefeitura_id == p.prefeitura_id, Consulta.data_inicio >= desde
+    )
+
+
+def _documentos_da_consulta(p):
+    return select(Documento).where(Documento.consulta_id == p.consulta_id)
+
+
+def _painel_uso(p):
+    return select(LogUsoDiario.event_type, func.sum(LogUsoDiario.contagem)).where(
+        LogUsoDiario.prefeitura_id == p.prefeitura_id, LogUsoDiario.dia >= p.hoje.replace(day=1)
+    ).group_by(LogUsoDiario.event_type)
+
+
+def _recalcular_uso(p):
+    inicio = datetime.datetime.combine(p.hoje - datetime.timedelta(days=1), datetime.time.min)
+    return select(LogUso.event_type, func.count(LogUso.id)).where(
+        LogUso.prefeitura_id == p.prefeitura_id, LogUso.timestamp >= inicio
+    ).group_by(LogUso.event_type)
+
+
+def _solicitacoes_pendentes(p):
+    return select(SolicitacaoCorrecao).where(
+        SolicitacaoCorrecao.prefeitura_id == p.prefeitura_id, SolicitacaoCorrecao.status == 'PENDENTE'
+    ).order_by(SolicitacaoCorrecao.timestamp.asc())
+
+
+def _pacientes_agendamento(p):
+    return select(Paciente).where(Paciente.prefeitura_id == p.prefeitura_id).order_by(Paciente.nome_completo)
+
+
+def _login_portal(p):
+    return select(Paciente).where(Paciente.cpf == '00000000000', Paciente.prefeitura_id == p.prefeitura_id).limit(1)
+
+
+# nome -> função(Parametros) que monta o SELECT, na mesma forma usada pela tela.
+CONSULTAS_MONITORADAS = {
+    'painel.em_atendimento': _em_andamento,
+    'painel.atendimentos_dia': _atendimentos_dia,
+    'painel.agenda_do_dia': _agenda_do_dia,
+    'painel.tarefas_pendentes': _tarefas_pendentes,
+    'painel.outros_profissionais': _profissionais,
+    'fila.listar': _fila,
+    'relatorio_esus.pagina': _relatorio_esus,
+    'portal.historico_consultas': _historico_consultas,
+    'portal.historico_acessos': _historico_acessos,
+    'portal.login': _login_portal,
+    'agenda.reservas': _agenda_reservas,
+    'documentos.da_consulta': _documentos_da_consulta,
+    'painel_uso.mes': _painel_uso,
+    'uso_diario.recalculo': _recalcular_uso,
+    'solicitacoes.pendentes': _solicitacoes_pendentes,
+    'agendamento.pacientes': _pacientes_agendamento,
+}
+
+
+def parametros_de_amostra(prefeitura_id=None):
+    """ Parâmetros reais: a prefeitura (padrão: a com mais consultas), seu profissional e paciente mais ativos. """
+    if prefeitura_id is None:
+        prefeitura_id = db.session.scalar(
+            select(Consulta.prefeitura_id).group_by(Consulta.prefeitura_id).order_by(func.count().desc()).limit(1)
+        )
+    if prefeitura_id is None:
+        return None
+
+    def mais_frequente(coluna):
+        return db.session.scalar(
+            select(coluna).where(Consulta.prefeitura_id == prefeitura_id)
+            .group_by(coluna).order_by(func.count().desc()).limit(1)
+        )
+    return Parametros(
+        prefeitura_id=prefeitura_id,
+        profissional_id=mais_frequente(Consulta.profissional_id),
+        paciente_id=mais_frequente(Consulta.paciente_id),
+        consulta_id=db.session.scalar(select(func.max(Consulta.id)).where(Consulta.prefeitura_id == prefeitura_id)),
+        hoje=datetime.date.today(),
+    )
+
+
+def _sql_literal(statement):
+    return str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+
+
+def _analisar_postgres(sql, analyze):
+    opcoes = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+    plano = db.session.execute(text(f'EXPLAIN ({opcoes}) {sql}')).scalar()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    if analyze:
+        # EXPLAIN ANALYZE executa a consulta; nada deve ficar gravado.
+        db.session.rollback()
+    indices, alertas = [], []
+
+    def visitar(no):
+        tipo = no.get('Node Type')
+        tabela = no.get('Relation Name')
+        linhas = no.get('Actual Rows', no.get('Plan Rows', 0)) * no.get('Actual Loops', 1)
+        if no.get('Index Name'):
+            indices.append(no['Index Name'])
+        if tipo == 'Seq Scan':
+            lidas = linhas + no.get('Rows Removed by Filter', 0)
+            if lidas >= LIMIAR_LINHAS or no.get('Plan Rows', 0) >= LIMIAR_LINHAS:
+                alertas.append(f"leitura sequencial de {tabela} (~{int(max(lidas, no.get('Plan Rows', 0)))} linhas)")
+        elif tipo == 'Sort' and linhas >= LIMIAR_LINHAS:
+            alertas.append(f"ordenação de ~{int(linhas)} linhas em memória ({', '.join(no.get('Sort Key', []))})")
+        removidas = no.get('Rows Removed by Filter', 0) + no.get('Rows Removed by Index Recheck', 0)
+        if tipo != 'Seq Scan' and removidas >= LIMIAR_LINHAS and removidas > 10 * max(linhas, 1):
+            alertas.append(
+                f"{no.get('Index Name') or tabela}: {int(removidas)} linhas descartadas pelo filtro para "
+                f"{int(linhas)} devolvidas (índice pouco seletivo)"
+            )
+        for filho in no.get('Plans', []):
+            visitar(filho)
+
+    visitar(plano[0]['Plan'])
+    return indices, alertas, json.dumps(plano[0]['Plan'], indent=2)
+
+
+def _analisar_sqlite(sql):
+    linhas_plano = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).all()
+    indices, alertas = [], []
+    for linha in linhas_plano:
+        detalhe = linha[-1]
+        partes = detalhe.split()
+        if 'USING' in partes and 'INDEX' in partes:
+            indices.append(partes[partes.index('INDEX') + 1])
+        elif partes[:1] == ['SCAN'] and len(partes) > 1:
+            # Versões antigas do SQLite escrevem "SCAN TABLE <tabela>".
+            tabela = partes[2] if partes[1] == 'TABLE' else partes[1]
+            total = db.session.scalar(text(f'SELECT count(*) FROM "{tabela}"'))
+            if total >= LIMIAR_LINHAS:
+                alertas.append(f'leitura sequencial de {tabela} ({total} linhas)')
+        if 'TEMP B-TREE FOR ORDER BY' in detalhe:
+            alertas.append('ordenação em memória: nenhum índice entrega as linhas na ordem pedida')
+    return indices, alertas, '\n'.join(linha[-1] for linha in linhas_plano)
+
+
+def diagnosticar(parametros, nomes=None, analyze=False):
+    """
+    Roda EXPLAIN nas consultas monitoradas (todas, ou as de `nomes`).
+
+    Retorna:
+        Lista de Diagnostico(nome, indices usados, alertas, plano em texto).
+    """
+    dialeto = db.engine.dialect.name
+    if dialeto not in ('postgresql', 'sqlite'):
+        raise ValueError(f'EXPLAIN não suportado para o banco {dialeto}.')
+    resultado = []
+    for nome, montar in CONSULTAS_MONITORADAS.items():
+        if nomes and nome not in nomes:
+            continue
+        sql = _sql_literal(montar(parametros))
+        if dialeto == 'postgresql':
+            indices, alertas, plano = _analisar_postgres(sql, analyze)
+        else:
+            indices, alertas, plano = _analisar_sqlite(sql)
+        resultado.append(Diagnostico(nome, sorted(set(indices)), alertas, plano))
+    return resultado
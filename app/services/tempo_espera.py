@@ -0,0 +1,251 @@
+# app/services/tempo_espera.py
+"""
+Estimativa do tempo de espera nas filas de atendimento.
+
+Cada consulta de fila encerrada (data_fim preenchida ao finalizar ou
+transferir) atualiza a EstatisticaAtendimento da prefeitura e da fila na
+mesma transação: média e variância com peso exponencial (ALFA) e um
+histograma com decaimento exponencial por faixa de duração, de onde sai o
+percentil 90. Assim as estimativas acompanham a mudança do ritmo ao longo
+do dia e nenhuma requisição reagrega o histórico de consultas.
+recalcular() reconstrói as estatísticas a partir das consultas passadas
+(ex: na implantação): `flask recalcular-tempos-espera`.
+
+A previsão de uma fila junta essas estatísticas ao número de profissionais
+ativos nela (que iniciaram um atendimento dessa fila na última
+JANELA_ATIVOS) e fica em cache por PREVISAO_TTL_SEGUNDOS. A estimativa de
+cada posição é O(1): posição x tempo de atendimento / profissionais.
+"""
+
+from collections import namedtuple
+import datetime
+import json
+import math
+
+from sqlalchemy import and_, delete, distinct, event, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.cache import CacheTTL
+from app.extensions import db
+from app.models import Consulta, EntradaFila, EstatisticaAtendimento
+from app.services.fila_atendimento import FILAS
+
+# Peso da consulta mais recente nas médias (cerca das últimas 1/ALFA consultas).
+ALFA = 0.1
+# Limites superiores das faixas do histograma, em minutos; a última faixa é "acima de 180".
+FAIXAS_MINUTOS = (1, 2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 25, 30, 40, 50, 60, 90, 120, 180)
+# Atendimentos mais longos que isso são consultas esquecidas abertas e não entram na estatística.
+DURACAO_MAXIMA = datetime.timedelta(hours=4)
+JANELA_ATIVOS = datetime.timedelta(hours=1)
+# Usado enquanto a fila tiver menos de AMOSTRAS_MINIMAS atendimentos registrados.
+MEDIA_PADRAO_MINUTOS = {'ACOLHIMENTO_ENF': 10, 'CONSULTA_MEDICA': 15}
+AMOSTRAS_MINIMAS = 5
+PREVISAO_TTL_SEGUNDOS = 30
+
+Estimativa = namedtuple('Estimativa', ['minutos', 'minutos_max'])
+
+_previsoes = CacheTTL(ttl_segundos=PREVISAO_TTL_SEGUNDOS)
+
+
+class Estatisticas:
+    """ Estado incremental do tempo de atendimento de uma fila (em segundos). """
+
+    def __init__(self, amostras=0, media_segundos=0.0, variancia=0.0, histograma=None):
+        self.amostras = amostras
+        self.media_segundos = media_segundos
+        self.variancia = variancia
+        self.histograma = histograma or [0.0] * (len(FAIXAS_MINUTOS) + 1)
+
+    @classmethod
+    def da_linha(cls, linha):
+        return cls(linha.amostras, linha.media_segundos, linha.variancia, json.loads(linha.histograma) or None)
+
+    def valores(self):
+        return {
+            'amostras': self.amostras,
+            'media_segundos': self.media_segundos,
+            'variancia': self.variancia,
+            'histograma': json.dumps([round(peso, 6) for peso in self.histograma]),
+            'atualizado_em': datetime.datetime.utcnow(),
+        }
+
+    def observar(self, segundos):
+        if self.amostras == 0:
+            self.media_segundos = segundos
+        else:
+            desvio = segundos - self.media_segundos
+            self.media_segundos += ALFA * desvio
+            self.variancia = (1 - ALFA) * (self.variancia + ALFA * desvio * desvio)
+        self.histograma = [peso * (1 - ALFA) for peso in self.histograma]
+        minutos = segundos / 60
+        faixa = next((i for i, limite in enumerate(FAIXAS_MINUTOS) if minutos <= limite), len(FAIXAS_MINUTOS))
+        self.histograma[faixa] += ALFA
+        self.amostras += 1
+
+    def quantil(self, q):
+        """ Quantil q (0-1) do histograma, em segundos, interpolando dentro da faixa. """
+        total = sum(self.histograma)
+        if total <= 0:
+            return self.media_segundos
+        alvo = q * total
+        acumulado = 0.0
+        for faixa, peso in enumerate(self.histograma):
+            if peso > 0 and acumulado + peso >= alvo:
+                inicio = FAIXAS_MINUTOS[faixa - 1] if faixa > 0 else 0
+                fim = FAIXAS_MINUTOS[faixa] if faixa < len(FAIXAS_MINUTOS) else FAIXAS_MINUTOS[-1] * 1.5
+                return (inicio + (alvo - acumulado) / peso * (fim - inicio)) * 60
+            acumulado += peso
+        return FAIXAS_MINUTOS[-1] * 60
+
+
+class Previsao:
+    """ Tempo de atendimento de uma fila e profissionais ativos nela, para estimar a espera por posição. """
+    __slots__ = ('fila', 'media_segundos', 'p90_segundos', 'profissionais', 'amostras')
+
+    def __init__(self, fila, media_segundos, p90_segundos, profissionais, amostras):
+        self.fila = fila
+        self.media_segundos = media_segundos
+        self.p90_segundos = max(p90_segundos, media_segundos)
+        self.profissionais = max(profissionais, 1)
+        self.amostras = amostras
+
+    def para_posicao(self, posicao):
+        """ Espera estimada (em minutos) de quem está na posição (1 = próximo a ser chamado). """
+        fator = posicao / self.profissionais / 60
+        return Estimativa(
+            max(1, round(self.media_segundos * fator)),
+            max(1, math.ceil(self.p90_segundos * fator))
+        )
+
+
+def _duracao_valida(consulta_inicio, consulta_fim):
+    if consulta_inicio is None or consulta_fim is None:
+        return None
+    duracao = consulta_fim - consulta_inicio
+    if duracao <= datetime.timedelta(0) or duracao > DURACAO_MAXIMA:
+        return None
+    return duracao.total_seconds()
+
+
+def registrar_atendimento(connection, prefeitura_id, fila, segundos):
+    """ Soma um atendimento encerrado às estatísticas da fila, na transação de connection. """
+    tabela = EstatisticaAtendimento.__table__
+    chave = and_(tabela.c.prefeitura_id == prefeitura_id, tabela.c.fila == fila)
+    dialeto = {'postgresql': postgresql, 'sqlite': sqlite}.get(connection.dialect.name)
+    vazia = dict(prefeitura_id=prefeitura_id, fila=fila, **Estatisticas().valores())
+    if dialeto:
+        connection.execute(
+            dialeto.insert(tabela).values(**vazia).on_conflict_do_nothing(index_elements=['prefeitura_id', 'fila'])
+        )
+    elif connection.execute(select(tabela.c.id).where(chave)).first() is None:
+        connection.execute(insert(tabela).values(**vazia))
+    # A média exponencial depende da ordem: a linha fica travada até o commit.
+    linha = connection.execute(select(tabela).where(chave).with_for_update()).one()
+    estatisticas = Estatisticas.da_linha(linha)
+    estatisticas.observar(segundos)
+    connection.execute(update(tabela).where(tabela.c.id == linha.id).values(**estatisticas.valores()))
+    _previsoes.invalidar((prefeitura_id, fila))
+
+
+@event.listens_for(Consulta, 'after_update')
+def _registrar_fim_de_consulta(mapper, connection, target):
+    if target.tipo not in FILAS:
+        return
+    historico = db.inspect(target).attrs.data_fim.history
+    if not historico.added or any(historico.deleted):
+        return
+    segundos = _duracao_valida(target.data_inicio, target.data_fim)
+    if segundos is not None:
+        registrar_atendimento(connection, target.prefeitura_id, target.tipo, segundos)
+
+
+def _profissionais_ativos(prefeitura_id, fila):
+    desde = datetime.datetime.utcnow() - JANELA_ATIVOS
+    return db.session.scalar(
+        select(func.count(distinct(Consulta.profissional_id))).where(
+            Consulta.prefeitura_id == prefeitura_id,
+            Consulta.data_inicio >= desde,
+            Consulta.tipo == fila
+        )
+    ) or 0
+
+
+def _calcular_previsao(prefeitura_id, fila):
+    linha = db.session.execute(
+        select(EstatisticaAtendimento).filter_by(prefeitura_id=prefeitura_id, fila=fila)
+    ).scalar_one_or_none()
+    if linha is None or linha.amostras < AMOSTRAS_MINIMAS:
+        media = MEDIA_PADRAO_MINUTOS.get(fila, 15) * 60
+        return Previsao(fila, media, media * 1.5, _profissionais_ativos(prefeitura_id, fila), linha.amostras if linha else 0)
+    estatisticas = Estatisticas.da_linha(linha)
+    return Previsao(
+        fila, estatisticas.media_segundos, estatisticas.quantil(0.9),
+        _profissionais_ativos(prefeitura_id, fila), estatisticas.amostras
+    )
+
+
+def previsao(prefeitura_id, fila):
+    """ Previsao da fila, em cache por PREVISAO_TTL_SEGUNDOS. """
+    if fila not in FILAS:
+        raise ValueError(f"Fila desconhecida: {fila}")
+    return _previsoes.get_or_set((prefeitura_id, fila), lambda: _calcular_previsao(prefeitura_id, fila))
+
+
+def espera_do_paciente(paciente_id):
+    """
+    Posição do paciente na fila em que aguarda e a espera estimada.
+
+    Retorna:
+        (fila, posicao, Estimativa), ou None se ele não estiver em nenhuma fila.
+    """
+    entrada = EntradaFila.query.filter_by(paciente_id=paciente_id).first()
+    if entrada is None:
+        return None
+    a_frente = db.session.scalar(
+        select(func.count(EntradaFila.id)).where(
+            EntradaFila.prefeitura_id == entrada.prefeitura_id,
+            EntradaFila.fila == entrada.fila,
+            or_(
+                EntradaFila.entrada_em < entrada.entrada_em,
+                and_(EntradaFila.entrada_em == entrada.entrada_em, EntradaFila.id < entrada.id)
+            )
+        )
+    )
+    posicao = a_frente + 1
+    return entrada.fila, posicao, previsao(entrada.prefeitura_id, entrada.fila).para_posicao(posicao)
+
+
+def recalcular(prefeitura_id=None, dias=30):
+    """
+    Reconstrói as estatísticas a partir das consultas de fila encerradas nos
+    últimos `dias`, em ordem de encerramento. Retorna o número de atendimentos usados.
+    """
+    desde = datetime.datetime.utcnow() - datetime.timedelta(days=dias)
+    filtro = [Consulta.tipo.in_(FILAS), Consulta.data_fim >= desde]
+    filtro_estatisticas = []
+    if prefeitura_id is not None:
+        filtro.append(Consulta.prefeitura_id == prefeitura_id)
+        filtro_estatisticas.append(EstatisticaAtendimento.prefeitura_id == prefeitura_id)
+
+    estatisticas = {}
+    usados = 0
+    consultas = db.session.execute(
+        select(Consulta.prefeitura_id, Consulta.tipo, Consulta.data_inicio, Consulta.data_fim)
+        .where(*filtro).order_by(Consulta.data_fim.asc()).execution_options(yield_per=5000)
+    )
+    for prefeitura, fila, inicio, fim in consultas:
+        segundos = _duracao_valida(inicio, fim)
+        if segundos is None:
+            continue
+        estatisticas.setdefault((prefeitura, fila), Estatisticas()).observar(segundos)
+        usados += 1
+
+    db.session.execute(delete(EstatisticaAtendimento).where(*filtro_estatisticas))
+    if estatisticas:
+        db.session.execute(insert(EstatisticaAtendimento), [
+            dict(prefeitura_id=prefeitura, fila=fila, **valores.valores())
+            for (prefeitura, fila), valores in estatisticas.items()
+        ])
+    db.session.commit()
+    _previsoes.limpar()
+    return usados
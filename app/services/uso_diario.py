@@ -0,0 +1,106 @@
+# app/services/uso_diario.py
+"""
+Manutenção da tabela LogUsoDiario, a consolidação diária de LogUso.
+
+Cada LogUso inserido soma 1 na contagem (e sua quantity) da linha
+(prefeitura_id, dia, event_type) correspondente, com um UPSERT na mesma
+transação do evento. Para reconstruir dias passados (ex: dados anteriores à
+tabela, ou inserções feitas fora do ORM) há recalcular_uso_diario(), que
+recalcula os dias a partir do log bruto e pode ser executada quantas vezes
+for necessário: `flask recalcular-uso-diario --desde AAAA-MM-DD`.
+"""
+
+import datetime
+
+from sqlalchemy import and_, delete, event, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.extensions import db
+from app.models import LogUso, LogUsoDiario
+
+
+def acumular_uso(connection, registros):
+    """
+    Soma eventos à consolidação diária.
+
+    registros: lista de dicts com prefeitura_id, timestamp, event_type e quantity.
+    """
+    acumulado = {}
+    for registro in registros:
+        chave = (registro['prefeitura_id'], registro['timestamp'].date(), registro['event_type'])
+        contagem, quantidade = acumulado.get(chave, (0, 0.0))
+        acumulado[chave] = (contagem + 1, quantidade + (registro.get('quantity') or 0.0))
+
+    tabela = LogUsoDiario.__table__
+    dialeto = {'postgresql': postgresql, 'sqlite': sqlite}.get(connection.dialect.name)
+    for (prefeitura_id, dia, event_type), (contagem, quantidade) in acumulado.items():
+        valores = dict(prefeitura_id=prefeitura_id, dia=dia, event_type=event_type, contagem=contagem, quantity=quantidade)
+        if dialeto:
+            stmt = dialeto.insert(tabela).values(**valores)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['prefeitura_id', 'dia', 'event_type'],
+                set_={
+                    'contagem': tabela.c.contagem + stmt.excluded.contagem,
+                    'quantity': tabela.c.quantity + stmt.excluded.quantity,
+                }
+            )
+            connection.execute(stmt)
+            continue
+        # Outros bancos: atualiza e, se a linha ainda não existe, insere.
+        resultado = connection.execute(
+            update(tabela).where(
+                tabela.c.prefeitura_id == prefeitura_id,
+                tabela.c.dia == dia,
+                tabela.c.event_type == event_type
+            ).values(contagem=tabela.c.contagem + contagem, quantity=tabela.c.quantity + quantidade)
+        )
+        if resultado.rowcount == 0:
+            connection.execute(insert(tabela).values(**valores))
+
+
+@event.listens_for(LogUso, 'after_insert')
+def _acumular_log_uso(mapper, connection, target):
+    acumular_uso(connection, [{
+        'prefeitura_id': target.prefeitura_id,
+        'timestamp': target.timestamp,
+        'event_type': target.event_type,
+        'quantity': target.quantity,
+    }])
+
+
+def recalcular_uso_diario(desde, ate=None, prefeitura_id=None):
+    """
+    Reconstrói a consolidação dos dias [desde, ate] a partir de LogUso.
+    Seguro para reexecução: os dias do intervalo são apagados e recalculados
+    na mesma transação.
+
+    Retorna:
+        O número de linhas de LogUsoDiario gravadas.
+    """
+    ate = ate or datetime.date.today()
+    inicio = datetime.datetime.combine(desde, datetime.time.min)
+    fim = datetime.datetime.combine(ate + datetime.timedelta(days=1), datetime.time.min)
+
+    filtro_diario = [LogUsoDiario.dia >= desde, LogUsoDiario.dia <= ate]
+    filtro_log = [LogUso.timestamp >= inicio, LogUso.timestamp < fim]
+    if prefeitura_id is not None:
+        filtro_diario.append(LogUsoDiario.prefeitura_id == prefeitura_id)
+        filtro_log.append(LogUso.prefeitura_id == prefeitura_id)
+
+    dia = func.date(LogUso.timestamp)
+    agregado = select(
+        LogUso.prefeitura_id,
+        dia,
+        LogUso.event_type,
+        func.count(LogUso.id),
+        func.coalesce(func.sum(LogUso.quantity), 0.0)
+    ).where(and_(*filtro_log)).group_by(LogUso.prefeitura_id, dia, LogUso.event_type)
+
+    db.session.execute(delete(LogUsoDiario).where(and_(*filtro_diario)))
+    resultado = db.session.execute(
+        insert(LogUsoDiario).from_select(
+            ['prefeitura_id', 'dia', 'event_type', 'contagem', 'quantity'], agregado
+        )
+    )
+    db.session.commit()
+    return resultado.rowcount
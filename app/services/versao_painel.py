@@ -0,0 +1,103 @@
+# app/services/versao_painel.py
+"""
+Versão dos dados do painel do profissional, por prefeitura.
+
+Cada commit que grava EntradaFila, Consulta, Tarefa ou Paciente incrementa a
+versão das prefeituras envolvidas (listeners de sessão: after_flush anota as
+prefeituras, after_commit incrementa; rollback descarta). Quem remove linhas
+com DELETE direto, sem passar pelo flush, chama marcar_alteracao().
+
+/gestor/api/painel monta o ETag a partir dessa versão e responde 304 sem
+consultar o banco enquanto ela não muda. Com REDIS_URL a versão fica no Redis
+e vale para todos os workers. Sem Redis ela fica em memória, por processo, e
+passa a incluir uma janela de VERSAO_LOCAL_JANELA_SEGUNDOS: um worker que não
+viu a alteração serve dados antigos no máximo por esse tempo.
+"""
+
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models import Consulta, EntradaFila, Paciente, Tarefa
+
+MODELOS_DO_PAINEL = (EntradaFila, Consulta, Tarefa, Paciente)
+VERSAO_LOCAL_JANELA_SEGUNDOS = 30
+_CHAVE_SESSAO = 'painel_prefeituras_alteradas'
+
+
+class VersoesPainel:
+    def __init__(self, app=None):
+        self.app = None
+        self._redis = None
+        self._locais = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        url = app.config.get('REDIS_URL')
+        if url:
+            from redis import Redis
+            self._redis = Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        app.extensions['versao_painel'] = self
+
+    def _chave(self, prefeitura_id):
+        return f'painel:versao:{prefeitura_id}'
+
+    def atual(self, prefeitura_id):
+        """ Versão atual (str), ou None se o Redis não responder: nesse caso não há 304. """
+        if self._redis is None:
+            with self._lock:
+                local = self._locais.get(prefeitura_id, 0)
+            return f'{local}-{int(time.time() // VERSAO_LOCAL_JANELA_SEGUNDOS)}'
+        try:
+            versao = self._redis.get(self._chave(prefeitura_id))
+            if versao is None:
+                # Começa do relógio (e não de 0) para não repetir versões já vistas se o Redis perder a chave.
+                self._redis.set(self._chave(prefeitura_id), int(time.time() * 1000), nx=True)
+                versao = self._redis.get(self._chave(prefeitura_id))
+            return versao.decode()
+        except Exception as e:
+            self.app.logger.warning('Versão do painel indisponível no Redis: %s', e)
+            return None
+
+    def incrementar(self, prefeitura_id):
+        if self._redis is None:
+            with self._lock:
+                self._locais[prefeitura_id] = self._locais.get(prefeitura_id, 0) + 1
+            return
+        try:
+            if self._redis.incr(self._chave(prefeitura_id)) == 1:
+                # A chave não existia: alinha com o início pelo relógio usado em atual().
+                self._redis.set(self._chave(prefeitura_id), int(time.time() * 1000))
+        except Exception as e:
+            self.app.logger.warning('Não foi possível incrementar a versão do painel no Redis: %s', e)
+
+
+versoes_painel = VersoesPainel()
+
+
+def marcar_alteracao(session, prefeitura_id):
+    """ Anota que o próximo commit da sessão altera o painel da prefeitura. """
+    session.info.setdefault(_CHAVE_SESSAO, set()).add(prefeitura_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _anotar_prefeituras(session, flush_context):
+    for objeto in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(objeto, MODELOS_DO_PAINEL) and objeto.prefeitura_id is not None:
+            marcar_alteracao(session, objeto.prefeitura_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _incrementar_versoes(session):
+    for prefeitura_id in session.info.pop(_CHAVE_SESSAO, ()):
+        versoes_painel.incrementar(prefeitura_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_anotacoes(session, previous_transaction):
+    session.info.pop(_CHAVE_SESSAO, None)
@@ -4,12 +4,12 @@ class VideoGateway:
     """
     Interface para o provedor de serviços de vídeo.
     Abstrai a lógica de criação e gerenciamento de salas de teleconsulta.
+    Uma instância por processo, obtida de gateways.obter('video') (app/services/gateways.py).
     """
-    def __init__(self, app_config):
-        # Em um cenário real, aqui entrariam as chaves de API, etc.
+    def __init__(self, app_config, cliente=None):
         self.config = app_config
-        # Ex: self.api_key = app_config.get('AMAZON_CHIME_API_KEY')
-        print("Gateway de Vídeo Inicializado.")
+        # ClienteHTTP do provedor; None enquanto GATEWAY_VIDEO_URL não estiver configurada.
+        self.cliente = cliente
 
     def criar_sala_teleconsulta(self, consulta_id):
         """
@@ -18,6 +18,9 @@ class VideoGateway:
         Retorna:
             Um dicionário com os detalhes da sala (ex: URL da sala, ID da sessão).
         """
+        if self.cliente is not None:
+            resposta = self.cliente.requisitar('POST', '/salas', {'consulta_id': consulta_id}, operacao='criar_sala')
+            return {'url_sala': resposta['url_sala'], 'id_sessao_provedor': resposta['id_sessao_provedor']}
         # Lógica para chamar a API do provedor (ex: Amazon Chime) virá aqui.
         print(f"Lógica de criação de sala para consulta {consulta_id} iria aqui.")
         
@@ -29,5 +32,8 @@ class VideoGateway:
 
     def encerrar_sala_teleconsulta(self, id_sessao_provedor):
         """ Encerra uma sala de teleconsulta ativa. """
+        if self.cliente is not None:
+            self.cliente.requisitar('DELETE', f'/salas/{id_sessao_provedor}', operacao='encerrar_sala')
+            return True
         print(f"Lógica para encerrar a sessão {id_sessao_provedor} iria aqui.")
         return True
\ No newline at end of file
@@ -0,0 +1,9 @@
+#!/bin/sh
+# Arquivo: docker/postgres/replicacao.sh
+# Executado pela imagem do PostgreSQL apenas na criação do volume do primário:
+# cria o usuário usado pela réplica (docker compose --profile replica up).
+set -e
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" \
+    -c "CREATE ROLE replicador WITH REPLICATION LOGIN PASSWORD 'replicador'"
+echo "host replication replicador all scram-sha-256" >> "$PGDATA/pg_hba.conf"
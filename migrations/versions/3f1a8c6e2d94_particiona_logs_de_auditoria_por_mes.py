@@ -0,0 +1,117 @@
+"""Particiona LogUso e LogAcessoPaciente por mês (PostgreSQL)
+
+Revision ID: 3f1a8c6e2d94
+Revises: 2e9b5d7c4a18
+Create Date: 2026-10-18 22:06:51.330174
+
+As tabelas são recriadas como particionadas por RANGE (timestamp), com uma
+partição por mês desde o registro mais antigo até 3 meses à frente, mais uma
+partição padrão (<tabela>_padrao) para o que cair fora delas. Os dados são
+copiados para a nova tabela: em bases grandes, rodar em janela de manutenção.
+A chave primária passa a ser (id, timestamp), exigência do PostgreSQL para
+tabelas particionadas; o id continua vindo da mesma sequence.
+
+Em outros bancos a migração não faz nada.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a8c6e2d94'
+down_revision = '2e9b5d7c4a18'
+branch_labels = None
+depends_on = None
+
+
+TABELAS = {
+    'log_uso': {
+        'colunas': [
+            ('id', "INTEGER NOT NULL DEFAULT nextval('log_uso_id_seq')"),
+            ('timestamp', 'TIMESTAMP WITHOUT TIME ZONE NOT NULL'),
+            ('event_type', 'VARCHAR(100) NOT NULL'),
+            ('quantity', 'FLOAT'),
+            ('unit', 'VARCHAR(50)'),
+            ('related_consulta_id', 'INTEGER REFERENCES consulta (id)'),
+            ('related_usuario_id', 'INTEGER REFERENCES usuario (id)'),
+            ('prefeitura_id', 'INTEGER NOT NULL REFERENCES prefeitura (id)'),
+        ],
+        'indices': {
+            'ix_log_uso_event_type': 'event_type',
+            'ix_log_uso_timestamp': 'timestamp',
+            'ix_log_uso_prefeitura_timestamp': 'prefeitura_id, timestamp',
+        },
+    },
+    'log_acesso_paciente': {
+        'colunas': [
+            ('id', "INTEGER NOT NULL DEFAULT nextval('log_acesso_paciente_id_seq')"),
+            ('timestamp', 'TIMESTAMP WITHOUT TIME ZONE NOT NULL'),
+            ('prefeitura_id', 'INTEGER NOT NULL REFERENCES prefeitura (id)'),
+            ('usuario_id', 'INTEGER NOT NULL REFERENCES usuario (id)'),
+            ('paciente_id', 'INTEGER NOT NULL REFERENCES paciente (id)'),
+            ('consulta_id', 'INTEGER REFERENCES consulta (id)'),
+            ('acao', 'VARCHAR(255) NOT NULL'),
+        ],
+        'indices': {
+            'ix_log_acesso_paciente_timestamp': 'timestamp',
+            'ix_log_acesso_paciente_usuario_id': 'usuario_id',
+            'ix_log_acesso_paciente_paciente_timestamp': 'paciente_id, timestamp, id',
+        },
+    },
+}
+
+
+def _recriar(tabela, definicao, particionada):
+    colunas = ', '.join(nome for nome, _ in definicao['colunas'])
+    op.execute(f'ALTER TABLE {tabela} RENAME TO {tabela}_legado')
+    op.execute(f'ALTER TABLE {tabela}_legado RENAME CONSTRAINT {tabela}_pkey TO {tabela}_legado_pkey')
+    for indice in definicao['indices']:
+        op.execute(f'ALTER INDEX {indice} RENAME TO {indice}_legado')
+    # A sequence sobrevive ao DROP da tabela antiga e passa para a nova.
+    op.execute(f'ALTER SEQUENCE {tabela}_id_seq OWNED BY NONE')
+
+    ddl_colunas = ',\n    '.join(f'{nome} {tipo}' for nome, tipo in definicao['colunas'])
+    if particionada:
+        op.execute(
+            f'CREATE TABLE {tabela} (\n    {ddl_colunas},\n    PRIMARY KEY (id, timestamp)\n) PARTITION BY RANGE (timestamp)'
+        )
+        op.execute(f'CREATE TABLE {tabela}_padrao PARTITION OF {tabela} DEFAULT')
+        # Mesma convenção de nomes de app/services/particoes_auditoria.py: <tabela>_AAAAMM.
+        op.execute(f"""
+DO $$
+DECLARE
+    mes date;
+    limite date := (date_trunc('month', now()) + interval '4 months')::date;
+BEGIN
+    SELECT coalesce(date_trunc('month', min(timestamp)), date_trunc('month', now()))::date
+      INTO mes FROM {tabela}_legado;
+    WHILE mes < limite LOOP
+        EXECUTE 'CREATE TABLE ' || quote_ident('{tabela}_' || to_char(mes, 'YYYYMM'))
+             || ' PARTITION OF {tabela} FOR VALUES FROM (' || quote_literal(mes)
+             || ') TO (' || quote_literal((mes + interval '1 month')::date) || ')';
+        mes := (mes + interval '1 month')::date;
+    END LOOP;
+END
+$$""")
+    else:
+        op.execute(f'CREATE TABLE {tabela} (\n    {ddl_colunas},\n    PRIMARY KEY (id)\n)')
+    op.execute(f'ALTER SEQUENCE {tabela}_id_seq OWNED BY {tabela}.id')
+    op.execute(f'INSERT INTO {tabela} ({colunas}) SELECT {colunas} FROM {tabela}_legado')
+    op.execute(f'DROP TABLE {tabela}_legado')
+    for indice, colunas_indice in definicao['indices'].items():
+        op.execute(f'CREATE INDEX {indice} ON {tabela} ({colunas_indice})')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for tabela, definicao in TABELAS.items():
+        _recriar(tabela, definicao, particionada=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # Só volta o que está anexado; partições já arquivadas ficam nos arquivos.
+    for tabela, definicao in TABELAS.items():
+        _recriar(tabela, definicao, particionada=False)
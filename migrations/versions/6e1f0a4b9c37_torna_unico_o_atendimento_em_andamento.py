@@ -0,0 +1,56 @@
+"""Torna único o atendimento em andamento de cada profissional
+
+Revision ID: 6e1f0a4b9c37
+Revises: 4b8e2f1a7c53
+Create Date: 2026-10-19 09:14:52.260418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e1f0a4b9c37'
+down_revision = '4b8e2f1a7c53'
+branch_labels = None
+depends_on = None
+
+NOTA = 'Encerrado automaticamente: havia outro atendimento em andamento do mesmo profissional.'
+
+
+def upgrade():
+    # A verificação antiga ("já tem atendimento em andamento?") não travava nada:
+    # requisições simultâneas deixaram profissionais com mais de uma consulta
+    # INICIADA. Fica a mais recente; as outras são encerradas com uma nota.
+    op.execute(sa.text(
+        "UPDATE consulta SET status = 'FINALIZADA', data_fim = CURRENT_TIMESTAMP, "
+        "resumo_atendimento = :nota "
+        "WHERE status = 'INICIADA' AND EXISTS ("
+        "SELECT 1 FROM consulta mais_recente "
+        "WHERE mais_recente.prefeitura_id = consulta.prefeitura_id "
+        "AND mais_recente.profissional_id = consulta.profissional_id "
+        "AND mais_recente.status = 'INICIADA' AND mais_recente.id > consulta.id)"
+    ).bindparams(nota=NOTA))
+    op.execute(sa.text(
+        "UPDATE paciente SET status = 'FINALIZADO' "
+        "WHERE status = 'EM_ATENDIMENTO' "
+        "AND id IN (SELECT paciente_id FROM consulta WHERE resumo_atendimento = :nota) "
+        "AND NOT EXISTS (SELECT 1 FROM consulta WHERE consulta.paciente_id = paciente.id AND consulta.status = 'INICIADA')"
+    ).bindparams(nota=NOTA))
+
+    with op.batch_alter_table('consulta', schema=None) as batch_op:
+        batch_op.drop_index('ix_consulta_em_andamento')
+        batch_op.create_index(
+            'ix_consulta_em_andamento', ['prefeitura_id', 'profissional_id'], unique=True,
+            postgresql_where=sa.text("status = 'INICIADA'"), sqlite_where=sa.text("status = 'INICIADA'")
+        )
+
+
+def downgrade():
+    # As consultas encerradas no upgrade continuam encerradas.
+    with op.batch_alter_table('consulta', schema=None) as batch_op:
+        batch_op.drop_index('ix_consulta_em_andamento')
+        batch_op.create_index(
+            'ix_consulta_em_andamento', ['prefeitura_id', 'profissional_id'], unique=False,
+            postgresql_where=sa.text("status = 'INICIADA'"), sqlite_where=sa.text("status = 'INICIADA'")
+        )